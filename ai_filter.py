@@ -1,19 +1,50 @@
 # trading_bot/ai_filter.py
+import warnings
+
 import joblib
+import numpy as np
 import pandas as pd
+from config import config
 from logger import log
 
 class AIFilter:
     """
     Carga el modelo de IA entrenado y lo usa para filtrar señales de trading.
+
+    El orden de las columnas (feature_names_in_ del modelo) se precalcula al cargar y cada
+    predicción individual rellena un buffer de NumPy reutilizable en lugar de construir un
+    DataFrame. Para bosques (RandomForest) se aplanan además todos los árboles en arrays, de modo
+    que una fila se evalúa recorriendo todos los árboles a la vez sin el coste de despacho de
+    sklearn; se comprueba al cargar que da las mismas probabilidades que predict_proba.
+    predict_batch puntúa miles de señales en una sola llamada.
+
+    Por defecto el modelo se obtiene del registro de modelos (model_registry.py) con el nombre
+    AI_FILTER_MODEL; si allí se activa otra versión, el filtro la adopta en la siguiente
+    predicción sin reiniciar el bot. Con model_path se carga directamente ese archivo.
     """
-    def __init__(self, model_path='ai_model.joblib'):
+    def __init__(self, model_path=None, model_name=None, registry=None):
         """
-        Inicializa el filtro cargando el modelo desde el archivo.
+        Inicializa el filtro cargando el modelo desde el registro o desde el archivo indicado.
         """
+        self.model = None
+        self.model_name = model_name or config.AI_FILTER_MODEL
+        self.model_version = None
+        self.registry = None
+        self.feature_names = None
+        self._feature_index = {}
+        self._row = None
+        self._forest = None
+        if model_path is not None:
+            self._load_file(model_path)
+        else:
+            if registry is None:
+                from model_registry import model_registry as registry
+            self.registry = registry
+            self._sync_with_registry()
+
+    def _load_file(self, model_path):
         try:
-            # Importante: El modelo debe estar en la misma carpeta que main.py
-            self.model = joblib.load(model_path)
+            self._set_model(joblib.load(model_path))
             log.info(f"Filtro de IA inicializado. Modelo '{model_path}' cargado exitosamente.")
         except FileNotFoundError:
             self.model = None
@@ -22,27 +53,189 @@ class AIFilter:
             self.model = None
             log.error(f"Error al cargar el modelo de IA: {e}. El filtro de IA estará desactivado.")
 
-    def get_confidence_prediction(self, features):
+    def _sync_with_registry(self):
         """
-        Usa el modelo para predecir si una señal es de alta confianza.
-        
-        :param features: Un diccionario con los valores de las features para la predicción.
-        :return: 1 si la confianza es alta ("GO"), 0 si es baja ("NO-GO").
+        Adopta la versión activa del registro si ha cambiado desde la última predicción.
+        """
+        if self.registry is None:
+            return
+        version = self.registry.active_version(self.model_name)
+        if version == self.model_version and self.model is not None:
+            return
+        model = self.registry.get(self.model_name)
+        if model is None:
+            if self.model is None:
+                log.error(f"No se pudo obtener el modelo '{self.model_name}' del registro. El filtro de IA estará desactivado.")
+            return
+        try:
+            self._set_model(model)
+            self.model_version = version
+            log.info(f"Filtro de IA usando el modelo '{self.model_name}' v{version} del registro.")
+        except Exception as e:
+            log.error(f"Error al preparar el modelo de IA '{self.model_name}' v{version}: {e}")
+
+    def _set_model(self, model):
+        previous = self.model
+        self.model = model
+        try:
+            self._prepare_fast_path()
+        except Exception:
+            self.model = previous
+            raise
+
+    def _prepare_fast_path(self):
+        self.feature_names = None
+        self._feature_index = {}
+        names = getattr(self.model, 'feature_names_in_', None)
+        if names is not None:
+            self.feature_names = [str(name) for name in names]
+            self._feature_index = {name: i for i, name in enumerate(self.feature_names)}
+        n_features = getattr(self.model, 'n_features_in_', len(self.feature_names or []))
+        # Los árboles de sklearn comparan en float32: el buffer ya tiene ese tipo
+        self._row = np.zeros((1, n_features), dtype=np.float32)
+        self._forest = self._compile_forest(self.model)
+        if self._forest is not None and not self._forest_matches_model(n_features):
+            log.warning("La versión aplanada del bosque no coincide con predict_proba. Se usará predict_proba.")
+            self._forest = None
+
+    @staticmethod
+    def _compile_forest(model):
+        """
+        Concatena los nodos de todos los árboles de un bosque de clasificación en arrays planos.
+        Devuelve None si el modelo no es un bosque de una sola salida.
+        """
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators or getattr(model, 'n_outputs_', 1) != 1 or not hasattr(estimators[0], 'tree_'):
+            return None
+        n_classes = len(model.classes_)
+        left, right, feature, threshold, value, roots = [], [], [], [], [], []
+        offset = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            is_leaf = tree.children_left == -1
+            left.append(np.where(is_leaf, -1, tree.children_left + offset))
+            right.append(np.where(is_leaf, -1, tree.children_right + offset))
+            feature.append(np.where(is_leaf, 0, tree.feature))
+            threshold.append(tree.threshold)
+            node_value = tree.value[:, 0, :n_classes].astype(np.float64)
+            value.append(node_value / np.maximum(node_value.sum(axis=1, keepdims=True), 1e-300))
+            roots.append(offset)
+            offset += tree.node_count
+        return {
+            'left': np.concatenate(left),
+            'right': np.concatenate(right),
+            'feature': np.concatenate(feature),
+            'threshold': np.concatenate(threshold),
+            'value': np.concatenate(value),
+            'roots': np.array(roots),
+            'max_depth': max(estimator.tree_.max_depth for estimator in estimators),
+        }
+
+    def _forest_matches_model(self, n_features):
+        samples = np.random.default_rng(0).normal(size=(32, n_features)).astype(np.float32)
+        expected = self._predict_proba(samples)
+        return all(np.allclose(self._forest_proba(sample), row) for sample, row in zip(samples, expected))
+
+    def _forest_proba(self, row):
+        forest = self._forest
+        nodes = forest['roots']
+        for _ in range(forest['max_depth']):
+            left = forest['left'][nodes]
+            internal = left != -1
+            if not internal.any():
+                break
+            go_left = row[forest['feature'][nodes]] <= forest['threshold'][nodes]
+            nodes = np.where(internal, np.where(go_left, left, forest['right'][nodes]), nodes)
+        return forest['value'][nodes].mean(axis=0)
+
+    def vectorize(self, features):
+        """
+        Vuelca un diccionario de features en el buffer reutilizable, en el orden del entrenamiento.
+        """
+        if self.feature_names is None:
+            raise ValueError("El modelo no guarda los nombres de sus features (feature_names_in_): no se puede ordenar la señal.")
+        row = self._row[0]
+        for name, index in self._feature_index.items():
+            row[index] = features[name]
+        return self._row
+
+    def predict_proba_row(self, features):
         """
+        Probabilidades de cada clase para una sola señal (diccionario de features).
+        """
+        self.vectorize(features)
+        if self._forest is not None:
+            return self._forest_proba(self._row[0])
+        return self._predict_proba(self._row)[0]
+
+    def get_confidence(self, features):
+        """
+        Igual que get_confidence_prediction, pero devuelve también la probabilidad de la clase "GO".
+
+        :return: Tupla (predicción, probabilidad de GO).
+        """
+        self._sync_with_registry()
         if self.model is None:
             log.warning("El modelo de IA no está cargado. Se permite pasar la señal sin filtro.")
-            return 1 # Por seguridad, si el modelo falla, no bloqueamos las operaciones.
+            return 1, 1.0 # Por seguridad, si el modelo falla, no bloqueamos las operaciones.
 
         try:
-            # Convertir el diccionario de features a un DataFrame de una sola fila
-            feature_df = pd.DataFrame([features])
-            
-            # Asegurarse de que el orden de las columnas coincida con el entrenamiento
-            feature_df = feature_df[self.model.feature_names_in_]
-            
-            prediction = self.model.predict(feature_df)
-            log.info(f"Predicción del filtro de IA: {'GO' if prediction[0] == 1 else 'NO-GO'}")
-            return prediction[0]
+            probabilities = self.predict_proba_row(features)
+            prediction = self.model.classes_[probabilities.argmax()]
+            confidence = self._go_probability(probabilities)
+            log.info(f"Predicción del filtro de IA: {'GO' if prediction == 1 else 'NO-GO'} (confianza {confidence:.2%})")
+            return prediction, confidence
         except Exception as e:
             log.error(f"Error durante la predicción de la IA: {e}")
-            return 1 # Fallar en modo abierto para no detener el bot
\ No newline at end of file
+            return 1, 1.0 # Fallar en modo abierto para no detener el bot
+
+    def get_confidence_prediction(self, features):
+        """
+        Usa el modelo para predecir si una señal es de alta confianza.
+
+        :param features: Un diccionario con los valores de las features para la predicción.
+        :return: 1 si la confianza es alta ("GO"), 0 si es baja ("NO-GO").
+        """
+        return self.get_confidence(features)[0]
+
+    def predict_batch(self, features):
+        """
+        Puntúa muchas señales en una sola llamada (p. ej. todas las de un backtest).
+
+        :param features: DataFrame con las columnas de features (en cualquier orden), lista de
+                         diccionarios o array 2D ya ordenado como en el entrenamiento.
+        :return: Tupla (predicciones, probabilidades de GO) como arrays de NumPy.
+        """
+        self._sync_with_registry()
+        if self.model is None:
+            n_rows = len(features)
+            return np.ones(n_rows, dtype=int), np.ones(n_rows)
+
+        if isinstance(features, pd.DataFrame):
+            matrix = features[self.feature_names].to_numpy(dtype=np.float32) if self.feature_names else features.to_numpy(dtype=np.float32)
+        elif len(features) and isinstance(features[0], dict):
+            if self.feature_names is None:
+                raise ValueError("El modelo no guarda los nombres de sus features (feature_names_in_): no se pueden ordenar las señales.")
+            matrix = np.array([[row[name] for name in self.feature_names] for row in features], dtype=np.float32)
+        else:
+            matrix = np.asarray(features, dtype=np.float32)
+
+        probabilities = self._predict_proba(matrix)
+        predictions = self.model.classes_[probabilities.argmax(axis=1)]
+        return predictions, self._go_probabilities(probabilities)
+
+    def _predict_proba(self, matrix):
+        # El camino rápido pasa arrays de NumPy a un modelo entrenado con nombres de columnas:
+        # el orden ya se garantiza con feature_names, así que el aviso de sklearn sobra.
+        with warnings.catch_warnings():
+            warnings.filterwarnings("ignore", message="X does not have valid feature names", category=UserWarning)
+            return self.model.predict_proba(matrix)
+
+    def _go_probability(self, probabilities):
+        return float(self._go_probabilities(probabilities[np.newaxis, :])[0])
+
+    def _go_probabilities(self, probabilities):
+        classes = list(self.model.classes_)
+        if 1 in classes:
+            return probabilities[:, classes.index(1)]
+        return probabilities.max(axis=1)
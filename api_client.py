@@ -1,14 +1,21 @@
 # trading_bot/api_client.py
 
 import ccxt
-import pandas as pd
 from logger import log
 from config import config
+from candle_cache import run_fetch_plan
+from subsystems import subsystems
+from metrics import metrics
+import functools
 import time
 
 class APIClient:
-    def __init__(self):
-        self.exchange = None
+    def __init__(self, exchange=None, candle_cache=None):
+        self.exchange = exchange # Permite inyectar otro exchange (p. ej. ReplayExchange en las repeticiones)
+        self.candle_cache = candle_cache if candle_cache is not None else subsystems.get('candle_cache')
+        if self.exchange is not None:
+            log.info(f"Cliente de API de {self.exchange.name} inicializado.")
+            return
         try:
             exchange_class = getattr(ccxt, 'coinbase')
             self.exchange = exchange_class({
@@ -20,37 +27,44 @@ class APIClient:
             log.error(f"Error al inicializar el cliente de la API: {e}")
 
     def get_historical_data(self, symbol, timeframe, limit=400):
-        # ... (Esta función no necesita cambios, la dejo por completitud)
+        """
+        Devuelve las últimas `limit` velas de la serie.
+
+        Ejecuta el plan de descarga de la caché de velas compartida (CandleCache.fetch_plan): la
+        primera vez descarga el historial completo paginando hacia atrás y en las llamadas
+        siguientes solo pide las velas posteriores a la última guardada en la caché (que
+        reemplazan a la vela aún abierta), normalmente con una única petición pequeña.
+        Con RESAMPLE_BASE_TIMEFRAME, las temporalidades múltiplo de la base se construyen localmente.
+        """
         if not self.exchange or not self.exchange.has['fetchOHLCV']:
             log.error("El cliente del exchange no está inicializado.")
             return None
         try:
-            log.info(f"Obteniendo datos históricos para {symbol} (hasta {limit} velas)...")
-            all_ohlcv = []
-            since = None
-            fetch_limit = 300
-            while len(all_ohlcv) < limit:
-                ohlcv = self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=fetch_limit)
-                if not ohlcv: break
-                since = ohlcv[0][0] - 1
-                all_ohlcv = ohlcv + all_ohlcv
-                time.sleep(self.exchange.rateLimit / 1000)
-            df = pd.DataFrame(all_ohlcv, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
-            df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
-            df = df.tail(limit)
+            with metrics.span('historical_data', symbol=symbol, timeframe=timeframe):
+                df = run_fetch_plan(self.candle_cache.fetch_plan(symbol, timeframe, limit),
+                                    functools.partial(self._fetch_ohlcv, symbol), pause=self._rate_limit_sleep)
             log.info(f"Datos históricos para {symbol} obtenidos y procesados ({len(df)} velas).")
             return df
         except Exception as e:
             log.error(f"Error al obtener datos históricos para {symbol}: {e}")
             return None
 
+    def _fetch_ohlcv(self, symbol, timeframe, since, limit):
+        with metrics.span('exchange_fetch_ohlcv', timeframe=timeframe):
+            return self.exchange.fetch_ohlcv(symbol, timeframe, since=since, limit=limit)
+
+    def _rate_limit_sleep(self):
+        with metrics.span('exchange_rate_limit_sleep'):
+            time.sleep(self.exchange.rateLimit / 1000)
+
     def get_balance(self, currency):
         # ... (Esta función no necesita cambios) ...
         if not self.exchange:
             log.error("El cliente del exchange no está inicializado.")
             return 0.0
         try:
-            balance = self.exchange.fetch_balance()
+            with metrics.span('exchange_fetch_balance'):
+                balance = self.exchange.fetch_balance()
             if currency in balance and 'free' in balance[currency]:
                 return float(balance[currency]['free'])
             return 0.0
@@ -58,4 +72,5 @@ class APIClient:
             log.error(f"Error al obtener el balance para {currency}: {e}")
             return None
 
-api_client = APIClient()
\ No newline at end of file
+# Instancia global: se crea en el primer uso (ver subsystems.py)
+api_client = subsystems.lazy('api_client')
\ No newline at end of file
@@ -0,0 +1,206 @@
+# trading_bot/async_runtime.py
+import asyncio
+import time
+
+import ccxt.async_support as ccxt_async
+from config import config
+from logger import log
+from metrics import metrics
+from subsystems import subsystems
+
+class AsyncCycleRuntime:
+    """
+    Obtiene en paralelo todos los datos de entrada de un ciclo de trading (balance, velas de
+    cada serie y sentimiento de noticias) usando las clases asíncronas de ccxt.
+
+    Cada llamada tiene su propio tiempo límite, así que la latencia desde el cierre de la vela
+    hasta la decisión queda acotada por la llamada más lenta y no por la suma de todas. El bucle
+    de eventos es persistente para reutilizar la sesión HTTP del exchange entre ciclos.
+
+    Las velas salen de la misma caché y del mismo plan de descarga que APIClient
+    (CandleCache.fetch_plan, subsistema 'candle_cache'), con una sola descarga por ciclo de cada
+    serie base que comparten varias temporalidades (CandleCache.group_requests).
+    """
+    def __init__(self, exchange=None, sentiment_analyzer=None, call_timeout=20.0, candle_cache=None):
+        self.loop = asyncio.new_event_loop()
+        self.exchange = exchange if exchange is not None else self._create_exchange()
+        self.sentiment_analyzer = sentiment_analyzer
+        self.call_timeout = call_timeout
+        self.candle_cache = candle_cache if candle_cache is not None else subsystems.get('candle_cache')
+
+    @staticmethod
+    def _create_exchange():
+        exchange = ccxt_async.coinbase({
+            'apiKey': config.API_KEY,
+            'secret': config.API_SECRET,
+        })
+        log.info(f"Cliente asíncrono de API de {exchange.name} inicializado.")
+        return exchange
+
+    def run_cycle(self, market_requests=(), currency='USDT', headlines=None):
+        """
+        Ejecuta concurrentemente las peticiones del ciclo y devuelve un diccionario con
+        'balance', una entrada (símbolo, temporalidad) -> DataFrame por cada petición de
+        velas y 'sentiment' (solo si se pasan titulares). Las llamadas que fallan o superan
+        el tiempo límite devuelven None ('NEUTRAL' para el sentimiento).
+
+        :param market_requests: Secuencia de (símbolo, temporalidad, límite de velas).
+        """
+        return self.loop.run_until_complete(self._gather_cycle(market_requests, currency, headlines))
+
+    def fetch_sentiment(self, headlines):
+        """
+        Sentimiento de los titulares con el mismo tiempo límite que las llamadas del ciclo
+        ('NEUTRAL' si falla). main.py solo lo pide cuando hay una señal de compra que filtrar.
+        """
+        if self.sentiment_analyzer is None:
+            return 'NEUTRAL'
+        return self.loop.run_until_complete(self._with_timeout('sentimiento', self._sentiment(headlines), default='NEUTRAL'))
+
+    def close(self):
+        self.loop.run_until_complete(self.exchange.close())
+        self.loop.close()
+
+    async def _gather_cycle(self, market_requests, currency, headlines):
+        start_time = time.perf_counter()
+        calls = {'balance': self._with_timeout('balance', self.fetch_balance(currency))}
+        # Una descarga por serie del exchange: las temporalidades derivadas de la misma serie base
+        # esperan a la misma tarea en vez de descargar cada una el historial base
+        downloads = {
+            key: asyncio.ensure_future(self.fetch_historical_data(*key, limit))
+            for key, limit in self.candle_cache.group_requests(market_requests).items()
+        }
+        for symbol, timeframe, limit in market_requests:
+            calls[(symbol, timeframe)] = self._with_timeout(
+                f"velas {symbol} {timeframe}", self._series_from_download(symbol, timeframe, limit, downloads)
+            )
+        if headlines is not None and self.sentiment_analyzer is not None:
+            calls['sentiment'] = self._with_timeout('sentimiento', self._sentiment(headlines), default='NEUTRAL')
+
+        with metrics.span('cycle_fetch'):
+            results = await asyncio.gather(*calls.values())
+        for download in downloads.values():
+            download.cancel() # Las que siguen en curso solo las esperaban llamadas que agotaron su tiempo límite
+        log.info(f"Datos del ciclo obtenidos en {time.perf_counter() - start_time:.2f}s ({len(calls)} llamadas concurrentes).")
+        return dict(zip(calls.keys(), results))
+
+    async def _series_from_download(self, symbol, timeframe, limit, downloads):
+        # shield: si esta llamada agota su tiempo límite, la descarga compartida sigue para las demás
+        base = self.candle_cache.base_request(symbol, timeframe, limit)
+        if base is None:
+            df = await asyncio.shield(downloads[(symbol, timeframe)])
+            return df.iloc[-limit:].reset_index(drop=True)
+        base_df = await asyncio.shield(downloads[(symbol, base[0])])
+        return self.candle_cache.resample_from_base(symbol, timeframe, limit, base_df)
+
+    def _sentiment(self, headlines):
+        # El analizador se resuelve dentro del hilo: si es perezoso, su arranque no bloquea el bucle
+        return asyncio.to_thread(lambda: self.sentiment_analyzer.get_news_sentiment(headlines))
+
+    async def _with_timeout(self, name, coro, default=None):
+        try:
+            return await asyncio.wait_for(coro, timeout=self.call_timeout)
+        except asyncio.TimeoutError:
+            metrics.inc('cycle_call_timeouts')
+            log.warning(f"La llamada '{name}' superó el tiempo límite de {self.call_timeout}s.")
+            return default
+        except Exception as e:
+            log.error(f"Error en la llamada '{name}': {e}")
+            return default
+
+    async def fetch_balance(self, currency):
+        with metrics.span('exchange_fetch_balance'):
+            balance = await self.exchange.fetch_balance()
+        if currency in balance and 'free' in balance[currency]:
+            return float(balance[currency]['free'])
+        return 0.0
+
+    async def fetch_historical_data(self, symbol, timeframe, limit=400, fetch_limit=300):
+        """
+        Versión asíncrona de APIClient.get_historical_data: ejecuta el mismo plan de descarga
+        (CandleCache.fetch_plan) con las peticiones asíncronas del exchange.
+        """
+        plan = self.candle_cache.fetch_plan(symbol, timeframe, limit, fetch_limit)
+        try:
+            request_timeframe, since, request_limit = next(plan)
+            while True:
+                with metrics.span('exchange_fetch_ohlcv', timeframe=request_timeframe):
+                    ohlcv = await self.exchange.fetch_ohlcv(symbol, request_timeframe, since=since, limit=request_limit)
+                request_timeframe, since, request_limit = plan.send(ohlcv)
+                await asyncio.sleep(self.exchange.rateLimit / 1000)
+        except StopIteration as stop:
+            return stop.value
+
+if __name__ == "__main__":
+    # Comprobación con un exchange falso (sin red): concurrencia, tiempo límite por llamada,
+    # paginación del historial y actualización incremental desde la caché compartida
+    from candle_cache import CandleCache
+    from timeframes import timeframe_to_ms
+
+    class FakeExchange:
+        name = 'Fake'
+        rateLimit = 0
+        has = {'fetchOHLCV': True}
+
+        def __init__(self, now_ms, latency=0.2):
+            self.now_ms = now_ms
+            self.latency = latency
+            self.requests = []
+
+        async def fetch_ohlcv(self, symbol, timeframe, since=None, limit=None):
+            self.requests.append((symbol, timeframe, since))
+            await asyncio.sleep(self.latency)
+            timeframe_ms = timeframe_to_ms(timeframe)
+            last = self.now_ms - self.now_ms % timeframe_ms # Vela en curso
+            first = since - since % timeframe_ms if since is not None else last - (limit - 1) * timeframe_ms
+            if since is not None and since % timeframe_ms:
+                first += timeframe_ms
+            return [[ts, 1.0, 2.0, 0.5, 1.5, 10.0] for ts in range(first, min(first + limit * timeframe_ms, last + 1), timeframe_ms)]
+
+        async def fetch_balance(self):
+            await asyncio.sleep(self.latency * 10) # Más lenta que el tiempo límite
+            return {'USDT': {'free': 100.0}}
+
+        async def close(self):
+            pass
+
+    now_ms = 1_700_000_000_000
+    exchange = FakeExchange(now_ms)
+    runtime = AsyncCycleRuntime(exchange=exchange, call_timeout=1.0, candle_cache=CandleCache(clock=lambda: now_ms / 1000))
+    requests = [('SOL/USDT', '6h', 400), ('BTC/USDT', '6h', 400), ('BTC/USDT', '1d', 400)]
+
+    start_time = time.perf_counter()
+    data = runtime.run_cycle(requests)
+    elapsed = time.perf_counter() - start_time
+    assert data['balance'] is None, "La llamada lenta debía agotar su tiempo límite"
+    assert elapsed < 1.5, f"Las llamadas no se hicieron en paralelo ({elapsed:.2f}s)"
+    for symbol, timeframe, limit in requests:
+        df = data[(symbol, timeframe)]
+        assert len(df) == limit and df['timestamp'].is_monotonic_increasing and df['timestamp'].is_unique
+        assert df['timestamp'].iloc[-1] == now_ms - now_ms % timeframe_to_ms(timeframe)
+    print(f"Primer ciclo: {len(exchange.requests)} peticiones en {elapsed:.2f}s (balance agotó su tiempo límite).")
+
+    exchange.requests.clear()
+    now_ms += timeframe_to_ms('6h')
+    exchange.now_ms = now_ms
+    data = runtime.run_cycle(requests)
+    assert len(exchange.requests) == len(requests), "Con la caché llena basta una petición por serie"
+    assert all(since is not None for _, _, since in exchange.requests)
+    assert data[('SOL/USDT', '6h')]['timestamp'].iloc[-1] == now_ms - now_ms % timeframe_to_ms('6h')
+    print(f"Segundo ciclo: {len(exchange.requests)} peticiones incrementales.")
+    runtime.close()
+
+    # Arranque en frío con serie base: 6h y 1d de cada símbolo se construyen desde una sola descarga de 1h
+    exchange = FakeExchange(now_ms, latency=0)
+    runtime = AsyncCycleRuntime(exchange=exchange, call_timeout=5.0,
+                                candle_cache=CandleCache(base_timeframe='1h', clock=lambda: now_ms / 1000))
+    requests = [('SOL/USDT', '6h', 400), ('SOL/USDT', '1d', 120), ('BTC/USDT', '6h', 400), ('BTC/USDT', '1d', 400)]
+    data = runtime.run_cycle(requests)
+    for symbol, timeframe, limit in requests:
+        df = data[(symbol, timeframe)]
+        assert len(df) == limit and df['timestamp'].iloc[-1] == now_ms - now_ms % timeframe_to_ms(timeframe)
+    assert {timeframe for _, timeframe, _ in exchange.requests} == {'1h'}
+    assert len(exchange.requests) == len(set(exchange.requests)), "Una página de la serie base se descargó dos veces"
+    print(f"Arranque en frío con base 1h: {len(exchange.requests)} peticiones, sin páginas repetidas.")
+    runtime.close()
+    print("OK")
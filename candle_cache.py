@@ -0,0 +1,225 @@
+# trading_bot/candle_cache.py
+import time
+
+import numpy as np
+import pandas as pd
+from candle_store import CandleStore, OHLCV_COLUMNS
+from logger import log
+from resampler import Resampler, can_resample
+from timeframes import timeframe_to_ms
+
+class CandleRingBuffer:
+    """
+    Buffer circular de capacidad fija con las últimas velas de una serie (formato ccxt:
+    timestamp, open, high, low, close, volume). La última vela puede estar aún abierta y
+    se reemplaza cuando llega una versión más reciente con el mismo timestamp.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.data = np.empty((capacity, len(OHLCV_COLUMNS)), dtype=np.float64)
+        self.start = 0
+        self.size = 0
+
+    def last_timestamp(self):
+        if self.size == 0:
+            return None
+        return int(self.data[(self.start + self.size - 1) % self.capacity, 0])
+
+    def clear(self):
+        self.start = 0
+        self.size = 0
+
+    def upsert(self, ohlcv):
+        """
+        Inserta velas ordenadas por timestamp: reemplaza la última si coincide el timestamp,
+        añade las posteriores (sobrescribiendo las más antiguas si el buffer está lleno) e
+        ignora las anteriores.
+        """
+        for candle in ohlcv:
+            last = self.last_timestamp()
+            if last is not None and candle[0] < last:
+                continue
+            if last is not None and candle[0] == last:
+                self.data[(self.start + self.size - 1) % self.capacity] = candle
+            elif self.size < self.capacity:
+                self.data[(self.start + self.size) % self.capacity] = candle
+                self.size += 1
+            else:
+                self.data[self.start] = candle
+                self.start = (self.start + 1) % self.capacity
+
+    def to_array(self, limit=None):
+        """
+        Copia ordenada (de más antigua a más reciente) de las últimas `limit` velas.
+        """
+        count = self.size if limit is None else min(limit, self.size)
+        first = (self.start + self.size - count) % self.capacity
+        if first + count <= self.capacity:
+            return self.data[first:first + count].copy()
+        return np.concatenate((self.data[first:], self.data[:first + count - self.capacity]))
+
+    def to_frame(self, limit=None):
+        rows = self.to_array(limit)
+        df = pd.DataFrame(rows, columns=OHLCV_COLUMNS)
+        df['timestamp'] = df['timestamp'].astype(np.int64)
+        df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
+
+class CandleCache:
+    """
+    Caché de velas por (símbolo, temporalidad) respaldada por buffers circulares y,
+    opcionalmente, persistida en un CandleStore (solo velas cerradas) para sobrevivir reinicios.
+
+    Es la capa de descarga que comparten APIClient (síncrono) y AsyncCycleRuntime (asíncrono):
+    fetch_plan() decide qué velas pedir al exchange y cada cliente solo ejecuta las peticiones.
+    Con base_timeframe, las temporalidades múltiplo de la base se construyen localmente desde ella.
+    """
+    def __init__(self, persist_dir=None, base_timeframe=None, clock=time.time):
+        self.store = CandleStore(persist_dir) if persist_dir else None
+        self.base_timeframe = base_timeframe or None
+        self.clock = clock # Segundos epoch; en las repeticiones, el reloj virtual
+        self._buffers = {}
+        self._resampled = {} # (símbolo, temporalidad) -> (Resampler, CandleRingBuffer)
+
+    def get_buffer(self, symbol, timeframe, capacity):
+        """
+        Devuelve el buffer de la serie con al menos `capacity` velas de capacidad,
+        sembrándolo desde disco la primera vez si hay persistencia.
+        """
+        key = (symbol, timeframe)
+        buffer = self._buffers.get(key)
+        if buffer is not None and buffer.capacity >= capacity:
+            return buffer
+
+        new_buffer = CandleRingBuffer(capacity)
+        if buffer is not None:
+            new_buffer.upsert(buffer.to_array())
+        elif self.store and self.store.exists(symbol, timeframe):
+            columns = self.store.read_columns(symbol, timeframe)
+            rows = np.column_stack([np.asarray(columns[column][-capacity:], dtype=np.float64) for column in OHLCV_COLUMNS])
+            new_buffer.upsert(rows)
+            log.info(f"Caché de velas de {symbol} ({timeframe}) restaurada desde disco ({new_buffer.size} velas).")
+        self._buffers[key] = new_buffer
+        return new_buffer
+
+    def persist(self, symbol, timeframe):
+        """
+        Guarda en disco las velas cerradas de la serie que aún no estaban guardadas.
+        """
+        buffer = self._buffers.get((symbol, timeframe))
+        if not self.store or buffer is None or buffer.size == 0:
+            return
+        rows = buffer.to_array()
+        closed = rows[rows[:, 0] + timeframe_to_ms(timeframe) <= self.clock() * 1000]
+        try:
+            self.store.append(symbol, timeframe, closed)
+        except Exception as e:
+            log.error(f"No se pudo persistir la caché de velas de {symbol} ({timeframe}): {e}")
+
+    def fetch_plan(self, symbol, timeframe, limit, fetch_limit=300):
+        """
+        Plan de descarga de las últimas `limit` velas de la serie. Es un generador que produce
+        una petición (temporalidad, since, límite) para cada llamada a fetch_ohlcv del exchange,
+        recibe con send() las velas devueltas y termina devolviendo el DataFrame
+        (StopIteration.value); ver run_fetch_plan.
+
+        La primera vez descarga el historial paginando hacia atrás desde la vela más reciente; en
+        las siguientes solo pide las velas a partir de la última en caché (incluida, porque puede
+        estar abierta), normalmente con una única petición pequeña. Si se piden más velas de las que
+        hay en caché, solo se descargan las anteriores a la más antigua.
+        """
+        base = self.base_request(symbol, timeframe, limit)
+        if base is not None:
+            base_df = yield from self.fetch_plan(symbol, *base, fetch_limit)
+            return self.resample_from_base(symbol, timeframe, limit, base_df)
+
+        buffer = self.get_buffer(symbol, timeframe, capacity=limit)
+        if buffer.size:
+            since = buffer.last_timestamp()
+            while True:
+                ohlcv = yield timeframe, since, fetch_limit
+                if not ohlcv: break
+                buffer.upsert(ohlcv)
+                if len(ohlcv) < fetch_limit: break
+                # El bot estuvo parado más de una página de velas: seguimos avanzando
+                since = ohlcv[-1][0]
+        if buffer.size < limit:
+            # Se completa hacia atrás desde la vela más antigua en caché: al ampliar la capacidad
+            # (otra temporalidad derivada necesita más velas base) no se vuelve a bajar lo que ya está
+            log.info(f"Obteniendo datos históricos para {symbol} ({timeframe}, hasta {limit} velas)...")
+            timeframe_ms = timeframe_to_ms(timeframe)
+            candles = {int(row[0]): row for row in buffer.to_array()}
+            since = min(candles) - fetch_limit * timeframe_ms if candles else None
+            while len(candles) < limit:
+                ohlcv = yield timeframe, since, fetch_limit
+                new_candles = [candle for candle in ohlcv if candle[0] not in candles]
+                if not new_candles: break
+                candles.update((candle[0], candle) for candle in new_candles)
+                since = min(candles) - fetch_limit * timeframe_ms
+            # upsert ignora velas anteriores a la última guardada: se rellena desde cero con las ya guardadas y las nuevas
+            if candles:
+                buffer.clear()
+                buffer.upsert([candles[ts] for ts in sorted(candles)][-limit:])
+        self.persist(symbol, timeframe)
+        return buffer.to_frame(limit)
+
+    def base_request(self, symbol, timeframe, limit):
+        """
+        (temporalidad base, velas base) que hay que descargar para construir las últimas `limit`
+        velas de `timeframe` desde la serie base, o None si la serie se descarga directamente.
+        """
+        if not self.base_timeframe or not can_resample(self.base_timeframe, timeframe):
+            return None
+        ratio = timeframe_to_ms(timeframe) // timeframe_to_ms(self.base_timeframe)
+        return self.base_timeframe, (limit + 1) * ratio
+
+    def group_requests(self, market_requests):
+        """
+        Agrupa las peticiones (símbolo, temporalidad, límite) de un ciclo por la serie que hay que
+        descargar del exchange: {(símbolo, temporalidad): límite}, con cada serie base una sola vez
+        y con las velas que necesita la más exigente de sus temporalidades derivadas. Así, en un
+        arranque en frío, las temporalidades que comparten base no descargan cada una el historial.
+        """
+        downloads = {}
+        for symbol, timeframe, limit in market_requests:
+            timeframe, limit = self.base_request(symbol, timeframe, limit) or (timeframe, limit)
+            downloads[(symbol, timeframe)] = max(limit, downloads.get((symbol, timeframe), 0))
+        return downloads
+
+    def resample_from_base(self, symbol, timeframe, limit, base_df):
+        """
+        Velas de `timeframe` construidas desde la serie base ya descargada (`base_df`, que comparten
+        todas las temporalidades derivadas del símbolo). El agregador incremental solo procesa las
+        velas base cerradas nuevas de cada llamada; la última vela devuelta es la que está en curso,
+        como la del exchange.
+        """
+        resampler, buffer = self._resampled.get((symbol, timeframe), (None, None))
+        if resampler is None or buffer.capacity < limit:
+            resampler, buffer = Resampler(self.base_timeframe, timeframe), CandleRingBuffer(limit)
+            self._resampled[(symbol, timeframe)] = (resampler, buffer)
+
+        rows = base_df[OHLCV_COLUMNS].to_numpy(dtype=float)
+        if resampler.last_base_timestamp is not None:
+            rows = rows[rows[:, 0] > resampler.last_base_timestamp]
+        closed = rows[:, 0] + resampler.base_ms <= self.clock() * 1000
+        buffer.upsert(resampler.update(rows[closed]))
+        partial = resampler.partial(rows[~closed][-1] if (~closed).any() else None)
+        if partial is not None:
+            buffer.upsert([partial])
+        return buffer.to_frame(limit)
+
+def run_fetch_plan(plan, fetch_ohlcv, pause=None):
+    """
+    Ejecuta un CandleCache.fetch_plan de forma síncrona: fetch_ohlcv(temporalidad, since, límite)
+    hace cada petición y pause() se llama entre peticiones (límite de peticiones del exchange).
+    AsyncCycleRuntime tiene su versión asíncrona.
+    """
+    try:
+        request = next(plan)
+        while True:
+            ohlcv = fetch_ohlcv(*request)
+            request = plan.send(ohlcv)
+            if pause is not None:
+                pause()
+    except StopIteration as stop:
+        return stop.value
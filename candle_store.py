@@ -0,0 +1,326 @@
+# trading_bot/candle_store.py
+import json
+import os
+
+import numpy as np
+import pandas as pd
+from resampler import OHLCV_COLUMNS, bucket_start, can_resample, resample_ohlcv
+from timeframes import timeframe_to_ms
+
+DEFAULT_STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_training', 'data', 'candles')
+
+class CandleStore:
+    """
+    Almacén local de velas OHLCV en formato columnar binario, indexado por (símbolo, temporalidad).
+
+    Cada serie es un directorio con un archivo binario por columna (timestamp en int64 en ms y
+    OHLCV en float64 o float32) y un meta.json con el número de filas confirmadas, la generación
+    de los archivos de columnas y el CSV que refleja la serie (source). Los lectores mapean las
+    columnas en memoria (sin parsear texto ni fechas) y solo ven lo confirmado en meta.json, que
+    se reescribe de forma atómica al final de cada append o write; así una escritura
+    interrumpida nunca deja la serie corrupta.
+    """
+    def __init__(self, root_dir=DEFAULT_STORE_DIR, price_dtype='float64'):
+        self.root_dir = root_dir
+        self.price_dtype = np.dtype(price_dtype).name
+
+    def _series_dir(self, symbol, timeframe):
+        return os.path.join(self.root_dir, f"{symbol.replace('/', '_')}_{timeframe}")
+
+    def _meta_path(self, symbol, timeframe):
+        return os.path.join(self._series_dir(symbol, timeframe), 'meta.json')
+
+    def _column_path(self, symbol, timeframe, column, generation=0):
+        # La generación 0 conserva los nombres originales; cada write() escribe una nueva
+        name = f"{column}.bin" if not generation else f"{column}.{generation}.bin"
+        return os.path.join(self._series_dir(symbol, timeframe), name)
+
+    def _read_meta(self, symbol, timeframe):
+        with open(self._meta_path(symbol, timeframe), 'r') as f:
+            return json.load(f)
+
+    def _write_meta(self, symbol, timeframe, meta):
+        path = self._meta_path(symbol, timeframe)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def exists(self, symbol, timeframe):
+        return os.path.exists(self._meta_path(symbol, timeframe))
+
+    def source(self, symbol, timeframe):
+        """
+        Ruta absoluta del CSV que refleja la serie, o None si no se indicó al guardarla.
+        """
+        if not self.exists(symbol, timeframe):
+            return None
+        return self._read_meta(symbol, timeframe).get('source')
+
+    def read_columns(self, symbol, timeframe):
+        """
+        Devuelve un diccionario {columna: array} mapeado en memoria (solo lectura, sin copias).
+        """
+        meta = self._read_meta(symbol, timeframe)
+        rows = meta['rows']
+        columns = {}
+        for column in OHLCV_COLUMNS:
+            dtype = np.dtype(meta['dtypes'][column])
+            if rows == 0:
+                columns[column] = np.empty(0, dtype=dtype)
+            else:
+                path = self._column_path(symbol, timeframe, column, meta.get('generation', 0))
+                columns[column] = np.memmap(path, dtype=dtype, mode='r', shape=(rows,))
+        return columns
+
+    def load(self, symbol, timeframe, start=None, end=None):
+        """
+        Carga una serie como DataFrame con las columnas timestamp, OHLCV y datetime.
+
+        :param start: Timestamp mínimo (ms, inclusivo) opcional.
+        :param end: Timestamp máximo (ms, inclusivo) opcional.
+        """
+        columns = self.read_columns(symbol, timeframe)
+        timestamps = columns['timestamp']
+        first = np.searchsorted(timestamps, start, side='left') if start is not None else 0
+        last = np.searchsorted(timestamps, end, side='right') if end is not None else len(timestamps)
+        df = pd.DataFrame({column: np.array(values[first:last]) for column, values in columns.items()})
+        df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+        return df
+
+    def timeframes(self, symbol):
+        """
+        Temporalidades guardadas de un símbolo.
+        """
+        prefix = f"{symbol.replace('/', '_')}_"
+        if not os.path.isdir(self.root_dir):
+            return []
+        names = sorted(name[len(prefix):] for name in os.listdir(self.root_dir) if name.startswith(prefix))
+        return [timeframe for timeframe in names if self.exists(symbol, timeframe)]
+
+    def base_timeframe(self, symbol, timeframe):
+        """
+        Temporalidad guardada más fina desde la que se puede construir `timeframe` (o la propia
+        `timeframe` si es la única), o None si no hay ninguna.
+        """
+        return _finest_base(self.timeframes(symbol), timeframe)
+
+    def load_resampled(self, symbol, timeframe, start=None, end=None, include_partial=False, base_timeframe=None):
+        """
+        Carga `timeframe` construyéndola desde la serie guardada más fina del símbolo (ver
+        resampler.py), así todas las temporalidades salen de los mismos datos y no hace falta
+        descargarlas ni guardarlas por separado. start y end se refieren a la apertura de las velas.
+
+        :param base_timeframe: Serie guardada desde la que construirla (por defecto la más fina).
+        """
+        base_timeframe = base_timeframe or self.base_timeframe(symbol, timeframe)
+        if base_timeframe is None:
+            raise FileNotFoundError(f"No hay velas guardadas de {symbol} desde las que construir {timeframe}.")
+        if base_timeframe == timeframe:
+            return self.load(symbol, timeframe, start=start, end=end)
+        base_start = int(bucket_start(start, timeframe)) if start is not None else None
+        base_end = end + timeframe_to_ms(timeframe) - timeframe_to_ms(base_timeframe) if end is not None else None
+        df = resample_ohlcv(self.load(symbol, base_timeframe, start=base_start, end=base_end), timeframe, base_timeframe,
+                            include_partial=include_partial)
+        if start is not None:
+            df = df[df['timestamp'] >= start].reset_index(drop=True)
+        return df
+
+    def last_timestamp(self, symbol, timeframe):
+        """
+        Timestamp (ms) de la última vela guardada, o None si la serie no existe o está vacía.
+        """
+        if not self.exists(symbol, timeframe):
+            return None
+        meta = self._read_meta(symbol, timeframe)
+        rows = meta['rows']
+        if rows == 0:
+            return None
+        path = self._column_path(symbol, timeframe, 'timestamp', meta.get('generation', 0))
+        timestamps = np.memmap(path, dtype='<i8', mode='r', shape=(rows,))
+        return int(timestamps[-1])
+
+    def append(self, symbol, timeframe, ohlcv, source=None):
+        """
+        Añade velas al final de la serie (creándola si no existe) de forma atómica.
+        Se ignoran las velas con timestamp igual o anterior a la última guardada.
+
+        :param ohlcv: Lista de [timestamp, open, high, low, close, volume] (formato ccxt) o DataFrame.
+        :param source: CSV que refleja la serie (ver load_or_csv); se conserva el anterior si es None.
+        :return: Número de velas añadidas.
+        """
+        new_columns = self._to_columns(ohlcv)
+        last = self.last_timestamp(symbol, timeframe)
+        if last is not None:
+            keep = new_columns['timestamp'] > last
+            new_columns = {column: values[keep] for column, values in new_columns.items()}
+        rows_added = len(new_columns['timestamp'])
+
+        created = not self.exists(symbol, timeframe)
+        if created:
+            os.makedirs(self._series_dir(symbol, timeframe), exist_ok=True)
+            meta = self._new_meta(symbol, timeframe)
+        else:
+            meta = self._read_meta(symbol, timeframe)
+        source = os.path.realpath(source) if source is not None else meta.get('source')
+        if rows_added == 0:
+            if created or source != meta.get('source'):
+                meta['source'] = source
+                self._write_meta(symbol, timeframe, meta)
+            return 0
+
+        self._write_columns(symbol, timeframe, meta, new_columns)
+        meta['rows'] += rows_added
+        meta['source'] = source
+        self._write_meta(symbol, timeframe, meta)
+        return rows_added
+
+    def write(self, symbol, timeframe, ohlcv, source=None):
+        """
+        Reemplaza por completo el contenido de una serie de forma atómica: las columnas nuevas se
+        escriben en archivos de la siguiente generación y solo sustituyen a las anteriores al
+        reescribir meta.json, así que los lectores ven la serie antigua o la nueva, nunca una vacía.
+
+        :param source: CSV que refleja la serie (ver load_or_csv); se conserva el anterior si es None.
+        :return: Número de velas guardadas.
+        """
+        columns = self._to_columns(ohlcv)
+        meta = self._new_meta(symbol, timeframe)
+        old_meta = None
+        if self.exists(symbol, timeframe):
+            old_meta = self._read_meta(symbol, timeframe)
+            meta['dtypes'] = old_meta['dtypes']
+            meta['generation'] = old_meta.get('generation', 0) + 1
+            meta['source'] = old_meta.get('source')
+        else:
+            os.makedirs(self._series_dir(symbol, timeframe), exist_ok=True)
+        if source is not None:
+            meta['source'] = os.path.realpath(source)
+
+        self._write_columns(symbol, timeframe, meta, columns)
+        meta['rows'] = len(columns['timestamp'])
+        self._write_meta(symbol, timeframe, meta)
+
+        if old_meta is not None:
+            # Los lectores que aún mapean la generación anterior la conservan hasta cerrarla
+            for column in OHLCV_COLUMNS:
+                try:
+                    os.remove(self._column_path(symbol, timeframe, column, old_meta.get('generation', 0)))
+                except FileNotFoundError:
+                    pass
+        return meta['rows']
+
+    def _write_columns(self, symbol, timeframe, meta, columns):
+        """
+        Escribe las columnas tras las filas confirmadas en meta.json (sin confirmarlas).
+        """
+        for column in OHLCV_COLUMNS:
+            dtype = np.dtype(meta['dtypes'][column])
+            path = self._column_path(symbol, timeframe, column, meta.get('generation', 0))
+            with open(path, 'ab') as f:
+                # Descartamos bytes de una escritura anterior que no llegó a confirmarse en meta.json
+                f.truncate(meta['rows'] * dtype.itemsize)
+                f.write(np.ascontiguousarray(columns[column], dtype=dtype).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+
+    def import_csv(self, symbol, timeframe, csv_path):
+        """
+        Importa al almacén un CSV de velas existente (reemplazando la serie).
+        """
+        df = read_ohlcv_csv(csv_path)
+        rows = self.write(symbol, timeframe, df, source=csv_path)
+        print(f"Importadas {rows} velas de '{csv_path}' en {symbol} ({timeframe}).")
+        return rows
+
+    def load_or_csv(self, symbol, timeframe, csv_path):
+        """
+        Carga la serie del conjunto de datos de `csv_path`. Del almacén solo se usan las series que
+        reflejan ese CSV o un CSV del mismo directorio ({SÍMBOLO}_{temporalidad}.csv, ver `source`
+        en append/import_csv), construida desde la más fina; así dos conjuntos de datos con el
+        mismo símbolo y temporalidad no se mezclan. Sin esas series lee el CSV indicado y, si no
+        existe, la construye desde el CSV más fino del mismo directorio.
+        """
+        directory = os.path.dirname(csv_path) or '.'
+        prefix = f"{symbol.replace('/', '_')}_"
+        stored = []
+        for stored_timeframe in self.timeframes(symbol):
+            source = self.source(symbol, stored_timeframe)
+            if source is None:
+                continue
+            if source == os.path.realpath(os.path.join(directory, f"{prefix}{stored_timeframe}.csv")) or \
+                    (stored_timeframe == timeframe and source == os.path.realpath(csv_path)):
+                stored.append(stored_timeframe)
+        base_timeframe = _finest_base(stored, timeframe)
+        if base_timeframe is not None:
+            return self.load_resampled(symbol, timeframe, base_timeframe=base_timeframe)
+        if os.path.exists(csv_path):
+            return read_ohlcv_csv(csv_path)
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        available = [name[len(prefix):-len('.csv')] for name in names if name.startswith(prefix) and name.endswith('.csv')]
+        base_timeframe = _finest_base(available, timeframe)
+        if base_timeframe is None:
+            return read_ohlcv_csv(csv_path) # FileNotFoundError con la ruta pedida
+        base_df = read_ohlcv_csv(os.path.join(directory, f"{prefix}{base_timeframe}.csv"))
+        return resample_ohlcv(base_df, timeframe, base_timeframe)
+
+    def _new_meta(self, symbol, timeframe):
+        dtypes = {column: self.price_dtype for column in OHLCV_COLUMNS}
+        dtypes['timestamp'] = 'int64'
+        return {'symbol': symbol, 'timeframe': timeframe, 'rows': 0, 'dtypes': dtypes}
+
+    @staticmethod
+    def _to_columns(ohlcv):
+        if isinstance(ohlcv, pd.DataFrame):
+            columns = {column: ohlcv[column].to_numpy() for column in OHLCV_COLUMNS}
+        else:
+            data = np.asarray(ohlcv, dtype=np.float64).reshape(-1, len(OHLCV_COLUMNS))
+            columns = {column: data[:, i] for i, column in enumerate(OHLCV_COLUMNS)}
+        columns['timestamp'] = columns['timestamp'].astype(np.int64)
+        # Ordenamos y eliminamos timestamps duplicados para mantener la serie monótona
+        order = np.argsort(columns['timestamp'], kind='stable')
+        columns = {column: values[order] for column, values in columns.items()}
+        unique = np.ones(len(order), dtype=bool)
+        unique[1:] = columns['timestamp'][1:] != columns['timestamp'][:-1]
+        return {column: values[unique] for column, values in columns.items()}
+
+def _finest_base(timeframes, timeframe):
+    """
+    La temporalidad más fina de `timeframes` desde la que se puede construir `timeframe` (incluida ella misma).
+    """
+    candidates = []
+    for candidate in timeframes:
+        try:
+            if candidate == timeframe or can_resample(candidate, timeframe):
+                candidates.append(candidate)
+        except ValueError:
+            continue # Nombre que no es una temporalidad (p. ej. SOL_USDT_6h_data.csv)
+    return min(candidates, key=timeframe_to_ms, default=None)
+
+def read_ohlcv_csv(csv_path):
+    """
+    Lee un CSV de velas y lo normaliza a las columnas timestamp (ms), OHLCV y datetime.
+    Acepta tanto el formato de download_binance_data (timestamp en ms + datetime) como el de los
+    CSV antiguos (*_data.csv) cuya columna timestamp es una fecha.
+    """
+    df = pd.read_csv(csv_path)
+    if 'datetime' in df.columns:
+        df['datetime'] = pd.to_datetime(df['datetime'])
+    else:
+        df['datetime'] = pd.to_datetime(df['timestamp'])
+        df['timestamp'] = df['datetime'].astype('int64') // 10**6
+    return df[OHLCV_COLUMNS + ['datetime']]
+
+# Crear una instancia global con el directorio por defecto (ml_training/data/candles)
+candle_store = CandleStore()
+
+if __name__ == '__main__':
+    # Importa los CSV descargados por ml_training/download_binance_data.py al almacén columnar
+    data_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_training', 'data')
+    for filename in sorted(os.listdir(data_dir)):
+        if not filename.endswith('.csv'):
+            continue
+        base, quote, timeframe = filename[:-len('.csv')].split('_')
+        candle_store.import_csv(f"{base}/{quote}", timeframe, os.path.join(data_dir, filename))
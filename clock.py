@@ -0,0 +1,50 @@
+# trading_bot/clock.py
+import time
+
+class SystemClock:
+    """
+    Reloj real del sistema (el que usa el bot en vivo).
+    """
+    def time(self):
+        return time.time()
+
+    def monotonic(self):
+        return time.monotonic()
+
+    def sleep(self, seconds):
+        time.sleep(seconds)
+
+class ReplayFinished(BaseException):
+    """
+    Se lanza cuando el reloj virtual llega al final de la repetición. Hereda de BaseException
+    (como KeyboardInterrupt) para atravesar el `except Exception` del bucle principal.
+    """
+
+class VirtualClock:
+    """
+    Reloj virtual para repeticiones de mercado: sleep() avanza la hora al instante en lugar de
+    esperar, así que meses de funcionamiento del bot se recorren en segundos. Con `speed` se
+    duerme de verdad seconds / speed (p. ej. speed=10000 para seguir la repetición en directo).
+    Al sobrepasar `end` (epoch en segundos) lanza ReplayFinished.
+    """
+    def __init__(self, start, end=None, speed=None):
+        self.now = float(start)
+        self.end = end
+        self.speed = speed
+
+    def time(self):
+        return self.now
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        seconds = max(0.0, seconds)
+        if self.speed:
+            time.sleep(seconds / self.speed)
+        self.advance(seconds)
+
+    def advance(self, seconds):
+        self.now += seconds
+        if self.end is not None and self.now > self.end:
+            raise ReplayFinished()
@@ -23,6 +23,61 @@ class Config:
     # Clave de API de Gemini
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+    # Caché de sentimiento de noticias (ver sentiment_cache.py)
+    SENTIMENT_CACHE_TTL_SECONDS = int(os.getenv("SENTIMENT_CACHE_TTL_SECONDS", "3600"))
+    SENTIMENT_CACHE_SIZE = int(os.getenv("SENTIMENT_CACHE_SIZE", "512"))
+    SENTIMENT_CACHE_FILE = os.getenv("SENTIMENT_CACHE_FILE", "sentiment_cache.json")
+    # Las escrituras de la caché a disco se agrupan en una cada tantos segundos (0 = al momento)
+    SENTIMENT_CACHE_FLUSH_SECONDS = float(os.getenv("SENTIMENT_CACHE_FLUSH_SECONDS", "5"))
+    # Tiempo máximo de espera para el sentimiento por lotes de varios símbolos
+    SENTIMENT_LATENCY_BUDGET_SECONDS = float(os.getenv("SENTIMENT_LATENCY_BUDGET_SECONDS", "8"))
+    # Modelo local de sentimiento (ver local_sentiment.py). SENTIMENT_MODE:
+    #   remote    -> solo Gemini
+    #   local     -> solo el modelo local
+    #   prefilter -> modelo local; solo los casos dudosos se consultan a Gemini
+    #   fallback  -> Gemini con tiempo límite; si falla o tarda, el modelo local
+    SENTIMENT_MODE = os.getenv("SENTIMENT_MODE", "remote")
+    SENTIMENT_LOCAL_MODEL_PATH = os.getenv("SENTIMENT_LOCAL_MODEL_PATH", "sentiment_model.joblib")
+    SENTIMENT_LOCAL_MIN_CONFIDENCE = float(os.getenv("SENTIMENT_LOCAL_MIN_CONFIDENCE", "0.5"))
+
+    # Registro de modelos .joblib (ver model_registry.py) y modelo que usa el filtro de IA
+    MODEL_REGISTRY_INDEX = os.getenv("MODEL_REGISTRY_INDEX", "model_registry.json")
+    AI_FILTER_MODEL = os.getenv("AI_FILTER_MODEL", "ai_model")
+
+    # Métricas de tiempos del bot (ver metrics.py): endpoint HTTP local y/o archivo periódico
+    METRICS_ENABLED = os.getenv("METRICS_ENABLED", "false").lower() in ("1", "true", "yes")
+    METRICS_PORT = int(os.getenv("METRICS_PORT", "0")) # 0 = sin servidor HTTP
+    METRICS_FILE = os.getenv("METRICS_FILE") # Opcional: ruta del archivo de métricas
+    METRICS_FILE_INTERVAL_SECONDS = float(os.getenv("METRICS_FILE_INTERVAL_SECONDS", "30"))
+
+    # Base de datos SQLite con el histórico de posiciones, órdenes y equity
+    TRADE_LEDGER_DB = os.getenv("TRADE_LEDGER_DB", "trade_ledger.db")
+    # Archivo JSON con las posiciones abiertas (ver state_manager.py)
+    STATE_FILE = os.getenv("STATE_FILE", "state.json")
+
+    # Envío de órdenes desde el bucle principal. Desactivado = prueba en seco (solo se registra la señal).
+    # En SIMULATED sin repetición las órdenes son de papel y sus stops nunca se disparan.
+    ORDER_EXECUTION_ENABLED = os.getenv("ORDER_EXECUTION_ENABLED", "false").lower() in ("1", "true", "yes")
+
+    # Repetición acelerada del histórico en modo SIMULATED (ver replay_exchange.py)
+    REPLAY_INITIAL_BALANCE = float(os.getenv("REPLAY_INITIAL_BALANCE", "10000"))
+    REPLAY_FEE_RATE = float(os.getenv("REPLAY_FEE_RATE", "0.0006"))
+    REPLAY_SLIPPAGE_BPS = float(os.getenv("REPLAY_SLIPPAGE_BPS", "2"))
+
+    # Planificador: segundos tras el cierre de la vela antes de analizar y sondeo con posición abierta
+    CANDLE_SETTLE_DELAY_SECONDS = int(os.getenv("CANDLE_SETTLE_DELAY_SECONDS", "30"))
+    POSITION_POLL_SECONDS = int(os.getenv("POSITION_POLL_SECONDS", "300"))
+
+    # Directorio opcional para persistir la caché de velas de APIClient entre reinicios
+    CANDLE_CACHE_DIR = os.getenv("CANDLE_CACHE_DIR")
+    # Temporalidad base opcional (p. ej. '1h'): la caché de velas (candle_cache.py) construye a partir
+    # de ella las temporalidades múltiplo (4h, 6h, 1d...) en lugar de descargarlas por separado (ver resampler.py)
+    RESAMPLE_BASE_TIMEFRAME = os.getenv("RESAMPLE_BASE_TIMEFRAME", "")
+
+    # Caché de indicadores técnicos (ver indicator_cache.py)
+    INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "256"))
+    INDICATOR_CACHE_DIR = os.getenv("INDICATOR_CACHE_DIR") # Opcional: directorio para la caché en disco
+
     # --- CORRECCIÓN: EL BLOQUE DE CONFIGURACIÓN DE LA ESTRATEGIA VA AQUÍ DENTRO ---
     STRATEGY_CONFIG = {
         # Parámetros optimizados
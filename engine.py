@@ -0,0 +1,280 @@
+# trading_bot/engine.py
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+from logger import log, set_log_level
+from timeframes import timeframe_to_ms
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_training', 'data')
+
+class CandleEvent:
+    """
+    Vela cerrada de una serie (símbolo, temporalidad). `timestamp` es la apertura en ms, como en
+    ccxt; la vela se conoce a partir de close_time.
+    """
+    __slots__ = ('symbol', 'timeframe', 'timestamp', 'close_time', 'open', 'high', 'low', 'close', 'volume')
+
+    def __init__(self, symbol, timeframe, timestamp, close_time, open, high, low, close, volume):
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.timestamp = timestamp
+        self.close_time = close_time
+        self.open = open
+        self.high = high
+        self.low = low
+        self.close = close
+        self.volume = volume
+
+def candle_events(frames, now_ms=None, after=None):
+    """
+    Convierte DataFrames OHLCV {(símbolo, temporalidad): df} en un flujo de CandleEvent ordenado
+    por cierre de vela. Con el mismo cierre se respeta el orden de `frames`, así el contexto
+    (p. ej. BTC) llega antes que la serie que dispara la estrategia, como en vivo.
+
+    :param now_ms: Solo se emiten las velas cerradas en ese instante (None = todas).
+    :param after: Diccionario (símbolo, temporalidad) -> timestamp de la última vela ya procesada.
+    """
+    after = after or {}
+    series, close_times, series_ids, rows = [], [], [], []
+    for key, df in frames.items():
+        if df is None or df.empty:
+            continue
+        timeframe_ms = timeframe_to_ms(key[1])
+        ts = df['timestamp'].to_numpy(dtype=np.int64)
+        mask = np.ones(len(ts), dtype=bool)
+        if now_ms is not None:
+            mask &= ts + timeframe_ms <= now_ms
+        if after.get(key) is not None:
+            mask &= ts > after[key]
+        index = np.flatnonzero(mask)
+        if not len(index):
+            continue
+        # Listas de Python: leer escalares de NumPy dentro del bucle es varias veces más lento
+        columns = [ts[index].tolist()] + [df[column].to_numpy(dtype=float)[index].tolist()
+                                          for column in ('open', 'high', 'low', 'close', 'volume')]
+        series.append((key, timeframe_ms, columns))
+        close_times.append(ts[index] + timeframe_ms)
+        series_ids.append(np.full(len(index), len(series) - 1))
+        rows.append(np.arange(len(index)))
+    if not series:
+        return
+
+    close_times = np.concatenate(close_times)
+    series_ids = np.concatenate(series_ids)
+    rows = np.concatenate(rows)
+    order = np.lexsort((series_ids, close_times))
+    for series_id, row in zip(series_ids[order].tolist(), rows[order].tolist()):
+        (symbol, timeframe), timeframe_ms, (ts, opens, highs, lows, closes, volumes) = series[series_id]
+        yield CandleEvent(symbol, timeframe, ts[row], ts[row] + timeframe_ms,
+                          opens[row], highs[row], lows[row], closes[row], volumes[row])
+
+class SimulatedBroker:
+    """
+    Broker de los backtests: entra a mercado al cierre de la vela que da la señal (el bot en vivo
+    opera en cuanto cierra) y dispara el stop-loss con las velas posteriores de la serie de
+    ejecución, como la orden stop_market del exchange (con hueco, al precio de apertura).
+    Comisión y deslizamiento se aplican a cada ejecución.
+    """
+    def __init__(self, initial_capital=10000.0, fee_rate=0.0, slippage_bps=0.0):
+        self.initial_capital = float(initial_capital)
+        self.cash = float(initial_capital)
+        self.fee_rate = fee_rate
+        self.slippage = slippage_bps / 10000
+        self.positions = {}
+        self.trades = []
+        self.equity_curve = []
+
+    def balance(self):
+        return self.cash
+
+    def in_position(self, symbol):
+        return symbol in self.positions
+
+    def open_position(self, symbol, side, size, price, stop_loss_price, time_ms):
+        direction = 1 if side == 'long' else -1
+        entry_price = price * (1 + direction * self.slippage)
+        fee = entry_price * size * self.fee_rate
+        self.cash -= fee
+        self.positions[symbol] = {
+            'side': side, 'direction': direction, 'size': size, 'entry_price': entry_price,
+            'stop_loss_price': stop_loss_price, 'entry_time': time_ms, 'fees': fee,
+        }
+
+    def close_position(self, symbol, price, time_ms, reason):
+        position = self.positions.pop(symbol)
+        direction = position['direction']
+        exit_price = price * (1 - direction * self.slippage)
+        fee = exit_price * position['size'] * self.fee_rate
+        gross = (exit_price - position['entry_price']) * position['size'] * direction
+        self.cash += gross - fee
+        self.trades.append({
+            'symbol': symbol, 'side': position['side'], 'size': position['size'],
+            'entry_time': position['entry_time'], 'exit_time': time_ms,
+            'entry_price': position['entry_price'], 'exit_price': exit_price,
+            'pnl': gross - fee - position['fees'], 'exit_reason': reason,
+        })
+
+    def on_candle(self, event):
+        """
+        Revisa el stop-loss con una vela cerrada de la serie de ejecución.
+        """
+        position = self.positions.get(event.symbol)
+        if position is None or event.timestamp < position['entry_time']:
+            return # Sin posición, o vela que empezó antes de la entrada
+        stop = position['stop_loss_price']
+        if position['direction'] == 1 and event.low <= stop:
+            self.close_position(event.symbol, min(stop, event.open), event.close_time, 'stop_loss')
+        elif position['direction'] == -1 and event.high >= stop:
+            self.close_position(event.symbol, max(stop, event.open), event.close_time, 'stop_loss')
+
+    def mark(self, symbol, price, time_ms):
+        equity = self.cash
+        position = self.positions.get(symbol)
+        if position is not None:
+            equity += (price - position['entry_price']) * position['size'] * position['direction']
+        self.equity_curve.append((time_ms, equity))
+        return equity
+
+class TradingEngine:
+    """
+    Motor orientado a eventos: cada vela cerrada pasa por el broker (stops), después por la
+    estrategia y, si esta da señal sin posición abierta, el gestor de riesgo dimensiona la
+    entrada. Estrategia y gestor de riesgo son los mismos objetos que usa main.py, así que el
+    backtest ejecuta exactamente la lógica desplegada.
+
+    :param execution_timeframe: Serie del símbolo operado con la que el broker revisa los stops
+                                (por defecto la de la estrategia; p. ej. '1h' para más precisión).
+    :param signal_filter: Función opcional (signal, event) -> bool que puede vetar una entrada.
+    """
+    def __init__(self, strategy, risk_manager, broker, execution_timeframe=None, signal_filter=None):
+        self.strategy = strategy
+        self.risk_manager = risk_manager
+        self.broker = broker
+        self.execution_key = (strategy.symbol, execution_timeframe or strategy.timeframe)
+        self.signal_filter = signal_filter
+
+    def on_candle(self, event):
+        if (event.symbol, event.timeframe) == self.execution_key:
+            self.broker.on_candle(event)
+        if not self.strategy.on_candle(event):
+            return None
+
+        self.broker.mark(event.symbol, event.close, event.close_time)
+        signal = self.strategy.signal
+        if signal is None or self.broker.in_position(event.symbol):
+            return signal
+        if self.signal_filter is not None and not self.signal_filter(signal, event):
+            return signal
+        size, stop_loss_price = self.risk_manager.position_details(
+            price=event.close,
+            balance=self.broker.balance(),
+            atr=self.strategy.latest['ATR'],
+            side=signal
+        )
+        if size > 0:
+            self.broker.open_position(event.symbol, signal, size, event.close, stop_loss_price, event.close_time)
+        return signal
+
+    def run(self, events):
+        for event in events:
+            self.on_candle(event)
+        return self.broker
+
+def run_historical(frames, strategy, risk_manager, initial_capital=10000.0, fee_rate=0.0, slippage_bps=0.0,
+                   execution_timeframe=None, start_ms=None):
+    """
+    Backtest de `strategy` con las velas de `frames` ({(símbolo, temporalidad): df}). Con
+    start_ms, las velas anteriores solo calientan los indicadores (no se abren posiciones).
+
+    :return: Diccionario de resultados (ver summarize) con las operaciones en 'trades'.
+    """
+    missing = [key for key in strategy.subscriptions if key not in frames]
+    if missing:
+        raise ValueError(f"Faltan las series {missing} para la estrategia.")
+    execution_key = (strategy.symbol, execution_timeframe or strategy.timeframe)
+    if execution_key not in frames:
+        raise ValueError(f"Falta la serie de ejecución {execution_key}.")
+
+    # Una serie de ejecución más fina va primero: un stop en la misma vela se revisa antes de la nueva señal
+    ordered = {}
+    if execution_key not in strategy.subscriptions:
+        ordered[execution_key] = frames[execution_key]
+    ordered.update((key, frames[key]) for key in strategy.subscriptions)
+    strategy.reset()
+    broker = SimulatedBroker(initial_capital=initial_capital, fee_rate=fee_rate, slippage_bps=slippage_bps)
+    signal_filter = None if start_ms is None else (lambda signal, event: event.close_time >= start_ms)
+    engine = TradingEngine(strategy, risk_manager, broker, execution_timeframe=execution_timeframe, signal_filter=signal_filter)
+    engine.run(candle_events(ordered))
+    return summarize(broker)
+
+def summarize(broker):
+    """
+    Métricas del backtest: capital final (equity a precio de mercado), PnL, drawdown máximo sobre
+    la curva de equity, tasa de acierto y profit factor.
+    """
+    trades = pd.DataFrame(broker.trades, columns=['symbol', 'side', 'size', 'entry_time', 'exit_time',
+                                                  'entry_price', 'exit_price', 'pnl', 'exit_reason'])
+    for column in ('entry_time', 'exit_time'):
+        trades[column] = pd.to_datetime(trades[column], unit='ms')
+    equity = np.array([value for _, value in broker.equity_curve] or [broker.cash])
+    running_max = np.maximum.accumulate(np.maximum(equity, broker.initial_capital))
+    drawdown_pct = (running_max - equity) / running_max
+    wins = trades.loc[trades['pnl'] > 0, 'pnl']
+    losses = trades.loc[trades['pnl'] <= 0, 'pnl']
+    return {
+        'initial_capital': broker.initial_capital,
+        'final_capital': float(equity[-1]),
+        'net_profit': float(equity[-1] - broker.initial_capital),
+        'max_drawdown_pct': float(drawdown_pct.max()),
+        'total_trades': len(trades),
+        'win_rate': len(wins) / len(trades) if len(trades) else 0.0,
+        'profit_factor': wins.sum() / abs(losses.sum()) if losses.sum() < 0 else np.inf,
+        'open_positions': dict(broker.positions),
+        'trades': trades,
+    }
+
+if __name__ == "__main__":
+    from candle_store import candle_store, read_ohlcv_csv
+    from config import config
+    from risk_manager import RiskManager
+    from strategy import Strategy
+
+    parser = argparse.ArgumentParser(description="Backtest de la estrategia desplegada con el motor de eventos.")
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR,
+                        help="Directorio con SOL_USDT_6h.csv, BTC_USDT_6h.csv y BTC_USDT_1d.csv.")
+    parser.add_argument('--execution-csv', help="CSV de velas más finas de SOL para revisar los stops (p. ej. 1h).")
+    parser.add_argument('--execution-timeframe', default='1h')
+    parser.add_argument('--capital', type=float, default=10000.0)
+    parser.add_argument('--fee-rate', type=float, default=config.REPLAY_FEE_RATE)
+    parser.add_argument('--slippage-bps', type=float, default=config.REPLAY_SLIPPAGE_BPS)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    set_log_level(args.log_level)
+    strategy = Strategy(config.STRATEGY_CONFIG, verbose=False)
+    frames = {
+        key: candle_store.load_or_csv(*key, os.path.join(args.data_dir, f"{key[0].replace('/', '_')}_{key[1]}.csv"))
+        for key in strategy.subscriptions
+    }
+    execution_timeframe = None
+    if args.execution_csv:
+        execution_timeframe = args.execution_timeframe
+        frames[(strategy.symbol, execution_timeframe)] = read_ohlcv_csv(args.execution_csv)
+
+    start = time.perf_counter()
+    results = run_historical(frames, strategy, RiskManager.from_config(config, verbose=False),
+                             initial_capital=args.capital, fee_rate=args.fee_rate, slippage_bps=args.slippage_bps,
+                             execution_timeframe=execution_timeframe)
+    elapsed = time.perf_counter() - start
+    log.info(f"Backtest completado en {elapsed:.2f}s.")
+
+    print(f"\n--- Backtest con el motor de eventos ({elapsed:.2f}s) ---")
+    print(f"Capital inicial: ${results['initial_capital']:,.2f} | Capital final: ${results['final_capital']:,.2f}")
+    print(f"Beneficio neto: ${results['net_profit']:,.2f} | Drawdown máximo: {results['max_drawdown_pct']:.2%}")
+    print(f"Operaciones: {results['total_trades']} | Tasa de acierto: {results['win_rate']:.2%} | "
+          f"Profit factor: {results['profit_factor']:.2f}")
+    if results['open_positions']:
+        print(f"Posiciones abiertas al final: {list(results['open_positions'])}")
@@ -2,23 +2,30 @@ import time
 from api_client import api_client
 from logger import log
 from notifier import notifier
-from config import config
+from subsystems import subsystems
 
 class ExecutionHandler:
     """
     Gestiona la colocación, monitoreo y cancelación de órdenes en el exchange.
+
+    En modo SIMULATED las órdenes son de papel, salvo que se le pase un exchange de repetición
+    (replay_exchange.py): entonces se envían a él y se llenan y disparan como en el exchange real.
     """
-    def __init__(self, bot_mode='SIMULATED'):
+    def __init__(self, bot_mode='SIMULATED', exchange=None):
         self.bot_mode = bot_mode
+        self.exchange = exchange
         log.info("Módulo de Ejecución inicializado.")
 
+    def _get_exchange(self):
+        return self.exchange if self.exchange is not None else api_client.exchange
+
     # --- NUEVA FUNCIÓN MEJORADA ---
     def place_market_order_with_sl(self, symbol, side, amount, stop_loss, leverage):
         """
         Coloca una orden de mercado con un stop-loss asociado.
-        En modo SIMULATED, solo registra la acción (paper trading).
+        En modo SIMULATED sin exchange de repetición, solo registra la acción (paper trading).
         """
-        if self.bot_mode == 'SIMULATED':
+        if self.bot_mode == 'SIMULATED' and self.exchange is None:
             log.info("--- MODO SIMULADO: Registrando orden en lugar de ejecutarla ---")
             log.info(f"ORDEN DE PAPEL: {side.upper()} {amount:.4f} {symbol}")
             log.info(f"PARÁMETROS: Stop-Loss=${stop_loss:.2f}, Apalancamiento={leverage}x")
@@ -31,8 +38,9 @@ class ExecutionHandler:
                 'amount': amount
             }
         
-        # --- LÓGICA DE TRADING REAL ---
-        log.info(f"Iniciando ejecución de orden REAL para {symbol}...")
+        # --- LÓGICA DE TRADING REAL (o contra la repetición en modo SIMULATED) ---
+        label = 'REAL' if self.bot_mode == 'LIVE' else 'SIMULADA'
+        log.info(f"Iniciando ejecución de orden {label} para {symbol}...")
         try:
             # CCXT unifica la compra ('long') y venta ('short') con el parámetro 'side'
             # La mayoría de exchanges permiten añadir el stop-loss en los parámetros de la orden
@@ -45,10 +53,10 @@ class ExecutionHandler:
             # Asegurarse de que el exchange esté configurado para el apalancamiento deseado
             # api_client.exchange.set_leverage(leverage, symbol) # Esta línea puede ser necesaria dependiendo del exchange
 
-            order = api_client.exchange.create_market_order(symbol, side, amount, params=params)
+            order = self._get_exchange().create_market_order(symbol, side, amount, params=params)
             
             mensaje = (
-                f"✅ **ORDEN REAL ENVIADA**\n\n"
+                f"✅ **ORDEN {label} ENVIADA**\n\n"
                 f"**Activo:** {symbol}\n"
                 f"**Tipo:** {side.upper()} @ Mercado\n"
                 f"**Cantidad:** {amount:.4f}\n"
@@ -57,7 +65,7 @@ class ExecutionHandler:
             notifier.send_message(mensaje)
             return order
         except Exception as e:
-            log.error(f"Error al ejecutar la orden REAL: {e}", exc_info=True)
+            log.error(f"Error al ejecutar la orden {label}: {e}", exc_info=True)
             notifier.send_message(f"❌ **ERROR DE EJECUCIÓN**\nNo se pudo colocar la orden para {symbol}. Error: {e}")
             return None
 
@@ -77,12 +85,15 @@ class ExecutionHandler:
         """
         Verifica el estado de una orden específica en el exchange.
         """
-        if self.bot_mode == 'LIVE':
-            # ... (Lógica para obtener estado de orden en real) ...
-            pass
+        if self.bot_mode == 'LIVE' or self.exchange is not None:
+            try:
+                return self._get_exchange().fetch_order(order_id, product_id)
+            except Exception as e:
+                log.error(f"Error al obtener el estado de la orden {order_id}: {e}")
+                return None
         else:
             log.info(f"Verificando estado de la orden simulada {order_id}.")
             return {'status': 'closed'}
 
-# Crear una instancia para ser usada por el bot
-execution_handler = ExecutionHandler(config.BOT_MODE)
\ No newline at end of file
+# Instancia global: se crea en el primer uso (ver subsystems.py)
+execution_handler = subsystems.lazy('execution_handler')
\ No newline at end of file
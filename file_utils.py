@@ -0,0 +1,17 @@
+# trading_bot/file_utils.py
+import os
+
+# umask del proceso: solo se puede consultar cambiándola, así que se lee una vez al importar
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+
+def replacement_mode(path):
+    """
+    Permisos para el archivo temporal que va a sustituir a `path` con os.replace: los del archivo
+    actual o, si aún no existe, los que le daría open(path, 'w') (0o666 menos la umask).
+    tempfile.mkstemp crea el temporal con 0o600 y os.replace los conservaría.
+    """
+    try:
+        return os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        return 0o666 & ~_UMASK
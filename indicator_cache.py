@@ -0,0 +1,109 @@
+# trading_bot/indicator_cache.py
+import hashlib
+import os
+from collections import OrderedDict
+
+import pandas as pd
+from config import config
+from logger import log
+
+class IndicatorCache:
+    """
+    Caché de indicadores técnicos compartida entre backtests y ciclos de la estrategia.
+
+    Cada resultado se indexa por el nombre del indicador, sus parámetros escalares (longitud,
+    multiplicador...) y una huella de las series de entrada, de modo que cada columna de
+    indicador distinta se calcula una sola vez por dataset. La memoria se limita con un LRU
+    de max_entries resultados y, opcionalmente, los resultados se guardan también en disco
+    (disk_dir) para reutilizarlos entre procesos y ejecuciones.
+    """
+    def __init__(self, max_entries=256, disk_dir=None):
+        self.max_entries = max_entries
+        self.disk_dir = disk_dir
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if self.disk_dir:
+            os.makedirs(self.disk_dir, exist_ok=True)
+
+    @staticmethod
+    def fingerprint(series):
+        """
+        Huella del contenido (valores e índice) de una serie de entrada.
+        """
+        hashed = pd.util.hash_pandas_object(series, index=True).to_numpy()
+        return hashlib.blake2b(hashed.tobytes(), digest_size=16).hexdigest()
+
+    def compute(self, func, **kwargs):
+        """
+        Devuelve func(**kwargs) desde la caché, calculándolo solo si no está guardado.
+
+        Los argumentos que son Series forman la huella de los datos de entrada; el resto
+        se consideran parámetros del indicador. El resultado devuelto es compartido:
+        no debe modificarse in situ (asignarlo a una columna de un DataFrame es seguro).
+        """
+        key_parts = [f"{func.__module__}.{func.__qualname__}"]
+        for name in sorted(kwargs):
+            value = kwargs[name]
+            if isinstance(value, pd.Series):
+                key_parts.append(f"{name}={self.fingerprint(value)}")
+            else:
+                key_parts.append(f"{name}={value!r}")
+        key = "|".join(key_parts)
+
+        if key in self._entries:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key]
+
+        result = self._load_from_disk(key)
+        if result is None:
+            self.misses += 1
+            result = func(**kwargs)
+            self._save_to_disk(key, result)
+        else:
+            self.hits += 1
+
+        self._entries[key] = result
+        if len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def _disk_path(self, key):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.disk_dir, f"{digest}.pkl")
+
+    def _load_from_disk(self, key):
+        if not self.disk_dir:
+            return None
+        path = self._disk_path(key)
+        if not os.path.exists(path):
+            return None
+        try:
+            return pd.read_pickle(path)
+        except Exception as e:
+            log.warning(f"No se pudo leer el indicador cacheado en '{path}': {e}")
+            return None
+
+    def _save_to_disk(self, key, result):
+        if not self.disk_dir:
+            return
+        path = self._disk_path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        try:
+            # Escritura atómica: otros procesos nunca ven un archivo a medio escribir
+            pd.to_pickle(result, tmp_path)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            log.warning(f"No se pudo guardar el indicador cacheado en '{path}': {e}")
+
+# Crear una instancia global para ser usada por la estrategia y los backtests
+indicator_cache = IndicatorCache(
+    max_entries=config.INDICATOR_CACHE_SIZE,
+    disk_dir=config.INDICATOR_CACHE_DIR
+)
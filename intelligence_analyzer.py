@@ -1,10 +1,37 @@
 # trading_bot/intelligence_analyzer.py
+import asyncio
+import json
+import re
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
 import google.generativeai as genai
 from config import config
+from local_sentiment import LocalSentimentModel
 from logger import log
+from metrics import metrics
+from sentiment_cache import SentimentCache
+from subsystems import subsystems
+
+VALID_SENTIMENTS = ("POSITIVE", "NEGATIVE", "NEUTRAL")
+SENTIMENT_MODES = ("remote", "local", "prefilter", "fallback")
 
 class IntelligenceAnalyzer:
-    def __init__(self):
+    def __init__(self, cache=None, mode=None, local_model=None):
+        self.mode = (mode or config.SENTIMENT_MODE).lower()
+        if self.mode not in SENTIMENT_MODES:
+            log.warning(f"Modo de sentimiento '{self.mode}' desconocido. Se usará 'remote'.")
+            self.mode = "remote"
+        self.local_min_confidence = config.SENTIMENT_LOCAL_MIN_CONFIDENCE
+        self.local_model = local_model
+        if self.local_model is None and self.mode != "remote":
+            self.local_model = LocalSentimentModel(model_path=config.SENTIMENT_LOCAL_MODEL_PATH)
+
+        # Los veredictos se cachean por conjunto de titulares para no repetir la llamada a Gemini
+        self.cache = cache if cache is not None else SentimentCache(
+            ttl_seconds=config.SENTIMENT_CACHE_TTL_SECONDS,
+            max_entries=config.SENTIMENT_CACHE_SIZE,
+            path=config.SENTIMENT_CACHE_FILE,
+            coalesce_seconds=config.SENTIMENT_CACHE_FLUSH_SECONDS
+        )
         try:
             if not config.GEMINI_API_KEY:
                 raise ValueError("La clave de API de Gemini no fue encontrada en el archivo .env")
@@ -20,9 +47,53 @@ class IntelligenceAnalyzer:
         """
         Analiza una lista de titulares y devuelve un sentimiento general.
         """
-        if not self.model or not headlines:
-            return "NEUTRAL" # Devolver un valor seguro si el modelo no funciona o no hay noticias
+        if not headlines:
+            return "NEUTRAL" # Devolver un valor seguro si no hay noticias
+
+        # Veredicto local (sin red) para los modos que lo usan antes que Gemini
+        local_sentiment = None
+        if self.mode in ("local", "prefilter"):
+            with metrics.span('sentiment_local'):
+                local_sentiment, confidence = self.local_model.score(headlines)
+            if self.mode == "local" or confidence >= self.local_min_confidence:
+                log.info(f"Sentimiento del modelo local: {local_sentiment} (confianza {confidence:.2f})")
+                return local_sentiment
+            log.info(f"Modelo local dudoso ({local_sentiment}, confianza {confidence:.2f}). Consultando a Gemini...")
+
+        if not self.model:
+            return self._local_fallback(headlines, local_sentiment)
 
+        cached = self.cache.get(headlines)
+        if cached is not None:
+            metrics.inc('sentiment_cache_hits')
+            log.info(f"Sentimiento obtenido de la caché: {cached}")
+            return cached
+        metrics.inc('sentiment_cache_misses')
+
+        timeout = config.SENTIMENT_LATENCY_BUDGET_SECONDS if self.mode == "fallback" else None
+        sentiment = self._query_model(headlines, timeout=timeout)
+        if sentiment is None:
+            return self._local_fallback(headlines, local_sentiment)
+        # Solo se cachean respuestas válidas: un error no debe fijar NEUTRAL durante todo el TTL
+        self.cache.put(headlines, sentiment)
+        return sentiment
+
+    def _local_fallback(self, headlines, local_sentiment=None):
+        """
+        Sentimiento a usar cuando Gemini no está disponible, falla o supera el tiempo límite.
+        """
+        if self.mode == "remote" or self.local_model is None:
+            return "NEUTRAL"
+        if local_sentiment is None:
+            local_sentiment, _ = self.local_model.score(headlines)
+        log.info(f"Usando el sentimiento del modelo local: {local_sentiment}")
+        return local_sentiment
+
+    def _query_model(self, headlines, timeout=None):
+        """
+        Consulta a Gemini. Devuelve el sentimiento o None si la respuesta no es utilizable
+        o si supera `timeout` segundos.
+        """
         # Crear el prompt para la IA
         formatted_headlines = "\n- ".join(headlines)
         prompt = (
@@ -34,19 +105,140 @@ class IntelligenceAnalyzer:
 
         try:
             log.info("Enviando titulares a la API de Gemini para análisis de sentimiento...")
-            response = self.model.generate_content(prompt)
+            with metrics.span('gemini_request', kind='single'):
+                if timeout is None:
+                    response = self.model.generate_content(prompt)
+                else:
+                    # Se espera al future, no al hilo: al agotarse el tiempo se vuelve sin esperar a Gemini
+                    response = self._submit_generation(prompt).result(timeout=timeout)
             sentiment = response.text.strip().upper()
             log.info(f"Sentimiento recibido de Gemini: {sentiment}")
 
             # Validar la respuesta
-            if sentiment in ["POSITIVE", "NEGATIVE", "NEUTRAL"]:
+            if sentiment in VALID_SENTIMENTS:
                 return sentiment
             else:
                 log.warning(f"Respuesta no válida de Gemini: '{sentiment}'. Se usará NEUTRAL.")
-                return "NEUTRAL"
+                return None
+        except FuturesTimeoutError:
+            log.warning(f"Gemini superó el tiempo límite de {timeout}s.")
+            return None
         except Exception as e:
             log.error(f"Error al comunicarse con la API de Gemini: {e}")
-            return "NEUTRAL"
+            return None
+
+    def get_batch_sentiment(self, headlines_by_symbol: dict, budget_seconds=None):
+        """
+        Versión síncrona de get_batch_sentiment_async.
+        """
+        return asyncio.run(self.get_batch_sentiment_async(headlines_by_symbol, budget_seconds))
+
+    async def get_batch_sentiment_async(self, headlines_by_symbol: dict, budget_seconds=None):
+        """
+        Analiza los titulares de varios símbolos con una sola llamada a Gemini.
+
+        Los símbolos ya cacheados (o resueltos por el modelo local en los modos 'local' y
+        'prefilter') no se envían. El resto va en un único prompt estructurado que pide un JSON
+        con un veredicto por símbolo. Si la llamada supera budget_seconds (por defecto
+        SENTIMENT_LATENCY_BUDGET_SECONDS) o falla, o falta el veredicto de un símbolo, ese
+        símbolo queda en NEUTRAL (o con el veredicto del modelo local si el modo lo usa).
+
+        :param headlines_by_symbol: Diccionario símbolo -> lista de titulares.
+        :return: Diccionario símbolo -> POSITIVE / NEGATIVE / NEUTRAL.
+        """
+        budget_seconds = config.SENTIMENT_LATENCY_BUDGET_SECONDS if budget_seconds is None else budget_seconds
+        results = {symbol: "NEUTRAL" for symbol in headlines_by_symbol}
+        pending = {}
+        for symbol, headlines in headlines_by_symbol.items():
+            if not headlines:
+                continue
+            if self.mode in ("local", "prefilter"):
+                sentiment, confidence = self.local_model.score(headlines)
+                if self.mode == "local" or confidence >= self.local_min_confidence:
+                    results[symbol] = sentiment
+                    continue
+            cached = self.cache.get(headlines)
+            if cached is not None:
+                results[symbol] = cached
+            else:
+                pending[symbol] = headlines
+
+        if not pending:
+            return results
+
+        verdicts = {}
+        if self.model:
+            try:
+                log.info(f"Enviando titulares de {len(pending)} símbolos a la API de Gemini en una sola petición...")
+                with metrics.span('gemini_request', kind='batch'):
+                    response = await asyncio.wait_for(self._generate_async(self._build_batch_prompt(pending)), timeout=budget_seconds)
+                verdicts = self._parse_batch_response(response.text, pending)
+            except asyncio.TimeoutError:
+                log.warning(f"La petición de sentimiento por lotes superó el presupuesto de {budget_seconds}s.")
+            except Exception as e:
+                log.error(f"Error al comunicarse con la API de Gemini: {e}")
+
+        for symbol, headlines in pending.items():
+            if symbol in verdicts:
+                results[symbol] = verdicts[symbol]
+                self.cache.put(headlines, verdicts[symbol])
+            else:
+                results[symbol] = self._local_fallback(headlines)
+        log.info(f"Sentimiento por símbolo: {results}")
+        return results
+
+    async def _generate_async(self, prompt):
+        if hasattr(self.model, 'generate_content_async'):
+            return await self.model.generate_content_async(prompt)
+        return await asyncio.wrap_future(self._submit_generation(prompt))
+
+    def _submit_generation(self, prompt):
+        """
+        Lanza generate_content en un hilo propio y devuelve el future. A diferencia de
+        asyncio.to_thread, nadie espera a ese hilo al cerrar el bucle de eventos (asyncio.run
+        espera al ejecutor por defecto), así que al agotarse el presupuesto se vuelve al momento y
+        la respuesta tardía de Gemini se descarta.
+        """
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='gemini')
+        future = executor.submit(self.model.generate_content, prompt)
+        executor.shutdown(wait=False)
+        return future
+
+    @staticmethod
+    def _build_batch_prompt(headlines_by_symbol):
+        sections = []
+        for symbol, headlines in headlines_by_symbol.items():
+            formatted_headlines = "\n- ".join(headlines)
+            sections.append(f"[{symbol}]\n- {formatted_headlines}")
+        return (
+            "Analiza el sentimiento general de los titulares de noticias de cada una de las siguientes criptomonedas. "
+            "Responde únicamente con un objeto JSON que asigne a cada símbolo una de estas tres palabras: "
+            "POSITIVE, NEGATIVE, o NEUTRAL. Ejemplo: {\"SOL/USDT\": \"POSITIVE\"}\n\n"
+            + "\n\n".join(sections)
+        )
+
+    @staticmethod
+    def _parse_batch_response(text, headlines_by_symbol):
+        """
+        Extrae los veredictos válidos del JSON devuelto (ignora símbolos desconocidos o valores no válidos).
+        """
+        match = re.search(r"\{.*\}", text, re.DOTALL)
+        if not match:
+            log.warning(f"Respuesta no válida de Gemini: '{text.strip()}'. Se usará NEUTRAL.")
+            return {}
+        try:
+            parsed = json.loads(match.group(0))
+        except json.JSONDecodeError:
+            log.warning(f"Respuesta no válida de Gemini: '{text.strip()}'. Se usará NEUTRAL.")
+            return {}
+        verdicts = {}
+        for symbol in headlines_by_symbol:
+            sentiment = str(parsed.get(symbol, "")).strip().upper()
+            if sentiment in VALID_SENTIMENTS:
+                verdicts[symbol] = sentiment
+            else:
+                log.warning(f"Veredicto no válido o ausente para {symbol}: '{sentiment}'.")
+        return verdicts
 
-# Crear una instancia para ser usada por el bot
-intelligence_analyzer = IntelligenceAnalyzer()
\ No newline at end of file
+# Instancia global: se crea en el primer uso (ver subsystems.py)
+intelligence_analyzer = subsystems.lazy('intelligence_analyzer')
@@ -0,0 +1,158 @@
+# trading_bot/local_sentiment.py
+import math
+import os
+import re
+from collections import Counter
+
+import joblib
+import numpy as np
+from logger import log
+
+# Léxico de noticias cripto (en inglés, como los titulares que recibe el bot). Pesos en [-3, 3].
+CRYPTO_LEXICON = {
+    # Positivas
+    'surge': 2.0, 'surges': 2.0, 'surged': 2.0, 'soar': 2.5, 'soars': 2.5, 'soared': 2.5,
+    'rally': 2.0, 'rallies': 2.0, 'rallied': 2.0, 'jump': 1.5, 'jumps': 1.5, 'jumped': 1.5,
+    'gain': 1.0, 'gains': 1.0, 'rise': 1.0, 'rises': 1.0, 'rising': 1.0, 'climb': 1.0, 'climbs': 1.0,
+    'strength': 1.0, 'strong': 1.0, 'bullish': 2.0, 'breakout': 1.5, 'record': 1.0, 'high': 0.5,
+    'highs': 1.0, 'adoption': 1.5, 'approval': 2.0, 'approved': 2.0, 'approves': 2.0, 'etf': 0.5,
+    'partnership': 1.5, 'partners': 1.0, 'launch': 1.0, 'launches': 1.0, 'upgrade': 1.0,
+    'growth': 1.0, 'inflows': 1.5, 'accumulation': 1.0, 'recovery': 1.0, 'recovers': 1.0,
+    'outperforms': 1.5, 'milestone': 1.0, 'integration': 1.0, 'buy': 0.5, 'optimism': 1.5,
+    # Negativas
+    'crash': -3.0, 'crashes': -3.0, 'crashed': -3.0, 'plunge': -2.5, 'plunges': -2.5, 'plunged': -2.5,
+    'dump': -2.0, 'dumps': -2.0, 'drop': -1.5, 'drops': -1.5, 'dropped': -1.5, 'fall': -1.0,
+    'falls': -1.0, 'fell': -1.0, 'decline': -1.0, 'declines': -1.0, 'slump': -2.0, 'slumps': -2.0,
+    'bearish': -2.0, 'selloff': -2.0, 'sell-off': -2.0, 'liquidations': -1.5, 'liquidated': -1.5,
+    'hack': -3.0, 'hacked': -3.0, 'exploit': -3.0, 'exploited': -3.0, 'outage': -2.5,
+    'halted': -2.0, 'halts': -2.0, 'downtime': -2.0, 'lawsuit': -2.0, 'sues': -2.0, 'sued': -2.0,
+    'sec': -0.5, 'ban': -2.5, 'bans': -2.5, 'banned': -2.5, 'crackdown': -2.0, 'fraud': -3.0,
+    'scam': -3.0, 'bankruptcy': -3.0, 'insolvent': -3.0, 'outflows': -1.5, 'fear': -1.5,
+    'weak': -1.0, 'weakness': -1.0, 'losses': -1.5, 'loss': -1.0, 'rejected': -2.0, 'rejects': -2.0,
+    'delay': -1.0, 'delays': -1.0, 'investigation': -1.5, 'vulnerability': -2.0, 'warning': -1.0,
+}
+NEGATIONS = frozenset({'not', 'no', 'never', "isn't", "wasn't", "won't", "doesn't", "didn't", 'without', 'fails', 'failed'})
+_TOKEN_RE = re.compile(r"[a-z][a-z'\-]*")
+
+class LocalSentimentModel:
+    """
+    Clasificador de sentimiento de titulares que se ejecuta en el propio proceso.
+
+    Si existe model_path (un pipeline de sklearn texto -> POSITIVE/NEGATIVE/NEUTRAL entrenado
+    con ml_training/train_sentiment_model.py y guardado con joblib, como el resto de modelos),
+    se usa ese modelo; si no, se usa un léxico de noticias cripto con manejo de negaciones.
+    Ambos puntúan un conjunto de titulares en bastante menos de un milisegundo: para el
+    pipeline TF-IDF + LogisticRegression se precalculan los pesos por término y se evita la
+    construcción de matrices dispersas de sklearn (se comprueba al cargar que da las mismas
+    probabilidades que predict_proba; si no, se usa predict_proba).
+    """
+    def __init__(self, model_path=None, threshold=1.0, saturation=4.0):
+        self.threshold = threshold    # Puntuación media mínima (léxico) para salir de NEUTRAL
+        self.saturation = saturation  # Puntuación media (léxico) que equivale a confianza 1.0
+        self.model = None
+        self._linear = None
+        if model_path and os.path.exists(model_path):
+            try:
+                self.model = joblib.load(model_path)
+                self._linear = self._compile_linear(self.model)
+                if self._linear is not None and not self._linear_matches_model():
+                    log.warning("La versión precalculada del modelo de sentimiento no coincide con predict_proba. Se usará predict_proba.")
+                    self._linear = None
+                log.info(f"Modelo local de sentimiento '{model_path}' cargado exitosamente.")
+            except Exception as e:
+                log.error(f"Error al cargar el modelo local de sentimiento: {e}. Se usará el léxico.")
+        if self.model is None:
+            log.info("Modelo local de sentimiento: usando el léxico integrado.")
+
+    def score(self, headlines):
+        """
+        Puntúa un conjunto de titulares.
+
+        :return: Tupla (sentimiento, confianza en [0, 1]).
+        """
+        if not headlines:
+            return "NEUTRAL", 1.0
+        if self.model is not None:
+            return self._score_model(headlines)
+        return self._score_lexicon(headlines)
+
+    def _score_model(self, headlines):
+        if self._linear is not None:
+            probabilities = np.mean([self._linear_proba(headline) for headline in headlines], axis=0)
+        else:
+            probabilities = self.model.predict_proba(list(headlines)).mean(axis=0)
+        best = probabilities.argmax()
+        return str(self.model.classes_[best]), float(probabilities[best])
+
+    @staticmethod
+    def _compile_linear(pipeline):
+        """
+        Precalcula (analizador, vocabulario, idf, coeficientes) de un pipeline TF-IDF +
+        LogisticRegression multinomial. Devuelve None si el pipeline tiene otra forma.
+        """
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+
+        steps = getattr(pipeline, 'steps', None)
+        if not steps or len(steps) != 2:
+            return None
+        vectorizer, classifier = steps[0][1], steps[1][1]
+        if not isinstance(vectorizer, TfidfVectorizer) or not isinstance(classifier, LogisticRegression):
+            return None
+        if vectorizer.norm != 'l2' or len(classifier.classes_) < 3 or classifier.solver == 'liblinear':
+            return None
+        idf = vectorizer.idf_ if vectorizer.use_idf else np.ones(len(vectorizer.vocabulary_))
+        return {
+            'analyzer': vectorizer.build_analyzer(),
+            'vocabulary': vectorizer.vocabulary_,
+            'sublinear_tf': vectorizer.sublinear_tf,
+            'idf': idf,
+            'coef': np.ascontiguousarray(classifier.coef_.T),
+            'intercept': classifier.intercept_,
+        }
+
+    def _linear_matches_model(self):
+        samples = ["", " ".join(list(self._linear['vocabulary'])[:20])]
+        expected = self.model.predict_proba(samples)
+        return all(np.allclose(self._linear_proba(sample), row, atol=1e-9) for sample, row in zip(samples, expected))
+
+    def _linear_proba(self, headline):
+        linear = self._linear
+        counts = Counter(term for term in linear['analyzer'](headline) if term in linear['vocabulary'])
+        logits = linear['intercept'].copy()
+        if counts:
+            indices = [linear['vocabulary'][term] for term in counts]
+            tf = np.fromiter(counts.values(), dtype=float, count=len(counts))
+            if linear['sublinear_tf']:
+                tf = 1.0 + np.log(tf)
+            weights = tf * linear['idf'][indices]
+            weights /= math.sqrt(float(weights @ weights))
+            logits += weights @ linear['coef'][indices]
+        logits -= logits.max()
+        probabilities = np.exp(logits)
+        return probabilities / probabilities.sum()
+
+    def _score_lexicon(self, headlines):
+        total = 0.0
+        matches = 0
+        for headline in headlines:
+            negate = 0
+            for token in _TOKEN_RE.findall(headline.lower()):
+                if token in NEGATIONS:
+                    negate = 3 # La negación afecta a las tres palabras siguientes
+                    continue
+                weight = CRYPTO_LEXICON.get(token)
+                if weight is not None:
+                    total += -weight if negate else weight
+                    matches += 1
+                if negate:
+                    negate -= 1
+        if matches == 0:
+            return "NEUTRAL", 0.0 # Ninguna palabra conocida: el léxico no sabe nada de estos titulares
+        mean_score = total / len(headlines)
+        if mean_score >= self.threshold:
+            return "POSITIVE", min(1.0, mean_score / self.saturation)
+        if mean_score <= -self.threshold:
+            return "NEGATIVE", min(1.0, -mean_score / self.saturation)
+        # Cerca del umbral el veredicto NEUTRAL es dudoso
+        return "NEUTRAL", 1.0 - abs(mean_score) / self.threshold
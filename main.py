@@ -1,115 +1,206 @@
 import time
-import pandas_ta as ta
 from logger import log
 import health_checker
 from config import config
-from api_client import APIClient
 import strategy
-import risk_manager
+from risk_manager import RiskManager
 from state_manager import StateManager
-from notifier import notifier
-from execution_handler import execution_handler
-from intelligence_analyzer import intelligence_analyzer
+from trade_ledger import TradeLedger
+from scheduler import CandleScheduler
+# Cliente del exchange, notificador, ejecución y análisis se importan y crean en su primer uso
+from subsystems import subsystems
+from metrics import metrics
+
+# Series que la estrategia necesita en cada ciclo: (símbolo, temporalidad, velas)
+MARKET_REQUESTS = [
+    ('SOL/USDT', '6h', 400),
+    ('BTC/USDT', '6h', 400),
+    ('BTC/USDT', '1d', 400),
+    ('SOL/USDT', '1d', 120), # Para la matriz de correlación de la cartera (portfolio_analyzer.py)
+]
+# Símbolos cuyos cierres diarios alimentan la matriz de correlación en cada ciclo
+PORTFOLIO_SYMBOLS = ['SOL/USDT', 'BTC/USDT']
 
 def get_latest_solana_news():
     log.info("Simulando obtención de noticias sobre Solana...")
     return ["Solana price shows strength as network activity surges."]
 
+def open_position(symbol, signal, size, price, stop_loss_price, state_manager, execution_handler):
+    """
+    Envía la orden de mercado con su stop-loss y registra la posición con los ids de las órdenes.
+    """
+    side = 'buy' if signal == 'long' else 'sell'
+    order = execution_handler.place_market_order_with_sl(symbol, side, size, stop_loss_price, config.STRATEGY_CONFIG['leverage'])
+    if not order:
+        return False
+    order_details = {
+        'symbol': symbol,
+        'order_id': order.get('id'),
+        'stop_order_id': (order.get('info') or {}).get('stopLossOrderId'),
+    }
+    state_manager.enter_position(symbol, signal, order.get('filled') or size, order.get('average') or price,
+                                 stop_loss_price, order_details=order_details)
+    return True
+
+def check_stop_loss(symbol, state_manager, execution_handler, notifier, now_ms=None):
+    """
+    Si la orden de stop-loss de la posición abierta ya se ejecutó, cierra la posición en el
+    estado y en el registro de operaciones.
+
+    :return: Hora (ms) de la ejecución del stop (now_ms si el exchange no la informa), o None
+             si la posición sigue abierta.
+    """
+    position = state_manager.state.get(symbol, {})
+    stop_order_id = position.get('order_details', {}).get('stop_order_id')
+    if not stop_order_id:
+        return None
+    order = execution_handler.get_order_status(stop_order_id, symbol)
+    if not order or order.get('status') != 'closed':
+        return None
+    exit_price = order.get('average') or order.get('price')
+    # Algunos exchanges no informan del precio de una orden stop ejecutada: se cierra igualmente, sin PnL
+    price_text = f"${exit_price:,.2f}" if exit_price is not None else "precio desconocido"
+    log.info(f"Stop-loss de {symbol} ejecutado a {price_text}. Cerrando la posición.")
+    state_manager.exit_position(symbol, exit_price=exit_price)
+    notifier.send_message(f"🛑 **Stop-Loss ejecutado**\n{symbol} cerrado a {price_text}")
+    return order.get('lastTradeTimestamp') or now_ms
+
 def main():
     log.info("==============================================")
     log.info(f"    INICIANDO BOT - MODO: {config.BOT_MODE}    ")
     log.info(f"    ESTRATEGIA: Breakout 6H (SOL/USDT)    ")
     log.info("==============================================")
     
-    api_client = APIClient() 
-    state_manager = StateManager()
+    startup_time = time.perf_counter()
+    metrics.start(port=config.METRICS_PORT, file_path=config.METRICS_FILE,
+                  file_interval=config.METRICS_FILE_INTERVAL_SECONDS)
+    clock = subsystems.get('clock') # Reloj del sistema, o el virtual en las repeticiones (replay_exchange.py)
+    notifier = subsystems.get('notifier')
+    api_client = subsystems.get('api_client')
+    execution_handler = subsystems.lazy('execution_handler') # Solo se crea si se llega a operar
+    state_manager = StateManager(state_file=config.STATE_FILE, ledger=TradeLedger(config.TRADE_LEDGER_DB, clock=clock.time))
+    # Los mismos objetos de estrategia y riesgo que ejecutan los backtests de engine.py
+    signal_engine = strategy.BreakoutSignalEngine(config, timeframe='6h')
+    risk_manager = RiskManager.from_config(config)
+    portfolio_analyzer = subsystems.get('portfolio_analyzer')
+    cycle_runtime = subsystems.get('cycle_runtime')
+    scheduler = CandleScheduler(
+        timeframe='6h',
+        settle_delay=config.CANDLE_SETTLE_DELAY_SECONDS,
+        position_poll_interval=config.POSITION_POLL_SECONDS,
+        clock=clock.time, monotonic=clock.monotonic, sleep=clock.sleep
+    )
 
     notifier.send_message(f"✅ **Bot Iniciado**\nModo: {config.BOT_MODE}\nEstrategia: Breakout 6H (SOL)")
     if not health_checker.perform_initial_checks(api_client):
         return
+    subsystems.report()
+    log.info(f"Bot listo para operar en {time.perf_counter() - startup_time:.2f}s.")
+    # Solo se opera con velas que cierran después de este instante (ms): la última vela evaluada o
+    # la salida de la última posición. Así cada vela se evalúa una vez y, como en engine.py, no se
+    # entra con una vela que cerró mientras la posición seguía abierta.
+    signal_after_ms = None
     
     while True:
         log.info("***************** INICIANDO NUEVO CICLO DE TRADING *****************")
         
         try:
-            current_balance = api_client.get_balance('USDT')
+            scheduler.mark_cycle()
+
+            # Balance y velas se piden en paralelo (con tiempo límite por llamada)
+            in_position = state_manager.is_in_position('SOL/USDT')
+            cycle_data = cycle_runtime.run_cycle(
+                market_requests=[] if in_position else MARKET_REQUESTS,
+                currency='USDT'
+            )
+
+            current_balance = cycle_data['balance']
             if current_balance is not None:
                 log.info(f"SALDO ACTUAL EN CUENTA: ${current_balance:,.2f} USDT")
+                state_manager.ledger.record_equity(current_balance)
             else:
                 log.warning("No se pudo obtener el balance actual de la cuenta.")
 
-            if state_manager.is_in_position('SOL/USDT'):
+            if in_position:
                 log.info("Posición abierta detectada para SOL. Monitoreando condiciones de salida.")
-                time.sleep(300)
+                exit_ms = check_stop_loss('SOL/USDT', state_manager, execution_handler, notifier,
+                                          now_ms=int(clock.time() * 1000))
+                if exit_ms is not None:
+                    signal_after_ms = max(signal_after_ms or 0, exit_ms)
+                scheduler.wait(in_position=True)
                 continue
 
             log.info("Buscando nueva oportunidad de entrada para SOL...")
-            sol_data = api_client.get_historical_data('SOL/USDT', '6h', limit=400)
-            btc_6h_data = api_client.get_historical_data('BTC/USDT', '6h', limit=400)
-            btc_1d_data = api_client.get_historical_data('BTC/USDT', '1d', limit=400)
+            # Las velas diarias del ciclo actualizan la correlación sin peticiones adicionales antes de operar
+            for symbol in PORTFOLIO_SYMBOLS:
+                portfolio_analyzer.update(symbol, cycle_data[(symbol, '1d')], now_ms=int(clock.time() * 1000))
+            sol_data = cycle_data[('SOL/USDT', '6h')]
+            btc_6h_data = cycle_data[('BTC/USDT', '6h')]
+            btc_1d_data = cycle_data[('BTC/USDT', '1d')]
             
             if sol_data is not None and not sol_data.empty and btc_6h_data is not None and btc_1d_data is not None:
-                signal = strategy.check_strategy_6h_breakout(sol_data, btc_6h_data, btc_1d_data, config)
+                # El motor se siembra en el primer ciclo y después solo procesa las velas cerradas nuevas
+                signal_engine.update(sol_data, btc_6h_data, btc_1d_data, now_ms=int(clock.time() * 1000))
+                candle_close_ms = signal_engine.last_close_ms
+                if candle_close_ms is None or (signal_after_ms is not None and candle_close_ms <= signal_after_ms):
+                    log.info("No hay velas cerradas nuevas desde la última evaluación o la última salida. Esperando a la siguiente.")
+                    scheduler.wait()
+                    continue
+                signal_after_ms = candle_close_ms
+                signal = signal_engine.check_signal()
                 log.info(f"Señal de la estrategia cuantitativa: {signal}")
+                metrics.inc('signals', signal=signal or 'none')
                 
                 if signal in ['long', 'short']:
                     if signal == 'long':
                         log.info("Señal de compra recibida. Consultando filtro de IA...")
-                        headlines = get_latest_solana_news()
-                        sentiment = intelligence_analyzer.get_news_sentiment(headlines)
+                        # Noticias y sentimiento solo cuando hay una señal que filtrar
+                        sentiment = cycle_runtime.fetch_sentiment(get_latest_solana_news())
                         
                         if sentiment == 'NEGATIVE':
                             log.warning("OPERACIÓN VETADA POR IA.")
-                            time.sleep(300)
+                            scheduler.wait()
                             continue
                         
                         log.info(f"Sentimiento de mercado '{sentiment}'. APROBANDO operación.")
 
+                    if portfolio_analyzer.is_highly_correlated('SOL/USDT', open_trades=state_manager.state):
+                        log.warning("OPERACIÓN VETADA: SOL está muy correlacionado con las posiciones abiertas.")
+                        scheduler.wait()
+                        continue
+
                     if current_balance is not None and current_balance > 0:
                         current_price = sol_data['close'].iloc[-1]
-                        atr = ta.atr(sol_data['high'], sol_data['low'], sol_data['close'], length=14).iloc[-1]
+                        atr = signal_engine.latest['ATR']
                         
-                        position_size, sl_long, sl_short = risk_manager.calculate_position_details(
+                        position_size, stop_loss_price = risk_manager.position_details(
                             price=current_price,
                             balance=current_balance,
-                            risk_pct=config.STRATEGY_CONFIG['risk_pct'],
                             atr=atr,
-                            atr_stop_mult=config.STRATEGY_CONFIG['atr_stop_mult']
+                            side=signal
                         )
                         
-                        stop_loss_price = sl_long if signal == 'long' else sl_short
-                        
                         if position_size > 0:
                             log.info(f"Ejecutando orden {signal.upper()} para {position_size:.4f} SOL a ${current_price:.2f}")
                             
-                            log.warning("LA EJECUCIÓN DE ÓRDENES ESTÁ DESACTIVADA. Esta es una prueba en seco.")
-                            # order_result = execution_handler.place_market_order_with_sl(...)
+                            if config.ORDER_EXECUTION_ENABLED:
+                                open_position('SOL/USDT', signal, position_size, current_price, stop_loss_price,
+                                              state_manager, execution_handler)
+                            else:
+                                log.warning("LA EJECUCIÓN DE ÓRDENES ESTÁ DESACTIVADA. Esta es una prueba en seco.")
                 else:
                     # --- MEJORA 2: Notificación de "Sigo Vivo" en Telegram ---
                     log.info("No hay señal. Enviando notificación de estado.")
                     notifier.send_message("✅ Ciclo completado sin señal. El bot sigue activo y monitoreando.")
             
-            # --- MEJORA 1: Temporizador Visual en la Consola ---
-            total_sleep_seconds = 6 * 60 * 60
-            sleep_interval_seconds = 15 * 60 # Intervalo de 15 minutos
-            
-            log.info("Ciclo finalizado. Entrando en modo de espera de 6 horas...")
-            num_intervals = total_sleep_seconds // sleep_interval_seconds
-            
-            for i in range(num_intervals):
-                remaining_seconds = total_sleep_seconds - ((i + 1) * sleep_interval_seconds)
-                # Convertir segundos a horas y minutos para el log
-                hours, remainder = divmod(remaining_seconds, 3600)
-                minutes, _ = divmod(remainder, 60)
-                # Usamos print() con '\r' para una línea que se actualiza sola en la consola
-                print(f"  Próximo ciclo de análisis en {int(hours)}h {int(minutes)}m...          \r", end="")
-                time.sleep(sleep_interval_seconds)
-            print("\n") # Nueva línea para limpiar el contador
+            # --- MEJORA 1: Espera alineada con el cierre de la siguiente vela de 6h (con contador visual) ---
+            scheduler.wait()
         
         except Exception as e:
             log.error(f"Ocurrió un error en el bucle principal: {e}", exc_info=True)
+            metrics.inc('cycle_errors')
             notifier.send_message(f"🚨 **Error Crítico en el Bot**\nError: {e}")
-            time.sleep(60)
+            clock.sleep(60)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
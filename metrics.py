@@ -0,0 +1,232 @@
+# trading_bot/metrics.py
+import functools
+import os
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import config
+from file_utils import replacement_mode
+from logger import log
+
+# Límites (en segundos) de los histogramas de latencia
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+METRIC_PREFIX = 'tradingbot_'
+
+class _NullSpan:
+    """
+    Span vacío que se devuelve cuando las métricas están desactivadas (no mide nada).
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+_NULL_SPAN = _NullSpan()
+
+class _Span:
+    __slots__ = ('metrics', 'key', 'start')
+
+    def __init__(self, metrics, key):
+        self.metrics = metrics
+        self.key = key
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.metrics._observe(self.key, time.perf_counter() - self.start)
+        if exc_type is not None:
+            self.metrics._increment((f"{self.key[0]}_errors", self.key[1]), 1)
+        return False
+
+class _Histogram:
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self, n_buckets):
+        self.counts = [0] * n_buckets
+        self.sum = 0.0
+        self.count = 0
+
+class Metrics:
+    """
+    Medición ligera de tiempos (spans) y contadores del bot en vivo.
+
+    Cada span acumula su duración en un histograma de latencias por nombre (y etiquetas
+    opcionales, p. ej. el símbolo); los errores dentro de un span cuentan en <nombre>_errors.
+    Las métricas se exponen en formato de texto de Prometheus por HTTP local (METRICS_PORT) o
+    escribiéndolas periódicamente en un archivo (METRICS_FILE). Desactivadas, span() devuelve un
+    objeto vacío compartido y inc() vuelve de inmediato, así que el coste es despreciable.
+    """
+    def __init__(self, enabled=False, buckets=DEFAULT_BUCKETS):
+        self.enabled = enabled
+        self.buckets = tuple(buckets)
+        self._histograms = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+        self._server = None
+        self._writer = None
+
+    # --- API de medición ---
+    def span(self, name, **labels):
+        """
+        Context manager que mide la duración del bloque: `with metrics.span('gemini_request'):`
+        """
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, (name, tuple(sorted(labels.items()))))
+
+    def timed(self, name, **labels):
+        """
+        Decorador equivalente a envolver la función en un span.
+        """
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with self.span(name, **labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def observe(self, name, seconds, **labels):
+        """
+        Registra una duración medida por fuera de un span.
+        """
+        if not self.enabled:
+            return
+        self._observe((name, tuple(sorted(labels.items()))), seconds)
+
+    def inc(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        self._increment((name, tuple(sorted(labels.items()))), value)
+
+    def _observe(self, key, seconds):
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = _Histogram(len(self.buckets))
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram.counts[i] += 1
+                    break
+            histogram.sum += seconds
+            histogram.count += 1
+
+    def _increment(self, key, value):
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def reset(self):
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    # --- Exportación ---
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        items = list(labels) + list(extra)
+        if not items:
+            return ''
+        return '{' + ','.join(f'{key}="{value}"' for key, value in items) + '}'
+
+    def render_prometheus(self):
+        """
+        Devuelve todas las métricas en el formato de texto de Prometheus.
+        """
+        with self._lock:
+            histograms = {key: (list(h.counts), h.sum, h.count) for key, h in self._histograms.items()}
+            counters = dict(self._counters)
+
+        lines = []
+        for name in sorted({key[0] for key in histograms}):
+            metric = f"{METRIC_PREFIX}{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            for (key_name, labels), (counts, total, count) in sorted(histograms.items()):
+                if key_name != name:
+                    continue
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets, counts):
+                    cumulative += bucket_count
+                    lines.append(f"{metric}_bucket{self._format_labels(labels, [('le', bound)])} {cumulative}")
+                lines.append(f"{metric}_bucket{self._format_labels(labels, [('le', '+Inf')])} {count}")
+                lines.append(f"{metric}_sum{self._format_labels(labels)} {total}")
+                lines.append(f"{metric}_count{self._format_labels(labels)} {count}")
+        for name in sorted({key[0] for key in counters}):
+            metric = f"{METRIC_PREFIX}{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            for (key_name, labels), value in sorted(counters.items()):
+                if key_name == name:
+                    lines.append(f"{metric}{self._format_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_file(self, path):
+        """
+        Escribe las métricas en `path` de forma atómica (para node_exporter textfile o inspección manual).
+        """
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.metrics_', suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(self.render_prometheus())
+            os.chmod(tmp_path, replacement_mode(path))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def start(self, port=None, file_path=None, file_interval=30.0, host='127.0.0.1'):
+        """
+        Activa la exportación: servidor HTTP local en `port` (/metrics) y/o escritura periódica en `file_path`.
+        """
+        if not self.enabled:
+            return
+        if port and self._server is None:
+            metrics = self
+
+            class _MetricsHandler(BaseHTTPRequestHandler):
+                def do_GET(self):
+                    if self.path.split('?')[0] not in ('/', '/metrics'):
+                        self.send_error(404)
+                        return
+                    body = metrics.render_prometheus().encode('utf-8')
+                    self.send_response(200)
+                    self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                    self.send_header('Content-Length', str(len(body)))
+                    self.end_headers()
+                    self.wfile.write(body)
+
+                def log_message(self, format, *args):
+                    pass # Sin ruido en la consola del bot
+
+            self._server = ThreadingHTTPServer((host, port), _MetricsHandler)
+            threading.Thread(target=self._server.serve_forever, name="MetricsServer", daemon=True).start()
+            log.info(f"Métricas disponibles en http://{host}:{port}/metrics")
+        if file_path and self._writer is None:
+            def write_periodically():
+                while True:
+                    time.sleep(file_interval)
+                    try:
+                        self.write_file(file_path)
+                    except Exception as e:
+                        log.warning(f"No se pudieron escribir las métricas en '{file_path}': {e}")
+
+            self._writer = threading.Thread(target=write_periodically, name="MetricsWriter", daemon=True)
+            self._writer.start()
+            log.info(f"Métricas escritas cada {file_interval:.0f}s en '{file_path}'.")
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+# Crear una instancia global para ser usada por todos los módulos
+metrics = Metrics(enabled=config.METRICS_ENABLED)
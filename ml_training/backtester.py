@@ -1,96 +1,229 @@
 # ml_training/backtester.py
 import sys
 import os
-import pandas as pd
-import pandas_ta as ta
+import argparse
+import time
+import numpy as np
 
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 
-from strategy import Strategy
+from config import config
+from engine import SimulatedBroker, run_historical, summarize
+from strategy import Strategy, breakout_signals
+from timeframes import timeframe_to_ms
 from risk_manager import RiskManager
+from candle_store import candle_store, read_ohlcv_csv
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+def run_backtest_engine(sol_df, btc_6h_df, btc_1d_df, strategy_params=None, risk_params=None, initial_capital=10000,
+                        verbose=True, fee_rate=0.0, slippage_bps=0.0, execution_df=None, execution_timeframe='1h',
+                        vectorized=False):
+    """
+    Backtest de la estrategia desplegada (strategy.Strategy + risk_manager.RiskManager) con el
+    motor de eventos de engine.py: las velas se entregan una a una en orden de cierre, como en
+    vivo, y los indicadores se actualizan de forma incremental (lineal en la longitud del histórico).
+
+    Con vectorized=True los indicadores y las señales se calculan una sola vez por lotes sobre
+    todo el histórico (strategy.breakout_signals) y la lógica de posición se recorre en una
+    única pasada sobre arrays de NumPy, con el mismo broker y gestor de riesgo. Da las mismas
+    operaciones, capital final y drawdown máximo que el motor de eventos (ver --check).
+
+    :param strategy_params: Cambios sobre config.STRATEGY_CONFIG (p. ej. {'adx_min': 20.0}).
+    :param risk_params: {'risk_per_trade', 'atr_stop_mult'}; por defecto los de STRATEGY_CONFIG.
+    :param execution_df: Velas más finas de SOL (execution_timeframe) para revisar los stops.
+    :return: Resultados de engine.summarize (capital, drawdown, métricas y operaciones en 'trades').
+    """
+    strategy = Strategy(config.STRATEGY_CONFIG, verbose=False, **(strategy_params or {}))
+    risk_params = risk_params or {}
+    risk_manager = RiskManager(
+        default_risk_per_trade=risk_params.get('risk_per_trade', strategy.params['risk_pct']),
+        atr_stop_mult=risk_params.get('atr_stop_mult', strategy.params['atr_stop_mult']),
+        verbose=False
+    )
+
+    frames = {
+        (strategy.symbol, strategy.timeframe): sol_df,
+        (strategy.context_symbol, strategy.timeframe): btc_6h_df,
+        (strategy.context_symbol, '1d'): btc_1d_df,
+    }
+    if vectorized:
+        signals = breakout_signals(sol_df, btc_6h_df, btc_1d_df, strategy.params, timeframe=strategy.timeframe)
+        broker = SimulatedBroker(initial_capital=initial_capital, fee_rate=fee_rate, slippage_bps=slippage_bps)
+        if execution_df is None:
+            execution_df, execution_timeframe = sol_df, strategy.timeframe
+        _run_vectorized_pass(signals, execution_df, timeframe_to_ms(execution_timeframe), strategy.symbol, risk_manager, broker)
+        results = summarize(broker)
+    else:
+        if execution_df is not None:
+            frames[(strategy.symbol, execution_timeframe)] = execution_df
+        results = run_historical(frames, strategy, risk_manager, initial_capital=initial_capital, fee_rate=fee_rate,
+                                 slippage_bps=slippage_bps,
+                                 execution_timeframe=execution_timeframe if execution_df is not None else None)
+
+    if verbose:
+        for trade in results['trades'].itertuples():
+            print(f"{trade.entry_time.date()}: {trade.side.upper()} a ${trade.entry_price:,.2f} -> "
+                  f"{trade.exit_time.date()}: salida ({trade.exit_reason}) a ${trade.exit_price:,.2f} | P/L: ${trade.pnl:,.2f}")
+    return results
+
+def _run_vectorized_pass(signals, execution_df, execution_timeframe_ms, symbol, risk_manager, broker):
+    """
+    Recorre una sola vez las velas con señal y las de ejecución en orden de cierre, sobre arrays,
+    aplicando la misma secuencia que engine.TradingEngine: stops con las velas de ejecución
+    cerradas hasta ese momento (antes que la señal con el mismo cierre), equity a precio de
+    cierre y entrada si hay señal sin posición abierta.
+    """
+    close_times = signals['close_time'].to_numpy(dtype=np.int64)
+    closes = signals['close'].to_numpy(dtype=float).tolist()
+    atrs = signals['ATR'].to_numpy(dtype=float).tolist()
+    codes = signals['signal'].to_numpy().tolist()
+
+    exec_ts = execution_df['timestamp'].to_numpy(dtype=np.int64)
+    exec_close_times = exec_ts + execution_timeframe_ms
+    exec_ts, exec_close_times = exec_ts.tolist(), exec_close_times.tolist()
+    exec_open, exec_high, exec_low = (execution_df[column].to_numpy(dtype=float).tolist() for column in ('open', 'high', 'low'))
+    # Velas de ejecución ya cerradas (y revisadas) al llegar cada vela con señal
+    bounds = np.searchsorted(exec_close_times, close_times, side='right').tolist() + [len(exec_ts)]
+
+    checked = 0
+    for i, bound in enumerate(bounds):
+        position = broker.positions.get(symbol)
+        if position is not None:
+            stop, direction = position['stop_loss_price'], position['direction']
+            for j in range(checked, bound):
+                if exec_ts[j] < position['entry_time']:
+                    continue
+                if direction == 1 and exec_low[j] <= stop:
+                    broker.close_position(symbol, min(stop, exec_open[j]), exec_close_times[j], 'stop_loss')
+                    break
+                if direction == -1 and exec_high[j] >= stop:
+                    broker.close_position(symbol, max(stop, exec_open[j]), exec_close_times[j], 'stop_loss')
+                    break
+        checked = bound
+        if i == len(closes):
+            break # Solo quedaban las velas de ejecución posteriores a la última señal
+
+        broker.mark(symbol, closes[i], close_times[i])
+        if codes[i] and not broker.in_position(symbol):
+            side = 'long' if codes[i] == 1 else 'short'
+            size, stop_loss_price = risk_manager.position_details(price=closes[i], balance=broker.balance(), atr=atrs[i], side=side)
+            if size > 0:
+                broker.open_position(symbol, side, size, closes[i], stop_loss_price, int(close_times[i]))
+    return broker
+
+def compare_results(results, reference):
+    """
+    Diferencias entre dos resultados de backtest (operaciones, capital final y drawdown máximo).
+    Lista vacía si coinciden.
+    """
+    differences = []
+    for key in ('final_capital', 'max_drawdown_pct'):
+        if not np.isclose(results[key], reference[key], rtol=1e-9, atol=1e-9):
+            differences.append(f"{key}: {results[key]} != {reference[key]}")
+    trades, reference_trades = results['trades'], reference['trades']
+    if len(trades) != len(reference_trades):
+        differences.append(f"operaciones: {len(trades)} != {len(reference_trades)}")
+    else:
+        for column in ('side', 'entry_time', 'exit_time', 'exit_reason'):
+            if not (trades[column].to_numpy() == reference_trades[column].to_numpy()).all():
+                differences.append(f"operaciones: columna {column} distinta")
+        for column in ('size', 'entry_price', 'exit_price', 'pnl'):
+            if not np.allclose(trades[column].to_numpy(dtype=float), reference_trades[column].to_numpy(dtype=float), rtol=1e-9, atol=1e-9):
+                differences.append(f"operaciones: columna {column} distinta")
+    if set(results['open_positions']) != set(reference['open_positions']):
+        differences.append("posiciones abiertas distintas")
+    return differences
+
+def build_report(results, historical_data):
+    """
+    Informe del backtest: las métricas de engine.summarize más el periodo, el retorno y las
+    salidas por stop-loss.
+    """
+    trades = results['trades']
+    return {
+        **results,
+        'period': f"{historical_data['datetime'].iloc[0].date()} - {historical_data['datetime'].iloc[-1].date()}",
+        'return_pct': results['net_profit'] / results['initial_capital'],
+        'stop_loss_exits': int((trades['exit_reason'] == 'stop_loss').sum()),
+    }
 
-def run_backtest_engine(historical_data, strategy_func_name, strategy_params, risk_params, initial_capital=10000, verbose=True):
-    strategy = Strategy(verbose=False, **strategy_params)
-    strategy_func = getattr(strategy, strategy_func_name)
-    risk_manager = RiskManager(default_risk_per_trade=risk_params['risk_per_trade'], verbose=False)
-
-    capital, position, trades, peak_capital, max_drawdown = initial_capital, None, [], initial_capital, 0
-    historical_data.ta.atr(append=True, length=risk_params['atr_period'])
-
-    start_index = 200
-    for i in range(start_index, len(historical_data)):
-        current_data_slice = historical_data.iloc[0:i+1]
-        latest_candle = current_data_slice.iloc[-1]
-        atr_col_name = f'ATRr_{risk_params["atr_period"]}'
-
-        if pd.isna(latest_candle[atr_col_name]): continue
-
-        signal = strategy_func(current_data_slice)
-
-        if position:
-            new_trailing_stop = latest_candle['high'] - (latest_candle[atr_col_name] * risk_params['atr_multiplier'])
-            if new_trailing_stop > position['trailing_stop_loss']:
-                position['trailing_stop_loss'] = new_trailing_stop
-
-            if latest_candle['low'] <= position['trailing_stop_loss'] or signal == 'SELL':
-                exit_price = position['trailing_stop_loss'] if latest_candle['low'] <= position['trailing_stop_loss'] else latest_candle['close']
-                profit_or_loss = (exit_price - position['entry_price']) * position['amount_of_asset']
-                capital += profit_or_loss
-                trades.append({'win': profit_or_loss > 0, 'profit_usd': profit_or_loss})
-                if verbose:
-                    print(f"{latest_candle.name.date()}: VENTA a ${exit_price:,.2f} | P/L: ${profit_or_loss:,.2f} | Capital: ${capital:,.2f}")
-                position = None
-
-        if not position and signal == 'BUY':
-            entry_price = latest_candle['close']
-            stop_loss_price = entry_price - (latest_candle[atr_col_name] * risk_params['atr_multiplier'])
-            position_size_usd = risk_manager.calculate_position_size(capital, entry_price, stop_loss_price)
-            if position_size_usd and position_size_usd > 0:
-                amount_of_asset = position_size_usd / entry_price
-                position = {'entry_price': entry_price, 'trailing_stop_loss': stop_loss_price, 'amount_of_asset': amount_of_asset}
-                if verbose:
-                    print(f"{latest_candle.name.date()}: COMPRA a ${entry_price:,.2f} | Tamaño: ${position_size_usd:,.2f}")
-
-        peak_capital = max(peak_capital, capital)
-        drawdown = (peak_capital - capital) / peak_capital
-        max_drawdown = max(max_drawdown, drawdown)
-
-    return initial_capital, capital, trades, max_drawdown
-
-def build_report(initial_capital, final_capital, trades, max_drawdown, historical_data):
-    # (El cuerpo de esta función no necesita cambios)
-    pass
-
-def print_professional_report(report, initial_capital=10000):
-    # (El cuerpo de esta función no necesita cambios)
-    pass
+def print_professional_report(report):
+    print("\n" + "=" * 50)
+    print("      REPORTE DEL BACKTEST (motor de eventos)")
+    print("=" * 50)
+    print(f"Periodo:            {report['period']}")
+    print(f"Capital inicial:    ${report['initial_capital']:,.2f}")
+    print(f"Capital final:      ${report['final_capital']:,.2f}")
+    print(f"Beneficio neto:     ${report['net_profit']:,.2f} ({report['return_pct']:.2%})")
+    print(f"Drawdown máximo:    {report['max_drawdown_pct']:.2%}")
+    print(f"Operaciones:        {report['total_trades']} ({report['stop_loss_exits']} por stop-loss)")
+    print(f"Tasa de acierto:    {report['win_rate']:.2%}")
+    print(f"Profit factor:      {report['profit_factor']:.2f}")
+    print("=" * 50)
+
+# Multiplicadores de stop con los que --check compara ambos modos (con el de config no se cierra ninguna operación)
+CHECK_ATR_STOP_MULTS = (0.5, 1.0, 1.5, 2.0, 3.0)
+
+def check_vectorized_equivalence(sol_df, btc_6h_df, btc_1d_df, execution_df=None, **kwargs):
+    """
+    Ejecuta el motor de eventos y el modo vectorizado con varios multiplicadores de stop y
+    devuelve las diferencias encontradas ({multiplicador: [diferencias]}) y los tiempos de cada modo.
+    """
+    differences, timings = {}, {'eventos': 0.0, 'vectorizado': 0.0}
+    for atr_stop_mult in CHECK_ATR_STOP_MULTS:
+        runs = {}
+        for name, vectorized in (('eventos', False), ('vectorizado', True)):
+            start = time.perf_counter()
+            runs[name] = run_backtest_engine(sol_df, btc_6h_df, btc_1d_df, risk_params={'atr_stop_mult': atr_stop_mult},
+                                             verbose=False, execution_df=execution_df, vectorized=vectorized, **kwargs)
+            timings[name] += time.perf_counter() - start
+        found = compare_results(runs['vectorizado'], runs['eventos'])
+        if found:
+            differences[atr_stop_mult] = found
+        print(f"atr_stop_mult={atr_stop_mult}: {runs['eventos']['total_trades']} operaciones, "
+              f"capital final ${runs['eventos']['final_capital']:,.2f} -> {'OK' if not found else 'DISTINTO'}")
+    return differences, timings
 
 if __name__ == "__main__":
-    # --- CAMBIO CLAVE: Cargar los datos de 6 horas de Solana ---
-    data_filename = 'SOL_USDT_6h_data.csv'
+    parser = argparse.ArgumentParser(description="Backtest de la estrategia desplegada.")
+    parser.add_argument('--vectorized', action='store_true', help="Señales por lotes y una sola pasada sobre arrays.")
+    parser.add_argument('--check', action='store_true', help="Comprueba que el modo vectorizado coincide con el motor de eventos.")
+    parser.add_argument('--execution-csv', help="CSV de velas más finas de SOL para revisar los stops (p. ej. 1h).")
+    parser.add_argument('--execution-timeframe', default='1h')
+    args = parser.parse_args()
+
     try:
-        historical_data = pd.read_csv(data_filename, index_col=0, parse_dates=True)
-    except FileNotFoundError:
-        print(f"Error: No se encontró '{data_filename}'. Ejecuta el script de descarga para 6h primero.")
+        sol_data = candle_store.load_or_csv('SOL/USDT', '6h', os.path.join(DATA_DIR, 'SOL_USDT_6h.csv'))
+        btc_6h_data = candle_store.load_or_csv('BTC/USDT', '6h', os.path.join(DATA_DIR, 'BTC_USDT_6h.csv'))
+        btc_1d_data = candle_store.load_or_csv('BTC/USDT', '1d', os.path.join(DATA_DIR, 'BTC_USDT_1d.csv'))
+        execution_data = read_ohlcv_csv(args.execution_csv) if args.execution_csv else None
+    except FileNotFoundError as e:
+        print(f"Error: No se encontraron los datos ({e}). Ejecuta download_binance_data.py primero.")
         sys.exit()
 
-    # Parámetros base para la nueva estrategia VWAP Pullback
-    strategy_params = {
-        'emaFastLen': 20,
-        'emaMidLen': 50,
-        'emaSlowLen': 200,
-        'rsiLen': 14
-    }
-    risk_params = {'risk_per_trade': 0.01, 'atr_period': 14, 'atr_multiplier': 1.5}
-
-    initial_cap, final_cap, trades_list, max_dd = run_backtest_engine(
-        historical_data, 
-        'analyze_sol_vwap_pullback', # Apuntando a la nueva estrategia
-        strategy_params, 
-        risk_params,
+    if args.check:
+        differences, timings = check_vectorized_equivalence(
+            sol_data, btc_6h_data, btc_1d_data, execution_df=execution_data,
+            execution_timeframe=args.execution_timeframe,
+            fee_rate=config.REPLAY_FEE_RATE, slippage_bps=config.REPLAY_SLIPPAGE_BPS
+        )
+        print(f"Tiempo total: motor de eventos {timings['eventos']:.2f}s | vectorizado {timings['vectorizado']:.2f}s")
+        for atr_stop_mult, found in differences.items():
+            print(f"atr_stop_mult={atr_stop_mult}: " + "; ".join(found))
+        sys.exit(1 if differences else 0)
+
+    results = run_backtest_engine(
+        sol_data,
+        btc_6h_data,
+        btc_1d_data,
+        fee_rate=config.REPLAY_FEE_RATE,
+        slippage_bps=config.REPLAY_SLIPPAGE_BPS,
+        execution_df=execution_data,
+        execution_timeframe=args.execution_timeframe,
+        vectorized=args.vectorized,
         verbose=True
     )
-    
-    # (Asegúrate de que tus funciones de reporte estén completas aquí)
-    report = build_report(initial_cap, final_cap, trades_list, max_dd, historical_data)
-    print_professional_report(report, initial_capital=initial_cap)
\ No newline at end of file
+
+    report = build_report(results, sol_data)
+    print_professional_report(report)
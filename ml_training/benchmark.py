@@ -0,0 +1,417 @@
+# ml_training/benchmark.py
+#
+# Suite de rendimiento reproducible de los caminos críticos del bot y del research:
+#   strategy.check_strategy_6h_breakout, research.run_backtest, backtester.run_backtest_engine (eventos y vectorizado),
+#   prepare_ai_data_v2.create_features_and_labels_v2 y AIFilter (fila a fila y por lotes).
+#
+# Cada caso se ejecuta sobre datos sintéticos deterministas (semilla fija) y sobre los CSV
+# incluidos en el repositorio, a varios tamaños, y se mide el tiempo de pared (mejor y mediana
+# de varias repeticiones), la memoria pico (tracemalloc, en una pasada aparte para no inflar los
+# tiempos) y el rendimiento en velas/s. Todo se ejecuta sin red.
+#
+# Uso (desde ml_training/):
+#   python benchmark.py                          # todos los casos, tamaños 1k, 10k, 100k y 1M
+#   python benchmark.py --cases strategy,research --sizes 1000,10000
+#   python benchmark.py --save-baseline          # guarda los resultados como referencia
+#
+# Los resultados se añaden a benchmark_history.json y se comparan con benchmark_baseline.json:
+# un caso es una regresión si su mejor tiempo (o su memoria pico) supera a la referencia en más
+# de --tolerance. Si hay regresiones el script termina con código 1.
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.abspath(os.path.join(BENCH_DIR, '..'))
+sys.path.append(ROOT_DIR)
+sys.path.append(BENCH_DIR)
+
+from candle_store import read_ohlcv_csv
+from file_utils import replacement_mode
+from timeframes import timeframe_to_ms
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000, 1_000_000]
+DEFAULT_HISTORY = os.path.join(BENCH_DIR, 'benchmark_history.json')
+DEFAULT_BASELINE = os.path.join(BENCH_DIR, 'benchmark_baseline.json')
+DATASETS = ('synthetic', 'bundled')
+
+BUNDLED_FILES = {
+    'sol': os.path.join(BENCH_DIR, 'data', 'SOL_USDT_6h.csv'),
+    'btc_6h': os.path.join(BENCH_DIR, 'data', 'BTC_USDT_6h.csv'),
+    'btc_1d': os.path.join(BENCH_DIR, 'data', 'BTC_USDT_1d.csv'),
+    'features': os.path.join(BENCH_DIR, 'ai_training_data_4h_v3.csv'),
+}
+AI_MODEL_PATH = os.path.join(ROOT_DIR, 'ai_model.joblib')
+AI_FEATURES = ['RSI', 'ATR', 'VOL_RATIO', 'EMA_FAST_SLOPE', 'PRICE_VS_EMA_SLOW', 'MACD_HIST']
+SYNTHETIC_START_MS = 1_577_836_800_000 # 2020-01-01 00:00 UTC
+# Un millón de velas de 6h no cabe en el rango de fechas de pandas (año 2262): las series
+# sintéticas se espacian 1h y la serie "diaria" de BTC agrupa 4 velas, igual que 6h -> 1d.
+SYNTHETIC_TIMEFRAME = '1h'
+
+# --- Datos ---
+
+def synthetic_ohlcv(bars, timeframe=SYNTHETIC_TIMEFRAME, seed=0, start_price=100.0, volatility=0.015):
+    """
+    Serie OHLCV sintética y determinista con tramos de tendencia (para que la estrategia genere
+    señales). El logaritmo del precio se re-centra sobre su media móvil larga para que series
+    de un millón de velas no se vayan a cero ni a infinito.
+    """
+    rng = np.random.default_rng(seed)
+    steps = np.arange(bars)
+    drift = 0.004 * np.sin(2 * np.pi * steps / 700) + 0.002 * np.sin(2 * np.pi * steps / 173)
+    walk = np.cumsum(rng.normal(0.0, volatility, bars) + drift)
+    log_price = walk - pd.Series(walk).rolling(5_000, min_periods=1).mean().to_numpy() + np.log(start_price)
+    close = np.exp(log_price)
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    wick = np.abs(rng.normal(0.0, volatility / 2, bars)) * close
+    timestamps = SYNTHETIC_START_MS + steps.astype(np.int64) * timeframe_to_ms(timeframe)
+    df = pd.DataFrame({
+        'timestamp': timestamps,
+        'open': open_,
+        'high': np.maximum(open_, close) + wick,
+        'low': np.minimum(open_, close) - wick * 0.9,
+        'close': close,
+        'volume': rng.lognormal(10.0, 0.6, bars),
+    })
+    df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
+    return df
+
+def aggregate_ohlcv(df, factor):
+    """
+    Agrupa cada `factor` velas consecutivas en una (p. ej. 4 velas de 6h -> 1 diaria).
+    """
+    groups = np.arange(len(df)) // factor
+    grouped = df.groupby(groups)
+    out = pd.DataFrame({
+        'timestamp': grouped['timestamp'].first(),
+        'open': grouped['open'].first(),
+        'high': grouped['high'].max(),
+        'low': grouped['low'].min(),
+        'close': grouped['close'].last(),
+        'volume': grouped['volume'].sum(),
+    }).reset_index(drop=True)
+    out['datetime'] = pd.to_datetime(out['timestamp'], unit='ms')
+    return out
+
+def synthetic_features(rows, seed=0):
+    """
+    Features de señales con rangos parecidos a los del dataset de entrenamiento de la IA.
+    """
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'RSI': rng.uniform(15.0, 85.0, rows),
+        'ATR': rng.lognormal(5.5, 0.8, rows),
+        'VOL_RATIO': rng.lognormal(0.0, 0.4, rows),
+        'EMA_FAST_SLOPE': rng.normal(0.0, 150.0, rows),
+        'PRICE_VS_EMA_SLOW': rng.normal(0.0, 0.05, rows),
+        'MACD_HIST': rng.normal(0.0, 80.0, rows),
+    })
+
+def load_dataset(name, bars):
+    """
+    Devuelve {'sol', 'btc_6h', 'btc_1d', 'features'} con `bars` velas de SOL 6h (y filas de
+    features), o None si el dataset no tiene tantas velas.
+    """
+    if name == 'synthetic':
+        btc_6h = synthetic_ohlcv(bars, seed=1, start_price=30_000.0, volatility=0.01)
+        return {
+            'sol': synthetic_ohlcv(bars, seed=0),
+            'btc_6h': btc_6h,
+            'btc_1d': aggregate_ohlcv(btc_6h, 4),
+            'features': synthetic_features(bars),
+        }
+    if name == 'bundled':
+        sol = read_ohlcv_csv(BUNDLED_FILES['sol'])
+        features = pd.read_csv(BUNDLED_FILES['features'])[AI_FEATURES]
+        return {
+            'sol': sol.iloc[-bars:].reset_index(drop=True) if len(sol) >= bars else None,
+            'btc_6h': read_ohlcv_csv(BUNDLED_FILES['btc_6h']),
+            'btc_1d': read_ohlcv_csv(BUNDLED_FILES['btc_1d']),
+            'features': features.iloc[-bars:].reset_index(drop=True) if len(features) >= bars else None,
+        }
+    raise ValueError(f"Dataset desconocido: '{name}'")
+
+def _indexed(df, index_name='datetime'):
+    # Formato de backtester.py y prepare_ai_data_v2.py: índice de fechas y sin columna timestamp
+    return df.set_index('datetime').drop(columns='timestamp').rename_axis(index_name)
+
+# --- Casos ---
+# Cada caso recibe el dataset y devuelve una función sin argumentos que ejecuta una iteración.
+# Las funciones que modifican sus entradas (set_index, columnas nuevas) reciben copias.
+
+def _prepare_strategy(data):
+    from config import config
+    from strategy import check_strategy_6h_breakout
+    sol, btc_6h, btc_1d = data['sol'], data['btc_6h'], data['btc_1d']
+    return lambda: check_strategy_6h_breakout(sol.copy(), btc_6h.copy(), btc_1d.copy(), config)
+
+def _prepare_research(data):
+    from research import run_backtest
+    sol, btc_6h, btc_1d = data['sol'], data['btc_6h'], data['btc_1d']
+    return lambda: run_backtest(sol.copy(), btc_6h.copy(), btc_1d.copy(), leverage=5.0, adx_min=18.0)
+
+def _prepare_backtester(data):
+    from backtester import run_backtest_engine
+    sol, btc_6h, btc_1d = data['sol'], data['btc_6h'], data['btc_1d']
+    return lambda: run_backtest_engine(sol, btc_6h, btc_1d, verbose=False)
+
+def _prepare_backtester_vectorized(data):
+    from backtester import run_backtest_engine
+    sol, btc_6h, btc_1d = data['sol'], data['btc_6h'], data['btc_1d']
+    return lambda: run_backtest_engine(sol, btc_6h, btc_1d, verbose=False, vectorized=True)
+
+def _prepare_labeling(data):
+    from prepare_ai_data_v2 import create_features_and_labels_v2
+    historical_data = _indexed(data['sol'], index_name='timestamp')
+    strategy = SimpleNamespace(btc_ema_fast_period=20, btc_ema_slow_period=50)
+    return lambda: create_features_and_labels_v2(historical_data.copy(), strategy)
+
+def _load_ai_filter():
+    from ai_filter import AIFilter
+    ai_filter = AIFilter(model_path=AI_MODEL_PATH)
+    if ai_filter.model is None:
+        raise RuntimeError(f"No se pudo cargar el modelo '{AI_MODEL_PATH}'")
+    return ai_filter
+
+def _prepare_ai_filter(data):
+    ai_filter = _load_ai_filter()
+    rows = data['features'].to_dict('records')
+    def run():
+        for features in rows:
+            ai_filter.get_confidence_prediction(features)
+    return run
+
+def _prepare_ai_filter_batch(data):
+    ai_filter = _load_ai_filter()
+    features = data['features']
+    return lambda: ai_filter.predict_batch(features)
+
+# max_bars limita los casos cuyo coste crece demasiado (p. ej. la IA fila a fila o el
+# etiquetado) para que la suite completa termine en minutos; --no-limits lo ignora.
+CASES = {
+    'strategy': {'prepare': _prepare_strategy, 'input': 'sol', 'max_bars': 1_000_000},
+    'research': {'prepare': _prepare_research, 'input': 'sol', 'max_bars': 1_000_000},
+    'backtester': {'prepare': _prepare_backtester, 'input': 'sol', 'max_bars': 1_000_000},
+    'backtester_vectorized': {'prepare': _prepare_backtester_vectorized, 'input': 'sol', 'max_bars': 1_000_000},
+    'labeling_v2': {'prepare': _prepare_labeling, 'input': 'sol', 'max_bars': 100_000},
+    'ai_filter': {'prepare': _prepare_ai_filter, 'input': 'features', 'max_bars': 100_000},
+    'ai_filter_batch': {'prepare': _prepare_ai_filter_batch, 'input': 'features', 'max_bars': 1_000_000},
+}
+
+# --- Medición ---
+
+def measure(run, repeat=3, trace_memory=True, warmup=False):
+    """
+    Ejecuta `run` una vez trazando la memoria y después `repeat` veces cronometradas. Con
+    warmup=True se hace antes una ejecución sin medir (JIT de numba, imports perezosos), para
+    que ni el tiempo ni la memoria pico incluyan costes que solo se pagan una vez por proceso.
+
+    :return: Diccionario con best_seconds, median_seconds, times y peak_memory_mb.
+    """
+    from indicator_cache import indicator_cache
+    if warmup:
+        run()
+    indicator_cache.clear()
+    peak_memory_mb = None
+    if trace_memory:
+        tracemalloc.start()
+        try:
+            run()
+            peak_memory_mb = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    else:
+        run()
+
+    times = []
+    for _ in range(repeat):
+        # Sin caché de indicadores: se mide el cálculo completo en cada repetición
+        indicator_cache.clear()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return {
+        'best_seconds': min(times),
+        'median_seconds': statistics.median(times),
+        'times': times,
+        'peak_memory_mb': peak_memory_mb,
+    }
+
+_warmed_up = set()
+
+def run_case(case_name, dataset_name, bars, data, repeat=3, trace_memory=True, no_limits=False):
+    """
+    Mide un caso con un dataset y un tamaño. Nunca lanza: los errores quedan en el resultado.
+    """
+    case = CASES[case_name]
+    result = {'case': case_name, 'dataset': dataset_name, 'bars': bars}
+    if not no_limits and bars > case['max_bars']:
+        return dict(result, status='skipped', reason=f"por encima del límite del caso ({case['max_bars']:,} velas)")
+    if data is None or data[case['input']] is None:
+        return dict(result, status='skipped', reason="el dataset no tiene tantas velas")
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            run = case['prepare'](data)
+            timing = measure(run, repeat=repeat, trace_memory=trace_memory, warmup=case_name not in _warmed_up)
+        _warmed_up.add(case_name)
+    except Exception as e:
+        return dict(result, status='error', reason=f"{type(e).__name__}: {e}")
+    timing['bars_per_second'] = bars / timing['best_seconds'] if timing['best_seconds'] > 0 else None
+    return dict(result, status='ok', **timing)
+
+def run_suite(cases, datasets, sizes, repeat=3, trace_memory=True, no_limits=False):
+    results = []
+    for dataset_name in datasets:
+        for bars in sizes:
+            data = None
+            for case_name in cases:
+                if data is None and (no_limits or bars <= CASES[case_name]['max_bars']):
+                    data = load_dataset(dataset_name, bars)
+                result = run_case(case_name, dataset_name, bars, data, repeat, trace_memory, no_limits)
+                print(_format_result(result))
+                results.append(result)
+    return results
+
+# --- Historial y referencia ---
+
+def _result_key(result):
+    return f"{result['case']}/{result['dataset']}/{result['bars']}"
+
+# Diferencias absolutas por debajo de estas no se consideran regresión (ruido en tamaños pequeños)
+MIN_REGRESSION_DELTA = {'best_seconds': 0.005, 'peak_memory_mb': 1.0}
+
+def find_regressions(results, baseline, tolerance=0.25):
+    """
+    Compara los resultados con la referencia y devuelve la lista de regresiones
+    (tiempo o memoria pico por encima de la referencia en más de `tolerance`).
+    """
+    reference = {_result_key(r): r for r in baseline.get('results', []) if r.get('status') == 'ok'}
+    regressions = []
+    for result in results:
+        previous = reference.get(_result_key(result))
+        if result['status'] != 'ok' or previous is None:
+            continue
+        for metric in ('best_seconds', 'peak_memory_mb'):
+            old, new = previous.get(metric), result.get(metric)
+            if old and new and new > old * (1 + tolerance) and new - old > MIN_REGRESSION_DELTA[metric]:
+                regressions.append({'key': _result_key(result), 'metric': metric,
+                                    'baseline': old, 'current': new, 'ratio': new / old})
+    return regressions
+
+def _git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT_DIR,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+def build_run(results):
+    return {
+        'run_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'commit': _git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'results': results,
+    }
+
+def _read_json(path, default):
+    if not os.path.exists(path):
+        return default
+    with open(path, 'r') as f:
+        return json.load(f)
+
+def _write_json(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.benchmark_', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f, indent=2)
+        os.chmod(tmp_path, replacement_mode(path))
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+def append_history(run, path=DEFAULT_HISTORY):
+    history = _read_json(path, [])
+    history.append(run)
+    _write_json(path, history)
+
+def _format_result(result):
+    label = f"{result['case']:<21} {result['dataset']:<10} {result['bars']:>9,}"
+    if result['status'] != 'ok':
+        return f"  {label}  [{result['status']}] {result['reason']}"
+    memory = f"{result['peak_memory_mb']:>9.1f} MB" if result['peak_memory_mb'] is not None else '        - MB'
+    return (f"  {label}  {result['best_seconds']:>9.4f}s (mediana {result['median_seconds']:.4f}s)"
+            f"  {memory}  {result['bars_per_second']:>13,.0f} velas/s")
+
+def _parse_list(value, cast=str):
+    return [cast(item.strip()) for item in value.split(',') if item.strip()]
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark de los caminos críticos de estrategia, backtest, etiquetado e inferencia.")
+    parser.add_argument('--cases', default=','.join(CASES), help="Casos separados por comas.")
+    parser.add_argument('--datasets', default=','.join(DATASETS), help="Datasets: synthetic, bundled.")
+    parser.add_argument('--sizes', default=','.join(str(size) for size in DEFAULT_SIZES), help="Número de velas por tamaño.")
+    parser.add_argument('--repeat', type=int, default=3, help="Repeticiones cronometradas por caso.")
+    parser.add_argument('--no-memory', action='store_true', help="No medir la memoria pico (más rápido).")
+    parser.add_argument('--no-limits', action='store_true', help="Ignorar el tamaño máximo de cada caso.")
+    parser.add_argument('--history', default=DEFAULT_HISTORY)
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE)
+    parser.add_argument('--save-baseline', action='store_true', help="Guardar esta ejecución como referencia.")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="Margen antes de marcar una regresión (0.25 = +25%%).")
+    args = parser.parse_args()
+
+    cases = _parse_list(args.cases)
+    unknown = [case for case in cases if case not in CASES]
+    if unknown:
+        parser.error(f"Casos desconocidos: {', '.join(unknown)}. Disponibles: {', '.join(CASES)}")
+
+    # Los logs por predicción o por vela no forman parte de lo que se quiere medir
+    from logger import set_log_level
+    set_log_level('WARNING')
+    from indicator_cache import indicator_cache
+    indicator_cache.disk_dir = None
+
+    print(f"--- Benchmark ({', '.join(cases)}) ---")
+    results = run_suite(cases, _parse_list(args.datasets), _parse_list(args.sizes, int),
+                        repeat=args.repeat, trace_memory=not args.no_memory, no_limits=args.no_limits)
+    run = build_run(results)
+    append_history(run, args.history)
+    print(f"Resultados añadidos a '{args.history}'.")
+
+    exit_code = 0
+    baseline = _read_json(args.baseline, None)
+    if baseline is None:
+        print(f"No hay referencia en '{args.baseline}' (usa --save-baseline para crearla).")
+    else:
+        regressions = find_regressions(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\n¡{len(regressions)} REGRESIONES respecto a la referencia ({baseline.get('commit') or '?'}, {baseline.get('run_at')})!")
+            for regression in regressions:
+                print(f"  {regression['key']} {regression['metric']}: {regression['baseline']:.4f} -> "
+                      f"{regression['current']:.4f} (x{regression['ratio']:.2f})")
+            exit_code = 1
+        else:
+            print(f"Sin regresiones respecto a la referencia (tolerancia {args.tolerance:.0%}).")
+
+    if args.save_baseline:
+        _write_json(args.baseline, run)
+        print(f"Referencia guardada en '{args.baseline}'.")
+    sys.exit(exit_code)
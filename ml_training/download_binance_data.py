@@ -1,15 +1,26 @@
 # ml_training/download_binance_data.py
 
+import sys
+import os
 import ccxt
 import pandas as pd
-import os
 from datetime import datetime
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from candle_store import candle_store
+
 # --- Configuración ---
 exchange_id = 'binanceus' # Usamos Binance.US como se definió en la arquitectura
+# Solo se descarga la temporalidad base: las demás se construyen localmente desde ella
+# (candle_store.load_or_csv / load_resampled, ver resampler.py), así las series no se contradicen
 symbol_to_timeframes = {
-    'SOL/USDT': ['6h'],
-    'BTC/USDT': ['6h', '1d']
+    'SOL/USDT': ['1h'],
+    'BTC/USDT': ['1h']
+}
+derived_timeframes = {
+    'SOL/USDT': ['4h', '6h'],
+    'BTC/USDT': ['4h', '6h', '1d']
 }
 # Fecha de inicio para descargar los datos (formato: YYYY-MM-DD)
 # Usamos una fecha lejana para obtener un historial amplio para el backtest
@@ -24,23 +35,40 @@ exchange = getattr(ccxt, exchange_id)()
 
 def download_ohlcv(symbol, timeframe, since):
     """
-    Descarga los datos OHLCV de un símbolo y temporalidad específicos.
+    Descarga de forma incremental los datos OHLCV de un símbolo y temporalidad específicos.
+
+    Retoma desde la última vela guardada en el almacén (candle_store) y solo pide las velas que
+    faltan. Cada lote se guarda en disco en cuanto llega (almacén y CSV), así que la memoria no
+    crece con el historial y una descarga interrumpida continúa donde se quedó sin volver a pedir
+    lo ya guardado. La fecha `since` solo se usa si la serie todavía no existe.
     """
     print(f"Iniciando descarga para {symbol} en temporalidad {timeframe}...")
-    
-    since_timestamp = exchange.parse8601(since)
-    all_ohlcv = []
-    
+
+    csv_path = _csv_path(symbol, timeframe)
+    if not candle_store.exists(symbol, timeframe) and os.path.exists(csv_path):
+        # Primera ejecución con el almacén vacío: partimos del CSV existente en lugar de descargarlo de nuevo
+        candle_store.import_csv(symbol, timeframe, csv_path)
+    _sync_csv_with_store(symbol, timeframe)
+
+    last_timestamp = candle_store.last_timestamp(symbol, timeframe)
+    since_timestamp = last_timestamp + 1 if last_timestamp is not None else exchange.parse8601(since)
+    timeframe_ms = exchange.parse_timeframe(timeframe) * 1000
+    total_new = 0
+
     while True:
         try:
             # Descargamos los datos en lotes (Binance permite hasta 1000 velas por llamada)
             ohlcv = exchange.fetch_ohlcv(symbol, timeframe, since=since_timestamp, limit=1000)
+            # La última vela puede seguir abierta: solo guardamos velas cerradas
+            ohlcv = [candle for candle in ohlcv if candle[0] + timeframe_ms <= exchange.milliseconds()]
             if len(ohlcv) == 0:
                 break # No hay más datos disponibles
-            
-            all_ohlcv.extend(ohlcv)
+
+            added = candle_store.append(symbol, timeframe, ohlcv, source=csv_path)
+            _append_to_csv(symbol, timeframe, ohlcv)
+            total_new += added
             since_timestamp = ohlcv[-1][0] + 1 # Actualizamos el timestamp para la siguiente llamada
-            
+
             # Imprimimos el progreso
             last_date = datetime.fromtimestamp(ohlcv[-1][0] / 1000)
             print(f"  Datos obtenidos hasta: {last_date.strftime('%Y-%m-%d %H:%M:%S')}")
@@ -48,41 +76,76 @@ def download_ohlcv(symbol, timeframe, since):
         except Exception as e:
             print(f"Ocurrió un error descargando {symbol} ({timeframe}): {e}")
             break
-            
-    return all_ohlcv
 
-def save_to_csv(symbol, timeframe, ohlcv_data):
+    print(f"{total_new} velas nuevas guardadas para {symbol} ({timeframe}).")
+    print("-" * 30)
+    return total_new
+
+def _csv_path(symbol, timeframe):
+    safe_symbol = symbol.replace('/', '_')
+    return os.path.join(output_dir, f"{safe_symbol}_{timeframe}.csv")
+
+def _csv_last_timestamp(csv_path):
     """
-    Guarda los datos OHLCV en un archivo CSV.
+    Lee el timestamp de la última fila del CSV sin cargar el archivo completo.
+    """
+    with open(csv_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = max(f.tell() - 4096, 0)
+        f.seek(position)
+        lines = f.read().decode('utf-8').strip().splitlines()
+    last_line = lines[-1] if lines else ''
+    try:
+        return int(float(last_line.split(',')[0]))
+    except ValueError:
+        return None # Solo hay cabecera
+
+def _append_to_csv(symbol, timeframe, ohlcv_data):
+    """
+    Añade velas al final del CSV (creándolo con cabecera si no existe). Se ignoran las velas
+    con timestamp igual o anterior a la última fila del CSV, como en candle_store.append.
     """
     if not ohlcv_data:
-        print(f"No hay datos para guardar para {symbol} en {timeframe}.")
         return
-
-    # Creamos el directorio si no existe
     if not os.path.exists(output_dir):
         os.makedirs(output_dir)
-
-    # Convertimos a DataFrame de Pandas
+    csv_path = _csv_path(symbol, timeframe)
     df = pd.DataFrame(ohlcv_data, columns=['timestamp', 'open', 'high', 'low', 'close', 'volume'])
+    df['timestamp'] = df['timestamp'].astype('int64')
     df['datetime'] = pd.to_datetime(df['timestamp'], unit='ms')
-    
-    # Formateamos el nombre del archivo
-    safe_symbol = symbol.replace('/', '_')
-    filename = f"{safe_symbol}_{timeframe}.csv"
-    filepath = os.path.join(output_dir, filename)
-    
-    # Guardamos el archivo
-    df.to_csv(filepath, index=False)
-    print(f"Datos guardados exitosamente en: {filepath}")
-    print("-" * 30)
+    df = df.drop_duplicates('timestamp').sort_values('timestamp')
+    last_csv = _csv_last_timestamp(csv_path) if os.path.exists(csv_path) else None
+    if last_csv is not None:
+        df = df[df['timestamp'] > last_csv]
+    if df.empty:
+        return
+    df.to_csv(csv_path, mode='a', header=not os.path.exists(csv_path), index=False)
+
+def _sync_csv_with_store(symbol, timeframe):
+    """
+    Si una ejecución anterior se interrumpió entre el guardado en el almacén y el del CSV,
+    añade al CSV las velas que le faltan.
+    """
+    last_stored = candle_store.last_timestamp(symbol, timeframe)
+    if last_stored is None:
+        return
+    csv_path = _csv_path(symbol, timeframe)
+    last_csv = _csv_last_timestamp(csv_path) if os.path.exists(csv_path) else None
+    if last_csv is not None and last_csv >= last_stored:
+        return
+    missing = candle_store.load(symbol, timeframe, start=last_csv + 1 if last_csv is not None else None)
+    _append_to_csv(symbol, timeframe, missing[['timestamp', 'open', 'high', 'low', 'close', 'volume']].values.tolist())
 
 # --- Bucle Principal ---
 
 if __name__ == '__main__':
     for symbol, timeframes in symbol_to_timeframes.items():
         for tf in timeframes:
-            data = download_ohlcv(symbol, tf, since_date)
-            save_to_csv(symbol, tf, data)
-    
+            download_ohlcv(symbol, tf, since_date)
+
+    for symbol, timeframes in derived_timeframes.items():
+        for tf in timeframes:
+            derived = candle_store.load_resampled(symbol, tf)
+            print(f"{symbol} ({tf}): {len(derived)} velas construidas desde {candle_store.base_timeframe(symbol, tf)}.")
+
     print("Descarga de todos los datos completada.")
\ No newline at end of file
@@ -0,0 +1,134 @@
+# ml_training/parameter_sweep.py
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+from candle_store import candle_store
+from research import run_backtest
+
+RESULT_COLUMNS = ['net_profit', 'max_drawdown', 'profit_factor', 'total_trades', 'win_rate']
+
+# Datos cargados una sola vez por proceso trabajador (ver _init_worker)
+_worker_data = {}
+
+def expand_grid(param_grid):
+    """
+    Genera perezosamente todas las combinaciones de un grid {parámetro: [valores]}.
+    No materializa la lista completa, así que grids enormes no ocupan memoria.
+    """
+    names = list(param_grid.keys())
+    for values in itertools.product(*(param_grid[name] for name in names)):
+        yield dict(zip(names, values))
+
+def _init_worker(sol_path, btc_6h_path, btc_1d_path):
+    """
+    Carga los datos una única vez en cada proceso del pool (desde el almacén de velas si refleja
+    esos CSV, o construidos desde la temporalidad más fina descargada; ver candle_store.load_or_csv).
+    """
+    _worker_data['sol'] = candle_store.load_or_csv('SOL/USDT', '6h', sol_path)
+    _worker_data['btc_6h'] = candle_store.load_or_csv('BTC/USDT', '6h', btc_6h_path)
+    _worker_data['btc_1d'] = candle_store.load_or_csv('BTC/USDT', '1d', btc_1d_path)
+
+def _run_single_backtest(params):
+    """
+    Ejecuta un backtest con una combinación de parámetros y devuelve la fila para el CSV.
+    """
+    # run_backtest modifica los DataFrames de entrada (set_index), por eso se pasan copias
+    results, _ = run_backtest(
+        _worker_data['sol'].copy(), _worker_data['btc_6h'].copy(), _worker_data['btc_1d'].copy(),
+        **params
+    )
+    row = dict(params)
+    if results:
+        row.update(results)
+    else:
+        row['total_trades'] = 0
+    return row
+
+def run_sweep(param_grid, output_csv,
+              sol_path='data/SOL_USDT_6h.csv',
+              btc_6h_path='data/BTC_USDT_6h.csv',
+              btc_1d_path='data/BTC_USDT_1d.csv',
+              base_params=None,
+              max_workers=None,
+              max_pending=None,
+              report_every=25):
+    """
+    Ejecuta un barrido de parámetros de research.run_backtest repartido en un pool de procesos.
+
+    Solo se mantienen en vuelo max_pending backtests a la vez (por defecto 2 por proceso),
+    así que la memoria no crece con el tamaño del grid. Cada resultado se escribe en el CSV
+    en cuanto termina y se informa del rendimiento (backtests/s) cada report_every resultados.
+
+    :param param_grid: Diccionario {parámetro: [valores]} a combinar.
+    :param base_params: Parámetros fijos que se añaden a todas las combinaciones.
+    :return: Número de backtests ejecutados.
+    """
+    base_params = base_params or {}
+    max_workers = max_workers or os.cpu_count() or 1
+    max_pending = max_pending or max_workers * 2
+
+    fieldnames = list(dict.fromkeys(list(base_params.keys()) + list(param_grid.keys()) + RESULT_COLUMNS))
+    combos = ({**base_params, **params} for params in expand_grid(param_grid))
+
+    print(f"Iniciando barrido de parámetros con {max_workers} procesos...")
+    start_time = time.perf_counter()
+    completed = last_report = 0
+
+    with open(output_csv, 'w', newline='') as f, \
+         ProcessPoolExecutor(max_workers=max_workers, initializer=_init_worker,
+                             initargs=(sol_path, btc_6h_path, btc_1d_path)) as executor:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, extrasaction='ignore')
+        writer.writeheader()
+
+        pending = set()
+        for params in combos:
+            pending.add(executor.submit(_run_single_backtest, params))
+            if len(pending) < max_pending:
+                continue
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            completed += _write_results(done, writer, f)
+            if completed - last_report >= report_every:
+                _report_throughput(completed, start_time)
+                last_report = completed
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            completed += _write_results(done, writer, f)
+
+    _report_throughput(completed, start_time)
+    print(f"Resultados guardados en '{output_csv}'")
+    return completed
+
+def _write_results(done, writer, f):
+    written = 0
+    for future in done:
+        try:
+            writer.writerow(future.result())
+            written += 1
+        except Exception as e:
+            print(f"Error en un backtest del barrido: {e}")
+    f.flush()
+    return written
+
+def _report_throughput(completed, start_time):
+    elapsed = time.perf_counter() - start_time
+    rate = completed / elapsed if elapsed > 0 else 0.0
+    print(f"  {completed} backtests completados en {elapsed:,.1f}s ({rate:,.2f} backtests/s)")
+
+if __name__ == '__main__':
+    param_grid = {
+        'adx_min': [14.0, 18.0, 22.0, 26.0],
+        'kc_mult': [1.4, 1.8, 2.2],
+        'atr_stop_mult': [1.5, 2.0, 2.5, 3.0],
+        'leverage': [1.0, 3.0, 5.0],
+        'use_chandelier_exit': [False, True],
+        'ce_period': [15, 22],
+        'ce_mult': [2.5, 3.0],
+    }
+    run_sweep(param_grid, 'solana_6h_sweep_results.csv')
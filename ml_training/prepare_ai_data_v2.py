@@ -7,6 +7,7 @@ sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import pandas as pd
 import pandas_ta as ta
 from strategy import Strategy 
+from candle_store import candle_store
 
 def create_features_and_labels_v2(historical_data, strategy):
     """
@@ -85,7 +86,8 @@ if __name__ == "__main__":
     data_filename = 'BTC_USDT_4h_data.csv'
     try:
         print(f"Cargando datos históricos reales desde '{data_filename}'...")
-        data = pd.read_csv(data_filename, index_col='timestamp', parse_dates=True)
+        data = candle_store.load_or_csv('BTC/USDT', '4h', data_filename)
+        data = data.set_index('datetime').drop(columns='timestamp').rename_axis('timestamp')
         print("Datos cargados exitosamente.")
     except FileNotFoundError:
         print(f"Error: No se encontró el archivo '{data_filename}'.")
@@ -1,7 +1,16 @@
+import sys
+import os
 import pandas as pd
 import pandas_ta as ta
 import numpy as np
 
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+sys.path.append(os.path.dirname(os.path.abspath(__file__))) # trade_kernel (también al importar research desde la raíz)
+
+from indicator_cache import indicator_cache
+from candle_store import candle_store
+from trade_kernel import simulate_trades, TRADE_TYPE_NAMES
+
 def run_backtest(sol_6h_df, btc_6h_df, btc_1d_df, 
                  initial_capital=500.0,
                  leverage=1.0,
@@ -29,20 +38,24 @@ def run_backtest(sol_6h_df, btc_6h_df, btc_1d_df,
     df = pd.merge_asof(df.sort_index(), btc_1d_df.sort_index(), 
                        left_index=True, right_index=True, direction='backward')
     
-    df.ta.ema(length=ema_fast_len, append=True, col_names=('EMA_fast'))
-    df.ta.ema(length=ema_slow_len, append=True, col_names=('EMA_slow'))
-    df.ta.atr(length=14, append=True, col_names=('ATR'))
-    df.ta.adx(length=adx_len, append=True, col_names=('ADX', 'DMP', 'DMN'))
-    donchian = ta.donchian(high=df['high'], low=df['low'], length=don_len)
+    # Los indicadores pasan por la caché: en un barrido solo se recalculan si cambian sus entradas o longitudes
+    df['EMA_fast'] = indicator_cache.compute(ta.ema, close=df['close'], length=ema_fast_len)
+    df['EMA_slow'] = indicator_cache.compute(ta.ema, close=df['close'], length=ema_slow_len)
+    df['ATR'] = indicator_cache.compute(ta.atr, high=df['high'], low=df['low'], close=df['close'], length=14)
+    adx = indicator_cache.compute(ta.adx, high=df['high'], low=df['low'], close=df['close'], length=adx_len)
+    df['ADX'] = adx[f'ADX_{adx_len}']
+    df['DMP'] = adx[f'DMP_{adx_len}']
+    df['DMN'] = adx[f'DMN_{adx_len}']
+    donchian = indicator_cache.compute(ta.donchian, high=df['high'], low=df['low'], length=don_len)
     df['DON_upper'] = donchian[f'DCU_{don_len}_{don_len}']
     df['DON_lower'] = donchian[f'DCL_{don_len}_{don_len}']
-    keltner = df.ta.kc(length=kc_len, scalar=kc_mult)
+    keltner = indicator_cache.compute(ta.kc, high=df['high'], low=df['low'], close=df['close'], length=kc_len, scalar=kc_mult)
     df['KC_upper'] = keltner[f'KCUe_{kc_len}_{kc_mult}']
     df['KC_lower'] = keltner[f'KCLe_{kc_len}_{kc_mult}']
-    df['btc_EMA_slow_6h'] = ta.ema(df['btc_close'], length=ema_slow_len)
-    df['btc_EMA_slow_1d'] = ta.ema(df['btc_1d_close'], length=200)
+    df['btc_EMA_slow_6h'] = indicator_cache.compute(ta.ema, close=df['btc_close'], length=ema_slow_len)
+    df['btc_EMA_slow_1d'] = indicator_cache.compute(ta.ema, close=df['btc_1d_close'], length=200)
 
-    ce_atr = ta.atr(df['high'], df['low'], df['close'], length=ce_period)
+    ce_atr = indicator_cache.compute(ta.atr, high=df['high'], low=df['low'], close=df['close'], length=ce_period)
     highest_high = df['high'].rolling(window=ce_period).max()
     lowest_low = df['low'].rolling(window=ce_period).min()
     df['CE_long'] = highest_high - ce_atr * ce_mult
@@ -58,76 +71,41 @@ def run_backtest(sol_6h_df, btc_6h_df, btc_1d_df,
     df['signal_long'] = long_break & btc_up
     df['signal_short'] = short_break & btc_down
 
-    # --- 3. Bucle de Simulación de Trading ---
-    trades = []
-    equity = initial_capital
-    in_position = False
-    position_type = None
-    entry_price = 0; entry_time = None
-    stop_loss = 0; take_profit_1 = 0
-    position_size_coins = 0; partial_tp_hit = False
-    equity_curve = [initial_capital]
+    # --- 3. Simulación de Trading (kernel sobre arrays contiguos) ---
+    n = len(df)
+    trade_entry_idx = np.empty(n, dtype=np.int64)
+    trade_exit_idx = np.empty(n, dtype=np.int64)
+    trade_type = np.empty(n, dtype=np.int8)
+    trade_entry_price = np.empty(n, dtype=np.float64)
+    trade_exit_price = np.empty(n, dtype=np.float64)
+    trade_pnl = np.empty(n, dtype=np.float64)
+    trade_size = np.empty(n, dtype=np.float64)
+    equity_buffer = np.empty(n + 1, dtype=np.float64)
 
-    for i, row in df.iterrows():
-        if in_position:
-            exit_condition = False
-            if use_chandelier_exit:
-                if (position_type == 'long' and row['close'] < row['CE_long']) or \
-                   (position_type == 'short' and row['close'] > row['CE_short']):
-                    exit_condition = True
-            else:
-                if (position_type == 'long' and row['close'] < row['EMA_fast']) or \
-                   (position_type == 'short' and row['close'] > row['EMA_fast']):
-                    exit_condition = True
+    n_trades, n_equity = simulate_trades(
+        df['close'].to_numpy(dtype=np.float64), df['high'].to_numpy(dtype=np.float64),
+        df['low'].to_numpy(dtype=np.float64), df['ATR'].to_numpy(dtype=np.float64),
+        df['EMA_fast'].to_numpy(dtype=np.float64), df['CE_long'].to_numpy(dtype=np.float64),
+        df['CE_short'].to_numpy(dtype=np.float64), df['signal_long'].to_numpy(dtype=np.bool_),
+        df['signal_short'].to_numpy(dtype=np.bool_),
+        float(initial_capital), float(leverage), float(risk_pct), float(atr_stop_mult), float(tp_r_mult),
+        bool(use_chandelier_exit),
+        trade_entry_idx, trade_exit_idx, trade_type, trade_entry_price, trade_exit_price,
+        trade_pnl, trade_size, equity_buffer
+    )
 
-            equity_changed_in_step = False
-            if (position_type == 'long' and row['low'] <= stop_loss) or (position_type == 'short' and row['high'] >= stop_loss):
-                exit_price = stop_loss
-                pnl = ((exit_price - entry_price) * position_size_coins if position_type == 'long' else (entry_price - exit_price) * position_size_coins) * leverage
-                equity += pnl
-                trades.append({'entry_date': entry_time, 'exit_date': i, 'type': position_type, 'entry_price': entry_price, 'exit_price': exit_price, 'pnl': pnl, 'size': position_size_coins})
-                in_position = False; equity_changed_in_step = True
-            elif exit_condition:
-                exit_price = row['close']
-                pnl = ((exit_price - entry_price) * position_size_coins if position_type == 'long' else (entry_price - exit_price) * position_size_coins) * leverage
-                equity += pnl
-                trades.append({'entry_date': entry_time, 'exit_date': i, 'type': position_type, 'entry_price': entry_price, 'exit_price': exit_price, 'pnl': pnl, 'size': position_size_coins})
-                in_position = False; equity_changed_in_step = True
-            elif not partial_tp_hit and ((position_type == 'long' and row['high'] >= take_profit_1) or (position_type == 'short' and row['low'] <= take_profit_1)):
-                partial_exit_price = take_profit_1
-                partial_size = position_size_coins / 2
-                pnl = ((partial_exit_price - entry_price) * partial_size if position_type == 'long' else (entry_price - partial_exit_price) * partial_size) * leverage
-                equity += pnl
-                trades.append({'entry_date': entry_time, 'exit_date': i, 'type': f"partial_{position_type}", 'entry_price': entry_price, 'exit_price': partial_exit_price, 'pnl': pnl, 'size': partial_size})
-                position_size_coins /= 2; stop_loss = entry_price; partial_tp_hit = True; equity_changed_in_step = True
-            
-            if equity_changed_in_step:
-                equity_curve.append(equity)
-        
-        if not in_position:
-            if row['signal_long']:
-                entry_price, entry_time = row['close'], i
-                risk_per_coin = entry_price - (entry_price - row['ATR'] * atr_stop_mult)
-                if risk_per_coin <= 0: continue
-                position_size_usd = equity * risk_pct
-                position_size_coins = position_size_usd / risk_per_coin
-                stop_loss = entry_price - risk_per_coin
-                take_profit_1 = entry_price + (risk_per_coin * tp_r_mult)
-                in_position, position_type, partial_tp_hit = True, 'long', False
-            elif row['signal_short']:
-                entry_price, entry_time = row['close'], i
-                risk_per_coin = (entry_price + row['ATR'] * atr_stop_mult) - entry_price
-                if risk_per_coin <= 0: continue
-                position_size_usd = equity * risk_pct
-                position_size_coins = position_size_usd / risk_per_coin
-                stop_loss = entry_price + risk_per_coin
-                take_profit_1 = entry_price - (risk_per_coin * tp_r_mult)
-                in_position, position_type, partial_tp_hit = True, 'short', False
-    
     # --- 4. Análisis de Resultados ---
-    if not trades: return None, None
-    trades_df = pd.DataFrame(trades)
-    equity_series = pd.Series(equity_curve)
+    if n_trades == 0: return None, None
+    trades_df = pd.DataFrame({
+        'entry_date': df.index[trade_entry_idx[:n_trades]].to_numpy(),
+        'exit_date': df.index[trade_exit_idx[:n_trades]].to_numpy(),
+        'type': [TRADE_TYPE_NAMES[code] for code in trade_type[:n_trades]],
+        'entry_price': trade_entry_price[:n_trades],
+        'exit_price': trade_exit_price[:n_trades],
+        'pnl': trade_pnl[:n_trades],
+        'size': trade_size[:n_trades],
+    })
+    equity_series = pd.Series(equity_buffer[:n_equity])
     running_max = equity_series.cummax()
     drawdown = running_max - equity_series
     max_drawdown = drawdown.max()
@@ -152,9 +130,10 @@ def run_backtest(sol_6h_df, btc_6h_df, btc_1d_df,
 
 if __name__ == '__main__':
     try:
-        sol_df_orig = pd.read_csv('data/SOL_USDT_6h.csv')
-        btc_6h_df_orig = pd.read_csv('data/BTC_USDT_6h.csv')
-        btc_1d_df_orig = pd.read_csv('data/BTC_USDT_1d.csv')
+        # Se leen del almacén columnar (mapeado en memoria) si existe; si no, de los CSV
+        sol_df_orig = candle_store.load_or_csv('SOL/USDT', '6h', 'data/SOL_USDT_6h.csv')
+        btc_6h_df_orig = candle_store.load_or_csv('BTC/USDT', '6h', 'data/BTC_USDT_6h.csv')
+        btc_1d_df_orig = candle_store.load_or_csv('BTC/USDT', '1d', 'data/BTC_USDT_1d.csv')
 
         base_params = {
             'adx_min': 18,
@@ -1,9 +1,14 @@
 # ml_training/train_ai_model.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, accuracy_score
 import joblib
+from model_registry import model_registry
 
 def train_model(data_path='ai_training_data.csv'):
     """
@@ -58,6 +63,12 @@ def train_model(data_path='ai_training_data.csv'):
     joblib.dump(model, model_filename)
     print(f"\nModelo guardado exitosamente como '{model_filename}'")
 
+    # 7. Registrar el modelo con sus metadatos (features, huella de los datos, métricas)
+    model_registry.register(
+        'ai_model', model_filename, features=list(X.columns), data_path=data_path,
+        metrics={'accuracy': accuracy}
+    )
+
 
 if __name__ == "__main__":
     train_model()
\ No newline at end of file
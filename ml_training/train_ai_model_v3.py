@@ -1,10 +1,15 @@
 # ml_training/train_ai_model_v3.py
+import sys
+import os
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
 import pandas as pd
 from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report, accuracy_score
 from imblearn.over_sampling import SMOTE
 import joblib
+from model_registry import model_registry
 
 def train_final_model(data_path='ai_training_data_v2.csv'):
     """
@@ -60,5 +65,11 @@ def train_final_model(data_path='ai_training_data_v2.csv'):
     joblib.dump(model, model_filename)
     print(f"\nModelo v3 guardado exitosamente como '{model_filename}'")
 
+    # 8. Registrar el modelo como versión 3 del filtro de IA en el índice del bot (la adopta en caliente)
+    model_registry.register(
+        'ai_model', model_filename, version='3', features=list(X.columns), data_path=data_path,
+        metrics={'accuracy': accuracy}
+    )
+
 if __name__ == "__main__":
     train_final_model()
\ No newline at end of file
@@ -9,6 +9,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.metrics import classification_report
 import joblib
+from model_registry import model_registry
 
 def create_regime_labels(data):
     """
@@ -74,11 +75,17 @@ def train_regime_model(data_path='btc_1d_historical_data.csv'):
     print("\n--- Evaluación del Modelo de Régimen ---")
     y_pred = model.predict(X_test)
     print(classification_report(y_test, y_pred))
+    report = classification_report(y_test, y_pred, output_dict=True)
 
     model_filename = 'market_regime_model.joblib'
     joblib.dump(model, model_filename)
     print(f"\nModelo de régimen guardado como '{model_filename}'")
 
+    model_registry.register(
+        'market_regime_model', model_filename, features=features, data_path=data_path,
+        metrics={'accuracy': report['accuracy']}
+    )
+
 
 if __name__ == "__main__":
     train_regime_model()
\ No newline at end of file
@@ -0,0 +1,65 @@
+# ml_training/train_sentiment_model.py
+import pandas as pd
+from sklearn.feature_extraction.text import TfidfVectorizer
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import train_test_split
+from sklearn.pipeline import make_pipeline
+from sklearn.metrics import classification_report, accuracy_score
+import joblib
+
+def train_sentiment_model(data_path='sentiment_training_data.csv'):
+    """
+    Entrena el modelo local de sentimiento de titulares (TF-IDF + regresión logística)
+    y lo guarda para usarlo con local_sentiment.LocalSentimentModel.
+
+    El CSV debe tener las columnas 'headline' y 'label' (POSITIVE, NEGATIVE o NEUTRAL).
+    """
+    print("Iniciando el entrenamiento del modelo local de sentimiento...")
+
+    # 1. Cargar los datos
+    try:
+        df = pd.read_csv(data_path)
+    except FileNotFoundError:
+        print(f"Error: No se encontró el archivo de datos '{data_path}'.")
+        print("Crea un CSV con las columnas 'headline' y 'label' (POSITIVE, NEGATIVE o NEUTRAL).")
+        return
+
+    if 'headline' not in df.columns or 'label' not in df.columns:
+        print("Error: El dataset debe contener las columnas 'headline' y 'label'.")
+        return
+
+    df = df.dropna(subset=['headline', 'label'])
+    df['label'] = df['label'].str.strip().str.upper()
+    print(f"Dataset cargado con {len(df)} titulares.")
+    print(f"Distribución de clases:\n{df['label'].value_counts(normalize=True)}")
+
+    # 2. Dividir en conjunto de entrenamiento y de prueba (80% / 20%)
+    X_train, X_test, y_train, y_test = train_test_split(
+        df['headline'], df['label'], test_size=0.2, random_state=42, stratify=df['label']
+    )
+    print(f"Datos divididos: {len(X_train)} para entrenamiento, {len(X_test)} para prueba.")
+
+    # 3. Entrenar el pipeline (un modelo lineal pequeño puntúa en microsegundos)
+    print("\nEntrenando el modelo TF-IDF + LogisticRegression...")
+    model = make_pipeline(
+        TfidfVectorizer(lowercase=True, ngram_range=(1, 2), min_df=1, sublinear_tf=True),
+        LogisticRegression(max_iter=1000, class_weight='balanced')
+    )
+    model.fit(X_train, y_train)
+    print("Modelo entrenado exitosamente.")
+
+    # 4. Evaluar el modelo
+    print("\n--- Evaluación del Modelo en el Conjunto de Prueba ---")
+    y_pred = model.predict(X_test)
+    print(f"Precisión (Accuracy): {accuracy_score(y_test, y_pred):.2%}")
+    print("\nReporte de Clasificación:")
+    print(classification_report(y_test, y_pred))
+
+    # 5. Guardar el modelo entrenado (debe copiarse junto a main.py o indicarse en SENTIMENT_LOCAL_MODEL_PATH)
+    model_filename = 'sentiment_model.joblib'
+    joblib.dump(model, model_filename)
+    print(f"\nModelo guardado exitosamente como '{model_filename}'")
+
+
+if __name__ == "__main__":
+    train_sentiment_model()
@@ -0,0 +1,263 @@
+# trading_bot/model_registry.py
+import argparse
+import glob
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+
+import joblib
+from config import config
+from file_utils import replacement_mode
+from logger import log
+
+# Índice que usa el bot; una ruta relativa se toma desde la raíz del proyecto, así los scripts de
+# ml_training registran sus modelos en el mismo índice aunque se ejecuten desde su carpeta
+DEFAULT_INDEX_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), config.MODEL_REGISTRY_INDEX)
+# Archivos con sufijo de versión (ai_model_v3.joblib) son versiones del mismo modelo (ai_model v3)
+_VERSIONED_FILE = re.compile(r"^(?P<name>.+)_v(?P<version>\d+)$")
+
+def file_hash(path, chunk_size=1 << 20):
+    """
+    Huella (blake2b) del contenido de un archivo, p. ej. del CSV de entrenamiento.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class ModelRegistry:
+    """
+    Registro de modelos .joblib con sus metadatos y la versión activa de cada uno.
+
+    El índice (JSON junto a los modelos) guarda por nombre de modelo sus versiones (archivo,
+    features, huella de los datos de entrenamiento, métricas, fecha) y cuál está activa. Los
+    modelos se cargan bajo demanda, la primera vez que se piden, con mmap de joblib para que los
+    arrays grandes se compartan entre procesos. activate() carga la nueva versión antes de
+    sustituir la activa, así que el cambio en caliente es atómico para quien llama a get().
+    Si otro proceso (p. ej. un script de entrenamiento o la línea de comandos) modifica el
+    índice, los cambios se recogen en caliente cada refresh_interval segundos.
+    """
+    def __init__(self, index_path='model_registry.json', mmap_mode='r', refresh_interval=5.0):
+        self.index_path = index_path
+        self.root_dir = os.path.dirname(os.path.abspath(index_path))
+        self.mmap_mode = mmap_mode
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._index = None
+        self._index_mtime = None
+        self._last_refresh = 0.0
+        self._loaded = {} # nombre -> (versión, modelo)
+
+    # --- Índice ---
+    def _ensure_index(self):
+        if self._index is None:
+            self._read_index()
+            self.scan()
+        elif time.monotonic() - self._last_refresh >= self.refresh_interval:
+            self._last_refresh = time.monotonic()
+            try:
+                mtime = os.path.getmtime(self.index_path)
+            except OSError:
+                mtime = None
+            if mtime != self._index_mtime:
+                self._read_index()
+
+    def _read_index(self):
+        self._index = {}
+        self._index_mtime = None
+        self._last_refresh = time.monotonic()
+        if os.path.exists(self.index_path):
+            try:
+                with open(self.index_path, 'r') as f:
+                    self._index = json.load(f)
+                self._index_mtime = os.path.getmtime(self.index_path)
+            except (OSError, json.JSONDecodeError) as e:
+                log.warning(f"No se pudo leer el índice de modelos '{self.index_path}': {e}")
+
+    def _write_index(self):
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.root_dir, prefix='.model_registry_', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(self._index, f, indent=4)
+                os.chmod(tmp_path, replacement_mode(self.index_path))
+                os.replace(tmp_path, self.index_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._index_mtime = os.path.getmtime(self.index_path)
+        except Exception as e:
+            log.error(f"No se pudo guardar el índice de modelos '{self.index_path}': {e}")
+
+    def scan(self):
+        """
+        Añade al índice (sin cargarlos) los .joblib del directorio que aún no estén registrados,
+        con el nombre de su archivo: nombre.joblib es la versión 1 y nombre_vN.joblib la versión N
+        (el nombre y la versión con que los registran los scripts de entrenamiento). La versión
+        activa de un modelo ya indexado no cambia.
+        """
+        with self._lock:
+            if self._index is None:
+                self._read_index()
+            known = {entry['path'] for model in self._index.values() for entry in model['versions'].values()}
+            added = 0
+            for path in sorted(glob.glob(os.path.join(self.root_dir, '*.joblib'))):
+                relative_path = os.path.relpath(path, self.root_dir)
+                if relative_path in known:
+                    continue
+                name, version = os.path.splitext(relative_path)[0], '1'
+                match = _VERSIONED_FILE.match(name)
+                if match:
+                    name, version = match.group('name'), match.group('version')
+                model = self._index.setdefault(name, {'active': version, 'versions': {}})
+                if version in model['versions']:
+                    continue
+                model['versions'][version] = {'path': relative_path, 'created_at': int(os.path.getmtime(path))}
+                added += 1
+            if added:
+                log.info(f"Registro de modelos: {added} archivos nuevos indexados en '{self.index_path}'.")
+                self._write_index()
+
+    # --- Consultas ---
+    def names(self):
+        with self._lock:
+            self._ensure_index()
+            return sorted(self._index)
+
+    def versions(self, name):
+        with self._lock:
+            self._ensure_index()
+            return dict(self._index[name]['versions'])
+
+    def active_version(self, name):
+        with self._lock:
+            self._ensure_index()
+            model = self._index.get(name)
+            return model['active'] if model else None
+
+    def metadata(self, name, version=None):
+        with self._lock:
+            self._ensure_index()
+            model = self._index[name]
+            return dict(model['versions'][version or model['active']])
+
+    def get(self, name):
+        """
+        Devuelve el modelo activo (cargándolo la primera vez). None si no está registrado
+        o no se puede cargar.
+        """
+        with self._lock:
+            version = self.active_version(name)
+            if version is None:
+                log.error(f"El modelo '{name}' no está en el registro '{self.index_path}'.")
+                return None
+            loaded = self._loaded.get(name)
+            if loaded is not None and loaded[0] == version:
+                return loaded[1]
+            model = self._load(name, version)
+            if model is not None:
+                self._loaded[name] = (version, model)
+            return model
+
+    def _load(self, name, version):
+        entry = self._index[name]['versions'][version]
+        path = os.path.join(self.root_dir, entry['path'])
+        try:
+            model = joblib.load(path, mmap_mode=self.mmap_mode)
+        except Exception as e:
+            log.error(f"Error al cargar el modelo '{name}' v{version} desde '{path}': {e}")
+            return None
+        if 'features' not in entry and getattr(model, 'feature_names_in_', None) is not None:
+            with self._lock:
+                entry['features'] = [str(feature) for feature in model.feature_names_in_]
+                self._write_index()
+        log.info(f"Modelo '{name}' v{version} cargado desde '{path}'.")
+        return model
+
+    # --- Cambios ---
+    def register(self, name, path, version=None, features=None, data_path=None, metrics=None, activate=True):
+        """
+        Registra un archivo de modelo como nueva versión de `name` y, por defecto, la activa.
+
+        :param data_path: CSV de entrenamiento; se guarda su huella para saber con qué datos se entrenó.
+        """
+        with self._lock:
+            self._ensure_index()
+            model = self._index.setdefault(name, {'active': None, 'versions': {}})
+            if version is None:
+                numeric = [int(v) for v in model['versions'] if str(v).isdigit()]
+                version = str(max(numeric, default=0) + 1)
+            entry = {'path': os.path.relpath(os.path.abspath(path), self.root_dir), 'created_at': int(time.time())}
+            if features is not None:
+                entry['features'] = [str(feature) for feature in features]
+            if data_path is not None and os.path.exists(data_path):
+                entry['data_hash'] = file_hash(data_path)
+            if metrics is not None:
+                entry['metrics'] = metrics
+            model['versions'][str(version)] = entry
+            if model['active'] is None:
+                model['active'] = str(version)
+            self._write_index()
+            log.info(f"Modelo '{name}' v{version} registrado ('{entry['path']}').")
+        if activate:
+            self.activate(name, version)
+        return str(version)
+
+    def activate(self, name, version):
+        """
+        Cambia en caliente la versión activa. La nueva versión se carga antes del cambio: si no
+        se puede cargar, la versión activa no se modifica.
+        """
+        version = str(version)
+        with self._lock:
+            self._ensure_index()
+            if version not in self._index[name]['versions']:
+                raise KeyError(f"El modelo '{name}' no tiene la versión '{version}'.")
+            previous = self._index[name]['active']
+        model = self._load(name, version)
+        if model is None:
+            return False
+        with self._lock:
+            self._loaded[name] = (version, model)
+            self._index[name]['active'] = version
+            self._write_index()
+        if previous != version:
+            log.info(f"Modelo '{name}': versión activa cambiada de v{previous} a v{version}.")
+        return True
+
+# Crear una instancia global para ser usada por el bot
+model_registry = ModelRegistry(index_path=DEFAULT_INDEX_PATH)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gestiona el registro de modelos .joblib.")
+    parser.add_argument('--index', default=DEFAULT_INDEX_PATH, help="Ruta del índice del registro.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    subparsers.add_parser('list', help="Lista los modelos, sus versiones y la activa.")
+    register_parser = subparsers.add_parser('register', help="Registra un archivo como nueva versión de un modelo.")
+    register_parser.add_argument('name')
+    register_parser.add_argument('path')
+    register_parser.add_argument('--version')
+    register_parser.add_argument('--data', help="CSV de entrenamiento (se guarda su huella).")
+    register_parser.add_argument('--no-activate', action='store_true')
+    activate_parser = subparsers.add_parser('activate', help="Activa una versión (el bot la recoge en caliente).")
+    activate_parser.add_argument('name')
+    activate_parser.add_argument('version')
+    args = parser.parse_args()
+
+    registry = ModelRegistry(index_path=args.index)
+    if args.command == 'list':
+        for model_name in registry.names():
+            active = registry.active_version(model_name)
+            for model_version, entry in sorted(registry.versions(model_name).items()):
+                marker = '*' if model_version == active else ' '
+                print(f"{marker} {model_name} v{model_version}: {entry['path']} "
+                      f"metrics={entry.get('metrics', {})} data_hash={entry.get('data_hash', '-')}")
+    elif args.command == 'register':
+        registry.register(args.name, args.path, version=args.version, data_path=args.data, activate=not args.no_activate)
+    elif args.command == 'activate':
+        registry.activate(args.name, args.version)
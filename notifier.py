@@ -1,55 +1,246 @@
-import telegram
 import asyncio
+import atexit
+import queue
+import threading
+import time
 from logger import log
 from config import config
+from metrics import metrics
+from subsystems import subsystems
+
+_STOP = object()
+_PARSE_ERROR = object() # Telegram no pudo interpretar el Markdown del mensaje
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
 
 class Notifier:
-    def __init__(self):
+    """
+    Envía notificaciones por Telegram desde un hilo de entrega en segundo plano.
+
+    send_message solo encola el mensaje (cola acotada) y vuelve al instante, sin bloquear el
+    bucle de trading. El hilo de entrega mantiene un único bot y su conexión HTTP durante toda la
+    vida del proceso, agrupa en un solo mensaje las ráfagas que llegan dentro de coalesce_window
+    segundos y reintenta respetando los límites de Telegram (RetryAfter) y los fallos de red.
+    Si Telegram rechaza el Markdown de un grupo, sus mensajes se reenvían por separado (y como
+    texto plano el que siga fallando). Al apagar el bot se entregan los mensajes pendientes.
+    """
+    def __init__(self, max_queue_size=100, coalesce_window=1.0, max_retries=5, base_url=None):
         self.token = config.TELEGRAM_TOKEN
         self.chat_id = config.TELEGRAM_CHAT_ID
-        
+        self.coalesce_window = coalesce_window
+        self.max_retries = max_retries
+        self.base_url = base_url # Permite apuntar a un endpoint local de pruebas
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._worker = None
+        self._worker_lock = threading.Lock()
+        self._bot = None
+
         if self.token and self.chat_id:
             log.info("Módulo de Notificaciones (Telegram) inicializado correctamente.")
+            atexit.register(self.close)
         else:
             log.warning("Credenciales de Telegram no encontradas. El notificador está desactivado.")
 
-    async def _send_async(self, message):
+    def send_message(self, message):
         """
-        Función asíncrona interna para enviar el mensaje.
+        Encola el mensaje para su envío y vuelve inmediatamente.
         """
+        if not self.token or not self.chat_id:
+            return
+
+        self._ensure_worker()
         try:
-            bot = telegram.Bot(token=self.token)
-            await bot.send_message(
-                chat_id=self.chat_id,
-                text=message,
-                parse_mode='Markdown'
-            )
-            log.info("Notificación enviada por Telegram.")
-        except Exception as e:
-            log.error(f"Error al enviar la notificación asíncrona por Telegram: {e}")
+            self._queue.put_nowait(message)
+        except queue.Full:
+            metrics.inc('telegram_dropped')
+            log.warning("La cola de notificaciones está llena. Se descarta el mensaje.")
 
-    def send_message(self, message):
+    def close(self, timeout=10.0):
         """
-        Función síncrona que el bot puede llamar de forma segura.
-        Crea un nuevo ciclo de conexión para cada mensaje.
+        Entrega los mensajes pendientes y detiene el hilo de entrega.
         """
-        if not self.token or not self.chat_id:
+        worker = self._worker
+        if worker is None or not worker.is_alive():
             return
+        self._queue.put(_STOP)
+        worker.join(timeout)
+        if worker.is_alive():
+            log.warning("No se pudieron entregar todas las notificaciones pendientes antes de apagar.")
 
+    def _ensure_worker(self):
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="TelegramNotifier", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        """
+        Bucle del hilo de entrega, con su propio event loop persistente.
+        """
+        loop = asyncio.new_event_loop()
+        stop = False
         try:
-            # Esta es la magia: asyncio.run() crea un nuevo "hilo" de comunicación
-            # para cada mensaje, evitando problemas con conexiones cerradas.
-            asyncio.run(self._send_async(message))
-        except RuntimeError as e:
-            # Maneja un caso raro donde un bucle ya podría estar corriendo
-            if "cannot run loop while another loop is running" in str(e):
-                # Si ya hay un bucle, simplemente lo usamos
-                loop = asyncio.get_event_loop()
-                loop.create_task(self._send_async(message))
-            else:
-                log.error(f"Error de Runtime en el notificador: {e}")
-        except Exception as e:
-            log.error(f"Error general en el notificador: {e}")
-
-# Crear una instancia global para ser usada por el bot
-notifier = Notifier()
\ No newline at end of file
+            while not stop:
+                item = self._queue.get()
+                if item is _STOP:
+                    break
+                messages = [item]
+                # Agrupamos los mensajes que llegan en ráfaga en un solo envío
+                deadline = time.monotonic() + self.coalesce_window
+                while True:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if item is _STOP:
+                        stop = True
+                        break
+                    messages.append(item)
+                for parts in self._batch(messages):
+                    loop.run_until_complete(self._deliver(parts))
+        finally:
+            if self._bot is not None:
+                try:
+                    loop.run_until_complete(self._bot.shutdown())
+                except Exception as e:
+                    log.error(f"Error al cerrar la conexión con Telegram: {e}")
+                self._bot = None
+            loop.close()
+
+    @staticmethod
+    def _batch(messages):
+        """
+        Agrupa los mensajes en lotes que, unidos, respetan el tamaño máximo de un mensaje de Telegram.
+        """
+        batches, current, length = [], [], 0
+        for message in messages:
+            message = message[:TELEGRAM_MAX_MESSAGE_LENGTH]
+            if current and length + 2 + len(message) > TELEGRAM_MAX_MESSAGE_LENGTH:
+                batches.append(current)
+                current, length = [], 0
+            length += len(message) + (2 if current else 0)
+            current.append(message)
+        if current:
+            batches.append(current)
+        return batches
+
+    async def _deliver(self, parts):
+        """
+        Envía un lote de mensajes unidos en uno solo. Si Telegram no puede interpretar su Markdown
+        (basta un mensaje mal formado), cada mensaje se reenvía por separado para no perder los
+        demás, y el que siga fallando se envía como texto plano.
+        """
+        text = "\n\n".join(parts)
+        if await self._send_async(text) is not _PARSE_ERROR:
+            return
+        if len(parts) == 1:
+            await self._send_async(text, parse_mode=None)
+            return
+        for part in parts:
+            if await self._send_async(part) is _PARSE_ERROR:
+                await self._send_async(part, parse_mode=None)
+
+    async def _get_bot(self):
+        import telegram # Se importa en el hilo de entrega, fuera del camino de arranque del bot
+        if self._bot is None:
+            kwargs = {'base_url': self.base_url} if self.base_url else {}
+            self._bot = telegram.Bot(token=self.token, **kwargs)
+            await self._bot.initialize()
+        return self._bot
+
+    async def _send_async(self, message, parse_mode='Markdown'):
+        """
+        Función asíncrona interna para enviar el mensaje, con reintentos.
+        Devuelve _PARSE_ERROR si Telegram rechaza el formato del mensaje.
+        """
+        import telegram
+        for attempt in range(self.max_retries):
+            try:
+                bot = await self._get_bot()
+                with metrics.span('telegram_send'):
+                    await bot.send_message(
+                        chat_id=self.chat_id,
+                        text=message,
+                        parse_mode=parse_mode
+                    )
+                log.info("Notificación enviada por Telegram.")
+                return
+            except telegram.error.BadRequest as e:
+                # BadRequest hereda de NetworkError: no tiene sentido reintentar el mismo mensaje
+                if parse_mode and 'parse' in str(e).lower():
+                    metrics.inc('telegram_parse_errors')
+                    log.warning(f"Telegram no pudo interpretar el formato del mensaje ({e}).")
+                    return _PARSE_ERROR
+                log.error(f"Telegram rechazó la notificación: {e}")
+                return
+            except telegram.error.RetryAfter as e:
+                metrics.inc('telegram_retries', reason='rate_limit')
+                retry_after = e.retry_after.total_seconds() if hasattr(e.retry_after, 'total_seconds') else float(e.retry_after)
+                log.warning(f"Límite de Telegram alcanzado. Reintentando en {retry_after:.1f}s.")
+                await asyncio.sleep(retry_after)
+            except telegram.error.NetworkError as e:
+                metrics.inc('telegram_retries', reason='network')
+                delay = min(2 ** attempt, 30)
+                log.warning(f"Error de red al enviar por Telegram ({e}). Reintentando en {delay}s.")
+                await asyncio.sleep(delay)
+            except Exception as e:
+                log.error(f"Error al enviar la notificación asíncrona por Telegram: {e}")
+                return
+        log.error(f"No se pudo enviar la notificación tras {self.max_retries} intentos.")
+
+# Instancia global: se crea en el primer uso (ver subsystems.py)
+notifier = subsystems.lazy('notifier')
+
+if __name__ == "__main__":
+    # Comprobación contra un endpoint local que imita la Bot API de Telegram (sin red): agrupación
+    # de ráfagas y reenvío por separado / en texto plano cuando el Markdown no se puede interpretar
+    import json
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+    from urllib.parse import parse_qsl
+
+    received = []
+
+    class StubTelegramHandler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+            params = json.loads(body) if self.headers.get('Content-Type', '').startswith('application/json') else dict(parse_qsl(body))
+            if self.path.endswith('/getMe'):
+                self._reply(200, {'ok': True, 'result': {'id': 1, 'is_bot': True, 'first_name': 'Stub', 'username': 'stub_bot'}})
+                return
+            text, parse_mode = params.get('text', ''), params.get('parse_mode')
+            if parse_mode == 'Markdown' and text.count('*') % 2:
+                self._reply(400, {'ok': False, 'error_code': 400, 'description': "Bad Request: can't parse entities: unclosed bold"})
+                return
+            received.append((text, parse_mode))
+            message = {'message_id': len(received), 'date': 0, 'chat': {'id': 1, 'type': 'private'}, 'text': text}
+            self._reply(200, {'ok': True, 'result': message})
+
+        def _reply(self, status, payload):
+            data = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubTelegramHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    config.TELEGRAM_TOKEN, config.TELEGRAM_CHAT_ID = 'stub-token', '1'
+    stub_notifier = Notifier(coalesce_window=0.5, base_url=f"http://127.0.0.1:{server.server_port}/bot")
+
+    stub_notifier.send_message("✅ **Bot Iniciado**")
+    stub_notifier.send_message("Mensaje con *negrita sin cerrar")
+    stub_notifier.send_message("🛑 **Stop-Loss ejecutado**")
+    stub_notifier.close()
+    server.shutdown()
+
+    for text, parse_mode in received:
+        print(f"[{parse_mode or 'texto plano'}] {text!r}")
+    assert received == [("✅ **Bot Iniciado**", 'Markdown'), ("Mensaje con *negrita sin cerrar", None),
+                        ("🛑 **Stop-Loss ejecutado**", 'Markdown')], "Entrega inesperada"
+    print("OK")
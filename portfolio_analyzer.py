@@ -1,50 +1,123 @@
 # trading_bot/portfolio_analyzer.py
+import time
 import pandas as pd
 from logger import log
 from api_client import api_client
+from subsystems import subsystems
+from timeframes import timeframe_to_ms
 
 class PortfolioAnalyzer:
-    def __init__(self, correlation_threshold=0.7):
+    """
+    Controla la correlación entre un nuevo activo y las posiciones abiertas.
+
+    Mantiene una matriz móvil de rendimientos diarios (las últimas `window` velas cerradas) del
+    universo seguido, que se actualiza de forma incremental al cerrar cada vela diaria con
+    update(). La matriz de correlación N×N se calcula una vez por actualización, así que la
+    comprobación previa a una operación es una sola consulta vectorizada, sin llamadas a la red.
+    """
+    def __init__(self, correlation_threshold=0.7, window=100, min_periods=20, timeframe='1d'):
         self.correlation_threshold = correlation_threshold
+        self.window = window
+        self.min_periods = min_periods
+        self.timeframe = timeframe
+        self._timeframe_ms = timeframe_to_ms(timeframe)
+        self._closes = {} # símbolo -> Serie de cierres diarios (índice: timestamp de apertura en ms)
+        self._returns = None
+        self._correlation = None
         log.info("Módulo de Análisis de Cartera inicializado.")
 
-    def is_highly_correlated(self, new_asset_id, new_asset_data, open_trades):
+    def update(self, symbol, daily_df, now_ms=None):
+        """
+        Incorpora las velas diarias cerradas de `daily_df` (columnas 'timestamp' y 'close')
+        posteriores a la última ya guardada. Devuelve True si entró alguna vela nueva.
+        """
+        if daily_df is None or daily_df.empty:
+            return False
+        now_ms = int(time.time() * 1000) if now_ms is None else now_ms
+        timestamps = daily_df['timestamp'].to_numpy()
+        is_new = timestamps + self._timeframe_ms <= now_ms # Solo velas cerradas
+        existing = self._closes.get(symbol)
+        if existing is not None and len(existing):
+            is_new &= timestamps > existing.index[-1]
+        if not is_new.any():
+            return False
+
+        new_closes = pd.Series(daily_df['close'].to_numpy(dtype=float)[is_new], index=timestamps[is_new])
+        closes = new_closes if existing is None else pd.concat([existing, new_closes])
+        self._closes[symbol] = closes.iloc[-(self.window + 1):]
+        self._returns = None
+        self._correlation = None
+        return True
+
+    def on_daily_close(self, symbol, timestamp, close):
+        """
+        Añade una sola vela diaria cerrada (p. ej. desde un feed en streaming).
+        """
+        return self.update(symbol, pd.DataFrame({'timestamp': [timestamp], 'close': [close]}),
+                           now_ms=timestamp + self._timeframe_ms)
+
+    def refresh(self, symbols, client=None):
         """
-        Verifica la correlación usando un DataFrame ya descargado.
+        Descarga las velas diarias del universo y actualiza la matriz. Pensado para llamarse
+        fuera del camino previo a la operación (al arrancar o una vez por ciclo).
+        """
+        client = client or api_client
+        for symbol in symbols:
+            daily_df = client.get_historical_data(symbol, self.timeframe, limit=self.window + 2)
+            self.update(symbol, daily_df)
+
+    @property
+    def symbols(self):
+        return list(self._closes)
+
+    def returns_matrix(self):
+        """
+        Rendimientos diarios alineados por fecha (filas) y símbolo (columnas).
+        """
+        if self._returns is None:
+            closes = pd.DataFrame(self._closes).sort_index()
+            self._returns = closes.pct_change(fill_method=None).iloc[-self.window:]
+        return self._returns
+
+    def correlation_matrix(self):
+        """
+        Matriz N×N de correlaciones de los rendimientos diarios (para informes y para el control previo).
+        """
+        if self._correlation is None:
+            self._correlation = self.returns_matrix().corr(min_periods=self.min_periods)
+        return self._correlation
+
+    def is_highly_correlated(self, new_asset_id, new_asset_data=None, open_trades=None):
+        """
+        Verifica si el nuevo activo está muy correlacionado con alguna posición abierta.
+        Si se pasan velas diarias del nuevo activo (`new_asset_data`), se incorporan antes.
         """
         if not open_trades:
             return False
 
         log.info(f"Verificando correlación para el nuevo activo: {new_asset_id}")
-        
-        if new_asset_data is None:
-            log.warning(f"No se proporcionaron datos para {new_asset_id}, no se puede verificar la correlación.")
+        if new_asset_data is not None:
+            self.update(new_asset_id, new_asset_data)
+
+        correlation = self.correlation_matrix()
+        if new_asset_id not in correlation.index:
+            log.warning(f"No hay datos diarios de {new_asset_id}, no se puede verificar la correlación.")
+            return False
+
+        open_assets = {trade.get('order_details', {}).get('symbol', asset) for asset, trade in open_trades.items()}
+        open_assets = [asset for asset in open_assets if asset != new_asset_id and asset in correlation.columns]
+        if not open_assets:
             return False
 
-        for asset, trade in open_trades.items():
-            existing_asset_id = trade.get('order_details', {}).get('symbol', asset)
-            
-            existing_asset_data = api_client.get_historical_data(
-                product_id=existing_asset_id,
-                granularity='1d', # Usar datos diarios para una correlación más estable
-                limit=100
-            )
-
-            if existing_asset_data is None: continue
-
-            # Asegurarse de que los índices de tiempo coincidan
-            common_index = new_asset_data.index.intersection(existing_asset_data.index)
-            if len(common_index) < 2:
-                log.warning("No hay suficientes datos superpuestos para calcular la correlación.")
-                continue
-
-            correlation = new_asset_data.loc[common_index]['close'].corr(existing_asset_data.loc[common_index]['close'])
-            log.info(f"Correlación entre {new_asset_id} y {existing_asset_id}: {correlation:.2f}")
-
-            if correlation > self.correlation_threshold:
-                log.warning(f"¡ALERTA DE ALTA CORRELACIÓN! {new_asset_id} está altamente correlacionado con {existing_asset_id}.")
-                return True
-        
+        correlations = correlation.loc[new_asset_id, open_assets].dropna()
+        log.info(f"Correlaciones de {new_asset_id} con las posiciones abiertas: "
+                 + ", ".join(f"{asset}={value:.2f}" for asset, value in correlations.items()))
+        highly_correlated = correlations[correlations > self.correlation_threshold]
+        if not highly_correlated.empty:
+            log.warning(f"¡ALERTA DE ALTA CORRELACIÓN! {new_asset_id} está altamente correlacionado con "
+                        f"{', '.join(highly_correlated.index)}.")
+            return True
         return False
 
-portfolio_analyzer = PortfolioAnalyzer()
\ No newline at end of file
+# Instancia global: se crea en el primer uso (ver subsystems.py)
+portfolio_analyzer = subsystems.lazy('portfolio_analyzer')
@@ -0,0 +1,630 @@
+# trading_bot/replay_exchange.py
+import argparse
+import contextlib
+import itertools
+import os
+import shutil
+import sys
+import time
+
+import ccxt
+import numpy as np
+from candle_store import candle_store
+from clock import ReplayFinished, VirtualClock
+from config import config
+from logger import set_log_level
+from timeframes import timeframe_to_ms
+
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ml_training', 'data')
+# Historial mínimo (velas de 6h) antes del inicio por defecto, para sembrar los indicadores
+WARMUP_CANDLES = 400
+# Archivo que marca un directorio de salida creado por run_replay (el único que se puede vaciar)
+REPLAY_MARKER = '.replay_output'
+
+class _Series:
+    __slots__ = ('timeframe', 'timeframe_ms', 'ts', 'data')
+
+    def __init__(self, timeframe, df):
+        self.timeframe = timeframe
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        df = df.sort_values('timestamp').drop_duplicates('timestamp')
+        self.ts = df['timestamp'].to_numpy(dtype=np.int64)
+        self.data = df[['timestamp', 'open', 'high', 'low', 'close', 'volume']].to_numpy(dtype=np.float64)
+
+class ReplayExchange:
+    """
+    Exchange local que repite el histórico de velas guardado, para pruebas de extremo a extremo
+    del bot en modo SIMULATED.
+
+    Implementa los métodos de ccxt que usan APIClient y ExecutionHandler (fetch_ohlcv,
+    fetch_balance, create_order / create_market_order con stop-loss adjunto, fetch_order,
+    fetch_open_orders, cancel_order) sobre un reloj virtual (clock.py): solo se ven las velas
+    abiertas hasta la hora virtual, la vela en curso se construye sin mirar al futuro y las
+    órdenes de mercado se llenan al precio actual con comisión y deslizamiento. Los stop-loss se
+    disparan con los máximos y mínimos de las velas que van cerrando (con el precio de apertura si
+    hay hueco). La cuenta es de margen en la moneda de cotización: posiciones netas largas o
+    cortas por símbolo con el apalancamiento indicado.
+    """
+    name = 'Replay'
+
+    def __init__(self, clock, quote='USDT', initial_balance=10000.0, leverage=1.0, fee_rate=0.0006, slippage_bps=2.0):
+        self.clock = clock
+        self.quote = quote
+        self.initial_balance = float(initial_balance)
+        self.cash = float(initial_balance)
+        self.leverage = leverage
+        self.fee_rate = fee_rate
+        self.slippage = slippage_bps / 10_000
+        self.rateLimit = 0 # Sin límite de peticiones: api_client no duerme entre páginas
+        self.has = {
+            'fetchOHLCV': True,
+            'fetchBalance': True,
+            'createMarketOrder': True,
+            'fetchOrder': True,
+            'fetchOpenOrders': True,
+            'cancelOrder': True,
+        }
+        self.series = {} # (símbolo, temporalidad) -> _Series
+        self.positions = {} # símbolo -> {'amount': cantidad con signo, 'entry_price': precio medio}
+        self.orders = {}
+        self.trades = []
+        self.fees_paid = 0.0
+        self._order_ids = itertools.count(1)
+        self._stop_cursor = {} # id de stop -> timestamp (ms) de la primera vela aún sin revisar
+
+    # --- Datos ---
+    def load_series(self, symbol, timeframe, df):
+        """
+        Añade una serie de velas (DataFrame con timestamp en ms y OHLCV) a la repetición.
+        """
+        self.series[(symbol, timeframe)] = _Series(timeframe, df)
+
+    @classmethod
+    def from_history(cls, clock, series, data_dir=DEFAULT_DATA_DIR, **kwargs):
+        """
+        Crea la repetición con las series (símbolo, temporalidad) del almacén de velas
+        (candle_store) o, si no están importadas, de los CSV de ml_training/data.
+        """
+        exchange = cls(clock, **kwargs)
+        for symbol, timeframe in series:
+            csv_path = os.path.join(data_dir, f"{symbol.replace('/', '_')}_{timeframe}.csv")
+            exchange.load_series(symbol, timeframe, candle_store.load_or_csv(symbol, timeframe, csv_path))
+        return exchange
+
+    def time_range(self, symbol):
+        """
+        (primer timestamp, fin de la última vela) en ms de la serie más fina del símbolo.
+        """
+        series = self._finest_series(symbol)
+        return int(series.ts[0]), int(series.ts[-1]) + series.timeframe_ms
+
+    def _series(self, symbol, timeframe):
+        try:
+            return self.series[(symbol, timeframe)]
+        except KeyError:
+            raise ccxt.BadSymbol(f"La repetición no tiene velas de {symbol} ({timeframe})")
+
+    def _finest_series(self, symbol):
+        candidates = [series for (series_symbol, _), series in self.series.items() if series_symbol == symbol]
+        if not candidates:
+            raise ccxt.BadSymbol(f"La repetición no tiene velas de {symbol}")
+        return min(candidates, key=lambda series: series.timeframe_ms)
+
+    def _now_ms(self):
+        return int(self.clock.time() * 1000)
+
+    # --- API de mercado ---
+    def fetch_ohlcv(self, symbol, timeframe='1m', since=None, limit=None, params=None):
+        self._process_stops()
+        series = self._series(symbol, timeframe)
+        now_ms = self._now_ms()
+        end = int(np.searchsorted(series.ts, now_ms, side='right')) # Velas abiertas hasta ahora
+        if since is None:
+            start = max(0, end - limit) if limit else 0
+        else:
+            start = int(np.searchsorted(series.ts, since, side='left'))
+            if limit:
+                end = min(end, start + limit)
+        rows = series.data[start:end].tolist()
+        if rows and rows[-1][0] + series.timeframe_ms > now_ms:
+            rows[-1] = self._partial_candle(symbol, series, end - 1, now_ms)
+        for row in rows:
+            row[0] = int(row[0])
+        return rows
+
+    def _partial_candle(self, symbol, series, index, now_ms):
+        """
+        Vela aún abierta: se agrega con las velas más finas ya cerradas del mismo símbolo o,
+        si no las hay, solo con su precio de apertura (sin mirar al futuro).
+        """
+        start_ms, open_ = series.data[index][0], series.data[index][1]
+        finer = self._finest_series(symbol)
+        if finer.timeframe_ms < series.timeframe_ms:
+            lo = np.searchsorted(finer.ts, start_ms, side='left')
+            hi = np.searchsorted(finer.ts, now_ms - finer.timeframe_ms, side='right')
+            closed = finer.data[lo:hi]
+            if len(closed):
+                return [start_ms, open_, max(open_, closed[:, 2].max()), min(open_, closed[:, 3].min()),
+                        closed[-1, 4], closed[:, 5].sum()]
+        return [start_ms, open_, open_, open_, open_, 0.0]
+
+    def _price(self, symbol):
+        """
+        Precio actual: apertura de la vela más fina en curso (o el cierre si ya no hay más velas).
+        """
+        series = self._finest_series(symbol)
+        now_ms = self._now_ms()
+        index = int(np.searchsorted(series.ts, now_ms, side='right')) - 1
+        if index < 0:
+            raise ccxt.ExchangeError(f"Sin velas de {symbol} antes de {ccxt.Exchange.iso8601(now_ms)}")
+        candle = series.data[index]
+        return candle[4] if candle[0] + series.timeframe_ms <= now_ms else candle[1]
+
+    # --- API de cuenta ---
+    def fetch_balance(self, params=None):
+        self._process_stops()
+        used = 0.0
+        unrealized = 0.0
+        for symbol, position in self.positions.items():
+            used += abs(position['amount']) * position['entry_price'] / self.leverage
+            unrealized += position['amount'] * (self._price(symbol) - position['entry_price'])
+        total = self.cash + unrealized
+        free = total - used
+        return {
+            'info': {},
+            self.quote: {'free': free, 'used': used, 'total': total},
+            'free': {self.quote: free},
+            'used': {self.quote: used},
+            'total': {self.quote: total},
+        }
+
+    def set_leverage(self, leverage, symbol=None, params=None):
+        self.leverage = leverage
+
+    # --- API de órdenes ---
+    def create_order(self, symbol, type, side, amount, price=None, params=None):
+        self._process_stops()
+        params = params or {}
+        if side not in ('buy', 'sell'):
+            raise ccxt.InvalidOrder(f"Lado de orden no válido: '{side}'")
+        if not amount or amount <= 0:
+            raise ccxt.InvalidOrder(f"Cantidad de orden no válida: {amount}")
+
+        if type == 'market':
+            fill_price = self._slipped(self._price(symbol), side)
+            self._check_margin(symbol, side, amount, fill_price)
+            order = self._new_order(symbol, 'market', side, amount, reduce_only=params.get('reduceOnly', False))
+            self._fill(order, fill_price, self._now_ms())
+            stop_loss = params.get('stopLoss')
+            if stop_loss:
+                trigger = stop_loss['triggerPrice'] if isinstance(stop_loss, dict) else stop_loss
+                stop_order = self._open_stop(symbol, 'sell' if side == 'buy' else 'buy', order['filled'], trigger)
+                order['info']['stopLossOrderId'] = stop_order['id']
+            return dict(order)
+        if type in ('stop', 'stop_market', 'stopMarket'):
+            trigger = params.get('triggerPrice', params.get('stopPrice', price))
+            if trigger is None:
+                raise ccxt.InvalidOrder("Las órdenes stop necesitan triggerPrice.")
+            return dict(self._open_stop(symbol, side, amount, trigger))
+        raise ccxt.NotSupported(f"La repetición no soporta órdenes de tipo '{type}'.")
+
+    def create_market_order(self, symbol, side, amount, price=None, params=None):
+        return self.create_order(symbol, 'market', side, amount, price, params)
+
+    def fetch_order(self, id, symbol=None, params=None):
+        self._process_stops()
+        if id not in self.orders:
+            raise ccxt.OrderNotFound(f"Orden {id} no encontrada en la repetición.")
+        return dict(self.orders[id])
+
+    def fetch_open_orders(self, symbol=None, since=None, limit=None, params=None):
+        self._process_stops()
+        return [dict(order) for order in self.orders.values()
+                if order['status'] == 'open' and (symbol is None or order['symbol'] == symbol)]
+
+    def cancel_order(self, id, symbol=None, params=None):
+        order = self.orders.get(id)
+        if order is None:
+            raise ccxt.OrderNotFound(f"Orden {id} no encontrada en la repetición.")
+        if order['status'] == 'open':
+            order['status'] = 'canceled'
+            self._stop_cursor.pop(id, None)
+        return dict(order)
+
+    def close(self):
+        pass
+
+    def _new_order(self, symbol, type, side, amount, reduce_only=False, trigger_price=None):
+        now_ms = self._now_ms()
+        order = {
+            'id': str(next(self._order_ids)),
+            'clientOrderId': None,
+            'timestamp': now_ms,
+            'datetime': ccxt.Exchange.iso8601(now_ms),
+            'lastTradeTimestamp': None,
+            'symbol': symbol,
+            'type': type,
+            'side': side,
+            'amount': amount,
+            'filled': 0.0,
+            'remaining': amount,
+            'price': None,
+            'average': None,
+            'cost': 0.0,
+            'status': 'open',
+            'fee': None,
+            'reduceOnly': reduce_only,
+            'triggerPrice': trigger_price,
+            'info': {},
+        }
+        self.orders[order['id']] = order
+        return order
+
+    def _open_stop(self, symbol, side, amount, trigger_price):
+        order = self._new_order(symbol, 'stop_market', side, amount, reduce_only=True, trigger_price=float(trigger_price))
+        # Se revisa desde la vela fina en curso (la entrada se llenó a su apertura)
+        series = self._finest_series(symbol)
+        index = max(0, int(np.searchsorted(series.ts, self._now_ms(), side='right')) - 1)
+        self._stop_cursor[order['id']] = int(series.ts[index])
+        return order
+
+    def _slipped(self, price, side):
+        return price * (1 + self.slippage) if side == 'buy' else price * (1 - self.slippage)
+
+    def _check_margin(self, symbol, side, amount, price):
+        position = self.positions.get(symbol)
+        current = position['amount'] if position else 0.0
+        signed = amount if side == 'buy' else -amount
+        added_exposure = abs(current + signed) - abs(current)
+        if added_exposure <= 0:
+            return
+        free = self.fetch_balance()['free'][self.quote]
+        required = added_exposure * price / self.leverage + amount * price * self.fee_rate
+        if required > free:
+            raise ccxt.InsufficientFunds(f"Margen insuficiente: se necesitan {required:,.2f} {self.quote} y hay {free:,.2f}.")
+
+    def _fill(self, order, price, timestamp):
+        """
+        Llena la orden a `price` y actualiza la posición neta, el PnL realizado y las comisiones.
+        """
+        symbol = order['symbol']
+        position = self.positions.get(symbol, {'amount': 0.0, 'entry_price': 0.0})
+        current = position['amount']
+        amount = order['amount']
+        if order['reduceOnly']:
+            closes_position = current != 0 and (current > 0) == (order['side'] == 'sell')
+            amount = min(amount, abs(current)) if closes_position else 0.0
+            if amount == 0.0:
+                order['status'] = 'canceled'
+                return
+        signed = amount if order['side'] == 'buy' else -amount
+
+        realized = 0.0
+        if current != 0 and (current > 0) != (signed > 0):
+            realized = min(abs(signed), abs(current)) * (price - position['entry_price']) * np.sign(current)
+        new_amount = current + signed
+        if abs(new_amount) < 1e-12:
+            self.positions.pop(symbol, None)
+        elif current == 0 or (new_amount > 0) != (current > 0):
+            self.positions[symbol] = {'amount': new_amount, 'entry_price': price} # Apertura o giro
+        elif (signed > 0) == (current > 0):
+            entry_price = (current * position['entry_price'] + signed * price) / new_amount
+            self.positions[symbol] = {'amount': new_amount, 'entry_price': entry_price}
+        else:
+            self.positions[symbol] = {'amount': new_amount, 'entry_price': position['entry_price']}
+
+        fee = amount * price * self.fee_rate
+        self.cash += realized - fee
+        self.fees_paid += fee
+        order.update({
+            'status': 'closed',
+            'filled': amount,
+            'remaining': 0.0,
+            'price': price,
+            'average': price,
+            'cost': amount * price,
+            'fee': {'cost': fee, 'currency': self.quote},
+            'lastTradeTimestamp': timestamp,
+        })
+        self.trades.append({
+            'order_id': order['id'], 'timestamp': timestamp, 'symbol': symbol, 'type': order['type'],
+            'side': order['side'], 'amount': amount, 'price': price, 'fee': fee, 'realized_pnl': realized,
+        })
+        if symbol not in self.positions:
+            # Sin posición, los stops pendientes del símbolo ya no tienen nada que cerrar
+            for other in self.orders.values():
+                if other['symbol'] == symbol and other['status'] == 'open' and other['reduceOnly']:
+                    self.cancel_order(other['id'])
+
+    def _process_stops(self):
+        """
+        Dispara los stops pendientes con las velas cerradas hasta la hora virtual (y la apertura
+        de la vela en curso, por si abre con hueco).
+        """
+        now_ms = self._now_ms()
+        for order_id in sorted(self._stop_cursor, key=int):
+            order = self.orders[order_id]
+            if order['status'] != 'open':
+                continue
+            series = self._finest_series(order['symbol'])
+            trigger = order['triggerPrice']
+            is_sell = order['side'] == 'sell'
+            lo = int(np.searchsorted(series.ts, self._stop_cursor[order_id], side='left'))
+            hi = int(np.searchsorted(series.ts, now_ms - series.timeframe_ms, side='right'))
+            candles = series.data[lo:hi]
+            hit = candles[:, 3] <= trigger if is_sell else candles[:, 2] >= trigger
+            if hit.any():
+                candle = candles[hit.argmax()]
+            elif hi < len(series.ts) and series.ts[hi] <= now_ms and (
+                    series.data[hi][1] <= trigger if is_sell else series.data[hi][1] >= trigger):
+                candle = series.data[hi]
+            else:
+                if hi > lo: # Las velas ya revisadas no se vuelven a mirar
+                    self._stop_cursor[order_id] = int(series.ts[hi - 1]) + series.timeframe_ms
+                continue
+            # Si la vela abre más allá del stop (hueco), se llena a la apertura
+            fill_price = min(trigger, candle[1]) if is_sell else max(trigger, candle[1])
+            self._stop_cursor.pop(order_id, None)
+            self._fill(order, self._slipped(fill_price, order['side']), int(candle[0]))
+
+    # --- Resumen ---
+    def summary(self):
+        balance = self.fetch_balance()
+        stop_fills = [trade for trade in self.trades if trade['type'] == 'stop_market']
+        return {
+            'initial_balance': self.initial_balance,
+            'equity': balance['total'][self.quote],
+            'realized_pnl': sum(trade['realized_pnl'] for trade in self.trades),
+            'fees': self.fees_paid,
+            'fills': len(self.trades),
+            'stop_fills': len(stop_fills),
+            'open_positions': {symbol: dict(position) for symbol, position in self.positions.items()},
+        }
+
+    def round_trips(self, symbol):
+        """
+        Operaciones completas de `symbol` (de sin posición a sin posición) a partir de las
+        ejecuciones: lado, hora (ms) y precio de entrada y de salida, y motivo de la salida.
+        """
+        trips, amount, current = [], 0.0, None
+        for fill in self.trades:
+            if fill['symbol'] != symbol:
+                continue
+            signed = fill['amount'] if fill['side'] == 'buy' else -fill['amount']
+            if current is None:
+                current = {'side': 'long' if signed > 0 else 'short', 'entry_time': fill['timestamp'], 'entry_price': fill['price']}
+            amount += signed
+            if abs(amount) < 1e-12:
+                current.update(exit_time=fill['timestamp'], exit_price=fill['price'],
+                               exit_reason='stop_loss' if fill['type'] == 'stop_market' else 'market')
+                trips.append(current)
+                current, amount = None, 0.0
+        return trips
+
+class AsyncReplayExchange:
+    """
+    La misma repetición con la interfaz de ccxt.async_support (para AsyncCycleRuntime).
+    """
+    def __init__(self, exchange):
+        self._exchange = exchange
+
+    def __getattr__(self, attribute):
+        return getattr(self._exchange, attribute)
+
+    async def fetch_ohlcv(self, *args, **kwargs):
+        return self._exchange.fetch_ohlcv(*args, **kwargs)
+
+    async def fetch_balance(self, *args, **kwargs):
+        return self._exchange.fetch_balance(*args, **kwargs)
+
+    async def create_order(self, *args, **kwargs):
+        return self._exchange.create_order(*args, **kwargs)
+
+    async def create_market_order(self, *args, **kwargs):
+        return self._exchange.create_market_order(*args, **kwargs)
+
+    async def fetch_order(self, *args, **kwargs):
+        return self._exchange.fetch_order(*args, **kwargs)
+
+    async def fetch_open_orders(self, *args, **kwargs):
+        return self._exchange.fetch_open_orders(*args, **kwargs)
+
+    async def cancel_order(self, *args, **kwargs):
+        return self._exchange.cancel_order(*args, **kwargs)
+
+    async def close(self):
+        pass
+
+def run_replay(start=None, end=None, initial_balance=None, output_dir='replay_output', speed=None,
+               poll_seconds=3600, data_dir=DEFAULT_DATA_DIR, resample_base_timeframe=None):
+    """
+    Ejecuta main.main() de principio a fin sobre la repetición del histórico, con el reloj
+    virtual, órdenes y stops reales contra ReplayExchange, sin red (ni exchange, ni Telegram,
+    ni Gemini) y con el estado y el registro de operaciones en `output_dir`.
+
+    :param start: Inicio (epoch en segundos); por defecto, tras WARMUP_CANDLES velas de 6h.
+    :param end: Fin (epoch en segundos); por defecto, el final de los datos de SOL.
+    :param resample_base_timeframe: Sustituye a config.RESAMPLE_BASE_TIMEFRAME (p. ej. '1h').
+    :return: Resumen de la cuenta de la repetición (ver ReplayExchange.summary).
+    """
+    import main as bot_main
+    from api_client import APIClient
+    from async_runtime import AsyncCycleRuntime
+    from candle_cache import CandleCache
+    from execution_handler import ExecutionHandler
+    from subsystems import subsystems
+
+    base_timeframe = resample_base_timeframe if resample_base_timeframe is not None else config.RESAMPLE_BASE_TIMEFRAME
+    series = [(symbol, timeframe) for symbol, timeframe, _ in bot_main.MARKET_REQUESTS]
+    if base_timeframe:
+        # La caché de velas pide la temporalidad base en lugar de las derivadas: también se repite
+        series += sorted({(symbol, base_timeframe) for symbol, _ in series})
+
+    clock = VirtualClock(0)
+    exchange = ReplayExchange.from_history(
+        clock, series, data_dir=data_dir,
+        initial_balance=initial_balance if initial_balance is not None else config.REPLAY_INITIAL_BALANCE,
+        leverage=config.STRATEGY_CONFIG['leverage'], fee_rate=config.REPLAY_FEE_RATE,
+        slippage_bps=config.REPLAY_SLIPPAGE_BPS,
+    )
+    first_ms, last_ms = exchange.time_range('SOL/USDT')
+    clock.now = start if start is not None else first_ms / 1000 + WARMUP_CANDLES * timeframe_to_ms('6h') / 1000
+    clock.end = end if end is not None else last_ms / 1000
+    clock.speed = speed
+
+    # La repetición no toca el estado, las cachés ni los servicios del bot en vivo
+    _prepare_output_dir(output_dir)
+    overrides = {
+        'BOT_MODE': 'SIMULATED',
+        'ORDER_EXECUTION_ENABLED': True,
+        'STATE_FILE': os.path.join(output_dir, 'state.json'),
+        'TRADE_LEDGER_DB': os.path.join(output_dir, 'trade_ledger.db'),
+        'CANDLE_CACHE_DIR': None,
+        'RESAMPLE_BASE_TIMEFRAME': base_timeframe,
+        'POSITION_POLL_SECONDS': poll_seconds,
+        'TELEGRAM_TOKEN': None,
+        'GEMINI_API_KEY': None,
+        'SENTIMENT_MODE': 'local',
+        'SENTIMENT_CACHE_FILE': None,
+        'API_KEY': 'replay', # Las credenciales no se usan, pero el chequeo de salud las exige
+        'API_SECRET': 'replay',
+    }
+    factories = {
+        'clock': lambda: clock,
+        'candle_cache': lambda: CandleCache(base_timeframe=base_timeframe, clock=clock.time),
+        'api_client': lambda: APIClient(exchange=exchange),
+        'execution_handler': lambda: ExecutionHandler('SIMULATED', exchange=exchange),
+        'cycle_runtime': lambda: AsyncCycleRuntime(exchange=AsyncReplayExchange(exchange),
+                                                   sentiment_analyzer=subsystems.lazy('intelligence_analyzer')),
+    }
+
+    virtual_start = clock.now
+    real_start = time.perf_counter()
+    # La configuración y los subsistemas del proceso se restauran al terminar, aunque la repetición falle
+    with _config_overrides(overrides), subsystems.isolated(**factories):
+        try:
+            # El contador de espera del planificador es para la consola en vivo: aquí solo sería ruido
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                bot_main.main()
+        except ReplayFinished:
+            pass
+    real_elapsed = time.perf_counter() - real_start
+    summary = exchange.summary()
+    summary['virtual_days'] = (clock.now - virtual_start) / 86_400
+    summary['real_seconds'] = real_elapsed
+    summary['speedup'] = (clock.now - virtual_start) / real_elapsed if real_elapsed > 0 else None
+    summary['start_ms'] = int(virtual_start * 1000)
+    summary['end_ms'] = int(clock.now * 1000)
+    summary['execution_timeframe'] = exchange._finest_series('SOL/USDT').timeframe
+    summary['round_trips'] = exchange.round_trips('SOL/USDT')
+    return summary
+
+def compare_with_engine(result, data_dir=DEFAULT_DATA_DIR):
+    """
+    Ejecuta engine.run_historical sobre el mismo periodo y las mismas velas que la repetición
+    (con la misma serie para los stops, comisión y deslizamiento) y compara sus operaciones con
+    las que abrió main.py: lado, vela de la señal, vela del stop y motivo de salida.
+
+    :param result: Resumen devuelto por run_replay.
+    :return: Lista de diferencias (vacía si las operaciones coinciden).
+    """
+    from engine import run_historical
+    from resampler import bucket_start
+    from risk_manager import RiskManager
+    from strategy import Strategy
+
+    strategy = Strategy(config.STRATEGY_CONFIG, verbose=False)
+    execution_timeframe = result['execution_timeframe']
+    execution_ms = timeframe_to_ms(execution_timeframe)
+    frames = {}
+    for symbol, timeframe in dict.fromkeys(list(strategy.subscriptions) + [(strategy.symbol, execution_timeframe)]):
+        csv_path = os.path.join(data_dir, f"{symbol.replace('/', '_')}_{timeframe}.csv")
+        df = candle_store.load_or_csv(symbol, timeframe, csv_path)
+        frames[(symbol, timeframe)] = df[df['timestamp'] + timeframe_to_ms(timeframe) <= result['end_ms']]
+    engine_result = run_historical(
+        frames, strategy, RiskManager.from_config(config, verbose=False),
+        initial_capital=result['initial_balance'], fee_rate=config.REPLAY_FEE_RATE,
+        slippage_bps=config.REPLAY_SLIPPAGE_BPS, execution_timeframe=execution_timeframe, start_ms=result['start_ms']
+    )
+
+    # El bot entra tras el cierre de la vela de la señal y la repetición fecha el stop con la apertura de su vela
+    to_ms = lambda value: int(value.value // 1_000_000)
+    engine_trades = [(trade.side, to_ms(trade.entry_time), to_ms(trade.exit_time), trade.exit_reason)
+                     for trade in engine_result['trades'].itertuples()]
+    replay_trades = [(trip['side'], int(bucket_start(trip['entry_time'], strategy.timeframe)),
+                      trip['exit_time'] + execution_ms, trip['exit_reason'])
+                     for trip in result['round_trips']]
+    describe = lambda trade: (f"{trade[0]} con la vela que cierra {ccxt.Exchange.iso8601(trade[1])}, "
+                              f"salida ({trade[3]}) con la vela que cierra {ccxt.Exchange.iso8601(trade[2])}")
+    differences = [f"solo en main.py: {describe(trade)}" for trade in replay_trades if trade not in engine_trades]
+    differences += [f"solo en engine.run_historical: {describe(trade)}" for trade in engine_trades if trade not in replay_trades]
+    if set(result['open_positions']) != set(engine_result['open_positions']):
+        differences.append(f"posiciones abiertas al final: main.py {sorted(result['open_positions'])}, "
+                           f"engine.run_historical {sorted(engine_result['open_positions'])}")
+    return differences
+
+def _prepare_output_dir(output_dir):
+    """
+    Deja vacío el directorio de salida. Solo se borra un directorio creado por una repetición
+    anterior (con el archivo marcador); cualquier otro directorio con contenido se rechaza.
+    """
+    marker = os.path.join(output_dir, REPLAY_MARKER)
+    if os.path.isdir(output_dir) and os.listdir(output_dir):
+        if not os.path.exists(marker):
+            raise FileExistsError(f"El directorio '{output_dir}' no está vacío y no lo creó una repetición. "
+                                  "Indica otro con --output-dir.")
+        shutil.rmtree(output_dir)
+    os.makedirs(output_dir, exist_ok=True)
+    with open(marker, 'w'):
+        pass
+
+@contextlib.contextmanager
+def _config_overrides(values):
+    """
+    Cambia atributos de config dentro del bloque y restaura los anteriores al salir.
+    """
+    previous = {name: getattr(config, name) for name in values}
+    try:
+        for name, value in values.items():
+            setattr(config, name, value)
+        yield
+    finally:
+        for name, value in previous.items():
+            setattr(config, name, value)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Repite el histórico de velas con el bot completo (main.py) en modo SIMULATED.")
+    parser.add_argument('--start', help="Fecha de inicio (AAAA-MM-DD, UTC).")
+    parser.add_argument('--end', help="Fecha de fin (AAAA-MM-DD, UTC).")
+    parser.add_argument('--balance', type=float, help="Saldo inicial en USDT.")
+    parser.add_argument('--speed', type=float, help="Factor de velocidad (por defecto, tan rápido como se pueda).")
+    parser.add_argument('--poll-seconds', type=int, default=3600, help="Sondeo de la posición abierta (segundos virtuales).")
+    parser.add_argument('--output-dir', default='replay_output')
+    parser.add_argument('--data-dir', default=DEFAULT_DATA_DIR)
+    parser.add_argument('--resample-base', help="Temporalidad base desde la que construir las demás (p. ej. 1h).")
+    parser.add_argument('--check-engine', action='store_true',
+                        help="Comprueba que main.py hace las mismas operaciones que engine.run_historical.")
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+
+    set_log_level(args.log_level)
+    to_epoch = lambda date: ccxt.Exchange.parse8601(f"{date}T00:00:00Z") / 1000 if date else None
+    try:
+        result = run_replay(start=to_epoch(args.start), end=to_epoch(args.end), initial_balance=args.balance,
+                            output_dir=args.output_dir, speed=args.speed, poll_seconds=args.poll_seconds,
+                            data_dir=args.data_dir, resample_base_timeframe=args.resample_base)
+    except FileExistsError as e:
+        sys.exit(f"Error: {e}")
+    print(f"\n--- Repetición completada: {result['virtual_days']:.0f} días en {result['real_seconds']:.1f}s "
+          f"(x{result['speedup']:,.0f}) ---")
+    print(f"Saldo inicial: ${result['initial_balance']:,.2f} | Equity final: ${result['equity']:,.2f}")
+    print(f"PnL realizado: ${result['realized_pnl']:,.2f} | Comisiones: ${result['fees']:,.2f}")
+    print(f"Ejecuciones: {result['fills']} ({result['stop_fills']} por stop-loss) | Posiciones abiertas: {result['open_positions']}")
+    if args.check_engine:
+        differences = compare_with_engine(result, data_dir=args.data_dir)
+        if differences:
+            print(f"Las operaciones de main.py NO coinciden con engine.run_historical ({len(differences)} diferencias):")
+            for difference in differences:
+                print(f"  - {difference}")
+            sys.exit(1)
+        print(f"Las {len(result['round_trips'])} operaciones cerradas de main.py coinciden con engine.run_historical.")
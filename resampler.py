@@ -0,0 +1,132 @@
+# trading_bot/resampler.py
+import numpy as np
+import pandas as pd
+from timeframes import timeframe_to_ms
+
+OHLCV_COLUMNS = ['timestamp', 'open', 'high', 'low', 'close', 'volume']
+# El 1970-01-01 fue jueves: las velas semanales del exchange empiezan el lunes (4 días después)
+WEEK_OFFSET_MS = 4 * 24 * 60 * 60 * 1000
+
+def bucket_start(timestamp, timeframe):
+    """
+    Apertura (ms) de la vela de `timeframe` que contiene `timestamp` (entero o array), con las
+    fronteras del exchange: múltiplos de la temporalidad desde 1970-01-01 UTC (las velas de 4h y
+    6h empiezan a las 00:00, 04:00... y las diarias a las 00:00 UTC) y las semanales en lunes.
+    """
+    offset = WEEK_OFFSET_MS if timeframe.endswith('w') else 0
+    return timestamp - (timestamp - offset) % timeframe_to_ms(timeframe)
+
+def can_resample(base_timeframe, timeframe):
+    """
+    True si las velas de `timeframe` se pueden construir exactamente con velas de `base_timeframe`.
+    """
+    base_ms, target_ms = timeframe_to_ms(base_timeframe), timeframe_to_ms(timeframe)
+    if target_ms <= base_ms or target_ms % base_ms:
+        return False
+    return not timeframe.endswith('w') or WEEK_OFFSET_MS % base_ms == 0
+
+def _check_timeframes(base_timeframe, timeframe):
+    if not can_resample(base_timeframe, timeframe):
+        raise ValueError(f"No se pueden construir velas de {timeframe} a partir de velas de {base_timeframe}.")
+
+def resample_ohlcv(df, timeframe, base_timeframe, include_partial=False):
+    """
+    Agrega un DataFrame de velas de `base_timeframe` (timestamp en ms y OHLCV, ordenado) a
+    `timeframe`: apertura de la primera vela base, máximo, mínimo, cierre de la última y
+    volumen total.
+
+    La primera vela se descarta si el histórico empieza a mitad de su periodo (le faltarían
+    datos) y la última si aún no está completa, salvo con include_partial=True (como la vela en
+    curso que devuelve el exchange).
+    """
+    _check_timeframes(base_timeframe, timeframe)
+    ts = df['timestamp'].to_numpy(dtype=np.int64)
+    if not len(ts):
+        out = pd.DataFrame({column: np.empty(0, dtype=np.int64 if column == 'timestamp' else float) for column in OHLCV_COLUMNS})
+        out['datetime'] = pd.to_datetime(out['timestamp'], unit='ms')
+        return out
+
+    buckets = bucket_start(ts, timeframe)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(ts)] - 1
+    out = pd.DataFrame({
+        'timestamp': buckets[starts],
+        'open': df['open'].to_numpy(dtype=float)[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(dtype=float), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(dtype=float), starts),
+        'close': df['close'].to_numpy(dtype=float)[ends],
+        'volume': np.add.reduceat(df['volume'].to_numpy(dtype=float), starts),
+    })
+
+    keep = np.ones(len(starts), dtype=bool)
+    keep[0] = ts[0] == buckets[0]
+    if not include_partial:
+        keep[-1] &= ts[-1] + timeframe_to_ms(base_timeframe) >= buckets[-1] + timeframe_to_ms(timeframe)
+    out = out[keep].reset_index(drop=True)
+    out['datetime'] = pd.to_datetime(out['timestamp'], unit='ms')
+    return out
+
+class Resampler:
+    """
+    Versión incremental de resample_ohlcv: update() recibe las velas base cerradas nuevas
+    (formato ccxt) y devuelve las velas de `timeframe` que se completan, en cuanto se cierra su
+    última vela base; partial() devuelve la vela en curso. Sobre el mismo histórico produce
+    exactamente las mismas velas que resample_ohlcv.
+    """
+    def __init__(self, base_timeframe, timeframe):
+        _check_timeframes(base_timeframe, timeframe)
+        self.base_timeframe = base_timeframe
+        self.timeframe = timeframe
+        self.base_ms = timeframe_to_ms(base_timeframe)
+        self.timeframe_ms = timeframe_to_ms(timeframe)
+        self.last_base_timestamp = None
+        self._candle = None # [timestamp, open, high, low, close, volume] de la vela en curso
+        self._complete = True
+
+    def update(self, ohlcv):
+        completed = []
+        for candle in ohlcv:
+            ts = int(candle[0])
+            if self.last_base_timestamp is not None and ts <= self.last_base_timestamp:
+                continue # Ya procesada
+            bucket = int(bucket_start(ts, self.timeframe))
+            if self._candle is not None and self._candle[0] != bucket:
+                self._emit(completed) # Hueco al final de la vela anterior: se cierra igualmente
+            if self._candle is None:
+                # Solo la primera vela del histórico puede empezar a mitad de su periodo
+                self._complete = ts == bucket or self.last_base_timestamp is not None
+                self._candle = [bucket, float(candle[1]), float(candle[2]), float(candle[3]), float(candle[4]), float(candle[5])]
+            else:
+                self._merge(self._candle, candle)
+            self.last_base_timestamp = ts
+            if ts + self.base_ms >= bucket + self.timeframe_ms:
+                self._emit(completed)
+        return completed
+
+    def partial(self, open_candle=None):
+        """
+        Vela en curso con las velas base cerradas de su periodo y, opcionalmente, la vela base
+        aún abierta `open_candle`. None si no hay ninguna.
+        """
+        candle = list(self._candle) if self._candle is not None else None
+        complete = self._complete
+        if open_candle is not None and (self.last_base_timestamp is None or open_candle[0] > self.last_base_timestamp):
+            bucket = int(bucket_start(int(open_candle[0]), self.timeframe))
+            if candle is not None and candle[0] == bucket:
+                self._merge(candle, open_candle)
+            else:
+                candle = [bucket] + [float(value) for value in open_candle[1:6]]
+                complete = int(open_candle[0]) == bucket or self.last_base_timestamp is not None
+        return candle if complete else None
+
+    @staticmethod
+    def _merge(candle, base_candle):
+        candle[2] = max(candle[2], float(base_candle[2]))
+        candle[3] = min(candle[3], float(base_candle[3]))
+        candle[4] = float(base_candle[4])
+        candle[5] += float(base_candle[5])
+
+    def _emit(self, completed):
+        if self._complete:
+            completed.append(self._candle)
+        self._candle = None
@@ -1,15 +1,43 @@
 # risk_manager.py
-import pandas_ta as ta
 from logger import log
 
 class RiskManager:
-    def __init__(self, default_risk_per_trade=0.01):
+    """
+    Dimensionamiento de posiciones por riesgo fijo con stop-loss a atr_stop_mult ATR. Es el mismo
+    objeto en el bot en vivo (main.py) y en los backtests del motor de eventos (engine.py).
+    """
+    def __init__(self, default_risk_per_trade=0.01, atr_stop_mult=2.0, verbose=True):
         self.default_risk_per_trade = default_risk_per_trade
-        log.info(f"RiskManager inicializado con un riesgo por operación de {self.default_risk_per_trade:.2%}.")
+        self.atr_stop_mult = atr_stop_mult
+        if verbose:
+            log.info(f"RiskManager inicializado con un riesgo por operación de {self.default_risk_per_trade:.2%}.")
+
+    @classmethod
+    def from_config(cls, config_obj, verbose=True):
+        params = config_obj.STRATEGY_CONFIG
+        return cls(default_risk_per_trade=params['risk_pct'], atr_stop_mult=params['atr_stop_mult'], verbose=verbose)
+
+    def position_details(self, price, balance, atr, side):
+        """
+        Tamaño (en monedas) y precio del stop-loss de una entrada 'long' o 'short'.
+        """
+        position_size, sl_long, sl_short = calculate_position_details(
+            price=price,
+            balance=balance,
+            risk_pct=self.default_risk_per_trade,
+            atr=atr,
+            atr_stop_mult=self.atr_stop_mult
+        )
+        return position_size, (sl_long if side == 'long' else sl_short)
 
-    def another_risk_function(self):
-        # Aquí podrían ir otras funciones de la clase
-        pass
+    def calculate_position_size(self, capital, entry_price, stop_loss_price):
+        """
+        Tamaño de la posición en USD para arriesgar default_risk_per_trade del capital hasta el stop.
+        """
+        risk_per_coin_usd = abs(entry_price - stop_loss_price)
+        if risk_per_coin_usd <= 0:
+            return 0
+        return capital * self.default_risk_per_trade / risk_per_coin_usd * entry_price
 
 # --- Esta es la función que añadimos ---
 # CORRECCIÓN: La función debe estar alineada a la izquierda, sin espacios antes de "def".
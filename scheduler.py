@@ -0,0 +1,107 @@
+# trading_bot/scheduler.py
+import time
+from logger import log
+from metrics import metrics
+from timeframes import timeframe_to_seconds
+
+class CandleScheduler:
+    """
+    Planificador alineado con el cierre de las velas de una temporalidad.
+
+    En lugar de dormir un intervalo fijo después de cada ciclo (lo que hace que el punto de
+    decisión se aleje del cierre de la vela), despierta en cada frontera de la temporalidad más
+    un pequeño retardo (settle_delay) para que el exchange publique la vela cerrada. La espera se
+    mide con el reloj monótono y se re-sincroniza con la hora del sistema si ésta se ajusta;
+    además detecta fronteras perdidas (ciclos que tardaron demasiado o el equipo suspendido).
+    Con una posición abierta despierta cada position_poll_interval segundos.
+    """
+    def __init__(self, timeframe='6h', settle_delay=30, position_poll_interval=300,
+                 max_sleep_chunk=60, max_drift=2.0,
+                 clock=time.time, monotonic=time.monotonic, sleep=time.sleep):
+        self.timeframe = timeframe
+        self.period = timeframe_to_seconds(timeframe)
+        self.settle_delay = settle_delay
+        self.position_poll_interval = position_poll_interval
+        self.max_sleep_chunk = max_sleep_chunk
+        self.max_drift = max_drift
+        self.clock = clock
+        self.monotonic = monotonic
+        self.sleep = sleep
+        self.last_boundary = None
+        self.missed_boundaries = 0
+        self._cycle_start = None
+
+    def _boundary_index(self, now):
+        return int((now - self.settle_delay) // self.period)
+
+    def next_wakeup(self, now=None):
+        """
+        Hora (epoch en segundos) del próximo cierre de vela más el retardo de asentamiento.
+        """
+        now = self.clock() if now is None else now
+        return (self._boundary_index(now) + 1) * self.period + self.settle_delay
+
+    def wait(self, in_position=False):
+        """
+        Bloquea hasta el próximo cierre de vela o, con una posición abierta, hasta el próximo
+        sondeo si llega antes.
+
+        :return: True si se alcanzó un nuevo cierre de vela, False si solo es un sondeo de la posición.
+        """
+        if self._cycle_start is not None:
+            # Duración del ciclo de trabajo (desde mark_cycle hasta que empieza la espera)
+            metrics.observe('cycle', self.monotonic() - self._cycle_start)
+            self._cycle_start = None
+        now = self.clock()
+        target = self.next_wakeup(now)
+        reached_boundary = True
+        if in_position and now + self.position_poll_interval < target:
+            target = now + self.position_poll_interval
+            reached_boundary = False
+        else:
+            log.info(f"Ciclo finalizado. Esperando al cierre de la vela de {self.timeframe} "
+                     f"({time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(target))} UTC)...")
+
+        self._sleep_until(target, show_countdown=reached_boundary)
+        if reached_boundary:
+            self._check_missed_boundaries()
+        return reached_boundary
+
+    def mark_cycle(self):
+        """
+        Registra que se ha ejecutado un ciclo para la vela actual (sirve de referencia
+        para detectar fronteras perdidas).
+        """
+        self.last_boundary = self._boundary_index(self.clock())
+        self._cycle_start = self.monotonic()
+
+    def _check_missed_boundaries(self):
+        current = self._boundary_index(self.clock())
+        if self.last_boundary is not None and current - self.last_boundary > 1:
+            missed = current - self.last_boundary - 1
+            self.missed_boundaries += missed
+            log.warning(f"Se perdieron {missed} cierres de vela de {self.timeframe} desde el último ciclo.")
+        self.last_boundary = current
+
+    def _sleep_until(self, target, show_countdown=True):
+        deadline = self.monotonic() + max(0.0, target - self.clock())
+        printed = False
+        while True:
+            remaining = deadline - self.monotonic()
+            wall_remaining = target - self.clock()
+            if abs(wall_remaining - remaining) > self.max_drift:
+                # La hora del sistema se ajustó (p. ej. NTP): las velas cierran en hora de pared
+                log.info(f"Corrigiendo deriva del reloj de {wall_remaining - remaining:+.1f}s.")
+                deadline = self.monotonic() + wall_remaining
+                remaining = wall_remaining
+            if remaining <= 0:
+                break
+            if show_countdown:
+                hours, remainder = divmod(int(remaining), 3600)
+                minutes, _ = divmod(remainder, 60)
+                # Usamos print() con '\r' para una línea que se actualiza sola en la consola
+                print(f"  Próximo ciclo de análisis en {hours}h {minutes}m...          \r", end="")
+                printed = True
+            self.sleep(min(remaining, self.max_sleep_chunk))
+        if printed:
+            print("\n") # Nueva línea para limpiar el contador
@@ -0,0 +1,149 @@
+# trading_bot/sentiment_cache.py
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from file_utils import replacement_mode
+from logger import log
+
+class SentimentCache:
+    """
+    Caché de veredictos de sentimiento indexada por el conjunto de titulares analizado.
+
+    La clave es una huella del conjunto normalizado de titulares (minúsculas, espacios
+    colapsados, sin duplicados y sin importar el orden), así que volver a consultar las mismas
+    noticias no repite la llamada al modelo. Cada veredicto caduca tras ttl_seconds, la memoria se
+    limita con un LRU de max_entries y, si se indica path, la caché se guarda en un archivo JSON
+    (escritura atómica) para sobrevivir a los reinicios. Como en StateManager, las escrituras se
+    agrupan: put() solo marca la caché como modificada y un temporizador la guarda pasados
+    coalesce_seconds (y al salir del proceso), así que la consulta de sentimiento no espera al disco.
+
+    Solo acierta con exactamente el mismo conjunto: un titular nuevo o uno que desaparece es otra
+    consulta, porque el veredicto es del conjunto completo y no se puede recomponer a partir de
+    veredictos por titular.
+    """
+    def __init__(self, ttl_seconds=3600, max_entries=512, path=None, clock=time.time, coalesce_seconds=5.0):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.path = path
+        self.clock = clock
+        self.coalesce_seconds = coalesce_seconds
+        self._entries = OrderedDict() # clave -> (sentimiento, hora de cálculo)
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock() # Una sola escritura a la vez (temporizador, flush manual y atexit)
+        self._dirty = False
+        self._flush_timer = None
+        self.hits = 0
+        self.misses = 0
+        self._load()
+        if self.path:
+            atexit.register(self.flush)
+
+    @staticmethod
+    def key_for(headlines):
+        """
+        Huella del conjunto normalizado de titulares.
+        """
+        normalized = sorted({" ".join(headline.lower().split()) for headline in headlines})
+        return hashlib.blake2b("\n".join(normalized).encode('utf-8'), digest_size=16).hexdigest()
+
+    def get(self, headlines):
+        """
+        Devuelve el sentimiento cacheado para estos titulares o None si no hay uno vigente.
+        """
+        key = self.key_for(headlines)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.clock() - entry[1] <= self.ttl_seconds:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, headlines, sentiment):
+        key = self.key_for(headlines)
+        with self._lock:
+            self._entries[key] = (sentiment, self.clock())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        self._persist()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+        self._persist()
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self._entries)}
+
+    def _load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, 'r') as f:
+                stored = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            log.warning(f"No se pudo leer la caché de sentimiento en '{self.path}': {e}")
+            return
+        now = self.clock()
+        # Se guardan en orden de uso, así que el LRU se reconstruye tal cual
+        for key, sentiment, computed_at in stored:
+            if now - computed_at <= self.ttl_seconds:
+                self._entries[key] = (sentiment, computed_at)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        log.info(f"Caché de sentimiento cargada desde '{self.path}' ({len(self._entries)} entradas vigentes).")
+
+    def flush(self):
+        """
+        Escribe en disco los cambios pendientes (lo llama el temporizador y también al salir del proceso).
+        """
+        with self._save_lock:
+            with self._lock:
+                if self._flush_timer is not None:
+                    self._flush_timer.cancel()
+                    self._flush_timer = None
+                if not self._dirty:
+                    return
+                self._dirty = False
+                # Se copia bajo el lock y se escribe fuera: get()/put() no esperan a la escritura
+                entries = [[key, sentiment, computed_at] for key, (sentiment, computed_at) in self._entries.items()]
+            self._save(entries)
+
+    def _persist(self):
+        if not self.path:
+            return
+        with self._lock:
+            self._dirty = True
+            if self.coalesce_seconds > 0:
+                if self._flush_timer is None:
+                    self._flush_timer = threading.Timer(self.coalesce_seconds, self.flush)
+                    self._flush_timer.daemon = True
+                    self._flush_timer.start()
+                return
+        self.flush()
+
+    def _save(self, entries):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.sentiment_', suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(entries, f)
+                os.chmod(tmp_path, replacement_mode(self.path))
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+        except Exception as e:
+            log.warning(f"No se pudo guardar la caché de sentimiento en '{self.path}': {e}")
@@ -1,14 +1,34 @@
+import atexit
 import json
 import os
+import tempfile
+import threading
+from file_utils import replacement_mode
 from logger import log
+from metrics import metrics
 
 class StateManager:
     """
-    Gestiona el estado de las operaciones abiertas guardándolo y leyéndolo
-    de un archivo JSON.
+    Gestiona el estado de las operaciones abiertas.
+
+    El estado autoritativo vive en memoria (se carga una sola vez al iniciar), así que las
+    consultas como is_in_position no tocan el disco. Cada cambio se persiste en el archivo JSON
+    con escritura atómica (archivo temporal + rename), de modo que un fallo a mitad de escritura
+    nunca deja el archivo corrupto. Con coalesce_seconds > 0 las escrituras de una ráfaga de
+    cambios se agrupan en una sola.
+
+    Si se le pasa un TradeLedger, cada apertura, cierre y cambio de stop queda además registrado
+    de forma permanente en el histórico SQLite.
     """
-    def __init__(self, state_file='state.json'):
+    def __init__(self, state_file='state.json', coalesce_seconds=0.0, ledger=None):
         self.state_file = state_file
+        self.coalesce_seconds = coalesce_seconds
+        self.ledger = ledger
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._flush_timer = None
+        self.state = self.load_state()
+        atexit.register(self.flush)
 
     def load_state(self):
         """
@@ -19,53 +39,110 @@ class StateManager:
             try:
                 with open(self.state_file, 'r') as f:
                     state = json.load(f)
-                    log.info(f"Estado cargado desde '{self.state_file}': {state}")
+                    log.info(f"Estado cargado desde '{self.state_file}' ({len(state)} posiciones).")
                     return state
             except json.JSONDecodeError:
                 log.warning("El archivo de estado está corrupto. Se creará uno nuevo.")
                 return {}
         return {}
 
-    def save_state(self, state):
+    def save_state(self, state=None):
+        """
+        Guarda el estado actual de las operaciones en el archivo JSON de forma atómica.
+        Si se pasa `state`, reemplaza antes el estado en memoria.
+        """
+        with self._lock:
+            if state is not None:
+                self.state = state
+            directory = os.path.dirname(os.path.abspath(self.state_file))
+            try:
+                with metrics.span('state_save'):
+                    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.state_', suffix='.tmp')
+                    try:
+                        with os.fdopen(fd, 'w') as f:
+                            json.dump(self.state, f, indent=4)
+                            f.flush()
+                            os.fsync(f.fileno())
+                        os.chmod(tmp_path, replacement_mode(self.state_file))
+                        os.replace(tmp_path, self.state_file)
+                    except BaseException:
+                        os.remove(tmp_path)
+                        raise
+                self._dirty = False
+                log.info(f"Estado guardado en '{self.state_file}' ({len(self.state)} posiciones).")
+            except Exception as e:
+                log.error(f"No se pudo guardar el estado en '{self.state_file}': {e}")
+
+    def flush(self):
         """
-        Guarda el estado actual de las operaciones en el archivo JSON.
+        Escribe en disco los cambios pendientes (útil con escrituras agrupadas y al apagar el bot).
         """
-        try:
-            with open(self.state_file, 'w') as f:
-                json.dump(state, f, indent=4)
-                log.info(f"Estado guardado en '{self.state_file}': {state}")
-        except Exception as e:
-            log.error(f"No se pudo guardar el estado en '{self.state_file}': {e}")
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if self._dirty:
+                self.save_state()
+
+    def _persist(self):
+        with self._lock:
+            self._dirty = True
+            if self.coalesce_seconds <= 0:
+                self.save_state()
+            elif self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.coalesce_seconds, self.flush)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
 
     # --- FUNCIÓN NUEVA Y CORREGIDA ---
     def is_in_position(self, symbol):
         """
         Verifica si hay una posición abierta para un símbolo específico.
         """
-        active_trades = self.load_state()
         # Devuelve True si el símbolo está en las operaciones y su estado es 'open'
-        return symbol in active_trades and active_trades[symbol].get('status') == 'open'
+        position = self.state.get(symbol)
+        return position is not None and position.get('status') == 'open'
 
-    def enter_position(self, symbol, side, size, entry_price, stop_loss_price):
+    def enter_position(self, symbol, side, size, entry_price, stop_loss_price, order_details=None):
         """
         Registra una nueva posición abierta en el estado.
+        `order_details` guarda los ids de las órdenes del exchange (entrada y stop-loss).
+        """
+        with self._lock:
+            self.state[symbol] = {
+                "side": side,
+                "size": size,
+                "entry_price": entry_price,
+                "stop_loss_price": stop_loss_price,
+                "status": "open"
+            }
+            if order_details:
+                self.state[symbol]["order_details"] = order_details
+            self._persist()
+            if self.ledger:
+                self.ledger.open_position(symbol, side, size, entry_price, stop_loss_price)
+
+    def update_stop_loss(self, symbol, stop_loss_price):
+        """
+        Actualiza el stop-loss de una posición abierta (p. ej. trailing stop o break-even).
         """
-        state = self.load_state()
-        state[symbol] = {
-            "side": side,
-            "size": size,
-            "entry_price": entry_price,
-            "stop_loss_price": stop_loss_price,
-            "status": "open"
-        }
-        self.save_state(state)
+        with self._lock:
+            if symbol not in self.state:
+                return
+            self.state[symbol]['stop_loss_price'] = stop_loss_price
+            self._persist()
+            if self.ledger:
+                self.ledger.record_stop_change(symbol, stop_loss_price)
 
-    def exit_position(self, symbol):
+    def exit_position(self, symbol, exit_price=None):
         """
-        Elimina una posición del estado (cuando se cierra).
+        Elimina una posición del estado (cuando se cierra). El cierre, con su PnL si se
+        indica el precio de salida, queda guardado en el registro de operaciones.
         """
-        state = self.load_state()
-        if symbol in state:
-            del state[symbol]
-            self.save_state(state)
-            log.info(f"Posición para {symbol} eliminada del estado.")
\ No newline at end of file
+        with self._lock:
+            if symbol in self.state:
+                del self.state[symbol]
+                self._persist()
+                if self.ledger:
+                    self.ledger.close_position(symbol, exit_price=exit_price)
+                log.info(f"Posición para {symbol} eliminada del estado.")
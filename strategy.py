@@ -1,9 +1,16 @@
+import time
 import pandas as pd
-import pandas_ta as ta
 import numpy as np
 from logger import log # Importar el logger para el warning
+from engine import candle_events
+from indicator_cache import indicator_cache
+from streaming_indicators import BreakoutIndicators
+from timeframes import timeframe_to_ms
+from metrics import metrics
 
+@metrics.timed('strategy_batch')
 def check_strategy_6h_breakout(sol_df, btc_6h_df, btc_1d_df, config_obj):
+    import pandas_ta as ta # Solo el cálculo por lotes lo necesita; el bot en vivo usa BreakoutSignalEngine
     params = config_obj.STRATEGY_CONFIG
     
     sol_df['datetime'] = pd.to_datetime(sol_df['datetime'])
@@ -27,29 +34,47 @@ def check_strategy_6h_breakout(sol_df, btc_6h_df, btc_1d_df, config_obj):
         direction='backward'
     )
     
-    df.ta.ema(length=params['ema_fast_len'], append=True, col_names=('EMA_fast'))
-    df.ta.ema(length=params['ema_slow_len'], append=True, col_names=('EMA_slow'))
-    df.ta.adx(length=params['adx_len'], append=True, col_names=('ADX', 'DMP', 'DMN'))
+    _add_breakout_indicators(df, params, ta)
+
+    latest = df.iloc[-1]
+    previous = df.iloc[-2]
+
+    return _evaluate_breakout(latest, previous, params)
+
+def _add_breakout_indicators(df, params, ta):
+    """
+    Añade a `df` (velas de SOL con close_btc_6h y close_btc_1d) las columnas de indicadores de la
+    regla de breakout, calculadas por lotes con pandas_ta.
+    """
+    df['EMA_fast'] = indicator_cache.compute(ta.ema, close=df['close'], length=params['ema_fast_len'])
+    df['EMA_slow'] = indicator_cache.compute(ta.ema, close=df['close'], length=params['ema_slow_len'])
+    adx = indicator_cache.compute(ta.adx, high=df['high'], low=df['low'], close=df['close'], length=params['adx_len'])
+    df['ADX'] = adx[f'ADX_{params["adx_len"]}']
+    df['DMP'] = adx[f'DMP_{params["adx_len"]}']
+    df['DMN'] = adx[f'DMN_{params["adx_len"]}']
     
-    donchian = ta.donchian(high=df['high'], low=df['low'], length=params['don_len'])
+    donchian = indicator_cache.compute(ta.donchian, high=df['high'], low=df['low'], length=params['don_len'])
     df['DON_upper'] = donchian[f'DCU_{params["don_len"]}_{params["don_len"]}']
     df['DON_lower'] = donchian[f'DCL_{params["don_len"]}_{params["don_len"]}']
     
-    keltner = ta.kc(high=df['high'], low=df['low'], close=df['close'], length=params['kc_len'], scalar=params['kc_mult'])
+    keltner = indicator_cache.compute(ta.kc, high=df['high'], low=df['low'], close=df['close'], length=params['kc_len'], scalar=params['kc_mult'])
     df['KC_upper'] = keltner[f'KCUe_{params["kc_len"]}_{params["kc_mult"]}']
     df['KC_lower'] = keltner[f'KCLe_{params["kc_len"]}_{params["kc_mult"]}']
     
-    df['btc_EMA_slow_6h'] = ta.ema(df['close_btc_6h'], length=params['ema_slow_len'])
-    df['btc_EMA_slow_1d'] = ta.ema(df['close_btc_1d'], length=200)
-
-    latest = df.iloc[-1]
-    previous = df.iloc[-2]
+    df['btc_EMA_slow_6h'] = indicator_cache.compute(ta.ema, close=df['close_btc_6h'], length=params['ema_slow_len'])
+    df['btc_EMA_slow_1d'] = indicator_cache.compute(ta.ema, close=df['close_btc_1d'], length=200)
 
+def _evaluate_breakout(latest, previous, params, warn=True):
+    """
+    Regla de entrada Breakout 6H sobre la última vela y la anterior (Series o diccionarios
+    con las columnas de indicadores). Compartida por el cálculo por lotes y el incremental.
+    """
     required_cols = ['close_btc_6h', 'btc_EMA_slow_6h', 'close_btc_1d', 'btc_EMA_slow_1d', 'EMA_slow', 'EMA_fast', 'ADX', 'DON_upper', 'DON_lower', 'KC_upper', 'KC_lower']
     
     # --- CORRECCIÓN: Usar pd.isna() en lugar de np.isnan() ---
     if any(pd.isna(latest[col]) for col in required_cols):
-        log.warning("Datos insuficientes para calcular todos los indicadores. Omitiendo ciclo.")
+        if warn:
+            log.warning("Datos insuficientes para calcular todos los indicadores. Omitiendo ciclo.")
         return None
 
     btc_up = (latest['close_btc_6h'] > latest['btc_EMA_slow_6h']) and (latest['close_btc_1d'] > latest['btc_EMA_slow_1d'])
@@ -69,4 +94,184 @@ def check_strategy_6h_breakout(sol_df, btc_6h_df, btc_1d_df, config_obj):
     if short_break and btc_down:
         return 'short'
         
-    return None
\ No newline at end of file
+    return None
+
+def breakout_signals(sol_df, btc_6h_df, btc_1d_df, params, timeframe='6h'):
+    """
+    Indicadores y señal de todas las velas de SOL en un solo cálculo por lotes, con la misma
+    alineación que Strategy: solo las velas con vela de BTC de la misma apertura y, como cierre
+    diario, el de la última vela diaria de BTC ya cerrada al cierre de la vela de SOL.
+
+    :return: DataFrame con timestamp, close_time, OHLC, columnas de indicadores, 'ATR' y 'signal'
+             (1 = 'long', -1 = 'short', 0 = sin señal).
+    """
+    import pandas_ta as ta
+    timeframe_ms = timeframe_to_ms(timeframe)
+    df = sol_df[['timestamp', 'open', 'high', 'low', 'close']].merge(
+        btc_6h_df[['timestamp', 'close']].rename(columns={'close': 'close_btc_6h'}), on='timestamp', how='inner'
+    ).sort_values('timestamp', ignore_index=True)
+    df['close_time'] = df['timestamp'] + timeframe_ms
+    daily = pd.DataFrame({
+        'daily_close_time': btc_1d_df['timestamp'].to_numpy(dtype=np.int64) + timeframe_to_ms('1d'),
+        'close_btc_1d': btc_1d_df['close'].to_numpy(dtype=float),
+    }).sort_values('daily_close_time')
+    df = pd.merge_asof(df, daily, left_on='close_time', right_on='daily_close_time', direction='backward')
+
+    _add_breakout_indicators(df, params, ta)
+    df['ATR'] = indicator_cache.compute(ta.atr, high=df['high'], low=df['low'], close=df['close'], length=14)
+    df['signal'] = _breakout_signal_codes(df, params)
+    return df
+
+def _breakout_signal_codes(df, params):
+    """
+    Versión por columnas de _evaluate_breakout: la señal de cada vela frente a la anterior.
+    """
+    required_cols = ['close_btc_6h', 'btc_EMA_slow_6h', 'close_btc_1d', 'btc_EMA_slow_1d', 'EMA_slow', 'EMA_fast', 'ADX', 'DON_upper', 'DON_lower', 'KC_upper', 'KC_lower']
+    valid = df[required_cols].notna().all(axis=1).to_numpy()
+    previous = df[['DON_upper', 'DON_lower', 'KC_lower']].shift(1)
+
+    btc_up = (df['close_btc_6h'] > df['btc_EMA_slow_6h']) & (df['close_btc_1d'] > df['btc_EMA_slow_1d'])
+    btc_down = (df['close_btc_6h'] < df['btc_EMA_slow_6h']) & (df['close_btc_1d'] < df['btc_EMA_slow_1d'])
+    up_trend = (df['close'] > df['EMA_slow']) & (df['EMA_fast'] > df['EMA_slow'])
+    down_trend = (df['close'] < df['EMA_slow']) & (df['EMA_fast'] < df['EMA_slow'])
+    anti_chop = df['ADX'] >= params['adx_min']
+
+    long_break = up_trend & anti_chop & (df['close'] > previous['DON_upper']) & (df['close'] > df['KC_upper'])
+    short_break = down_trend & anti_chop & (df['close'] < previous['DON_lower']) & (df['close'] < previous['KC_lower'])
+    codes = np.where((long_break & btc_up).to_numpy(), 1, np.where((short_break & btc_down).to_numpy(), -1, 0))
+    return np.where(valid, codes, 0).astype(np.int8)
+
+class Strategy:
+    """
+    Estrategia Breakout 6H orientada a eventos. Recibe velas cerradas (engine.CandleEvent) de su
+    símbolo y del contexto de BTC (6h y 1d), actualiza los indicadores de forma incremental y
+    evalúa la regla de entrada al cierre de cada vela del símbolo. Es el mismo objeto en vivo
+    (a través de BreakoutSignalEngine) y en los backtests de engine.py.
+
+    El cierre diario de BTC es el de la última vela diaria cerrada en el momento de la señal,
+    así que en el histórico no se usa el cierre de un día que aún no ha terminado.
+    """
+    def __init__(self, params=None, symbol='SOL/USDT', timeframe='6h', context_symbol='BTC/USDT', verbose=True, **overrides):
+        if params is None:
+            from config import config
+            params = config.STRATEGY_CONFIG
+        self.params = {**params, **overrides}
+        self.symbol = symbol
+        self.timeframe = timeframe
+        self.context_symbol = context_symbol
+        self.verbose = verbose
+        # Orden de entrega con el mismo cierre de vela: primero el contexto y al final la serie que dispara la señal
+        self.subscriptions = [(context_symbol, timeframe), (context_symbol, '1d'), (symbol, timeframe)]
+        self.reset()
+
+    # Periodos de las EMAs de tendencia (nombres que usa ml_training/prepare_ai_data_v2.py)
+    @property
+    def btc_ema_fast_period(self):
+        return self.params['ema_fast_len']
+
+    @property
+    def btc_ema_slow_period(self):
+        return self.params['ema_slow_len']
+
+    def reset(self):
+        self.indicators = BreakoutIndicators(self.params)
+        self.last_timestamp = None
+        self.latest = None
+        self.previous = None
+        self.signal = None
+        self._btc_6h_timestamp = None
+        self._btc_6h_close = np.nan
+        self._btc_1d_close = np.nan
+
+    def on_candle(self, event):
+        """
+        Procesa una vela cerrada. Devuelve True si era una vela del símbolo operado (y se ha
+        evaluado la señal, disponible en self.signal) y False en cualquier otro caso.
+        """
+        if event.symbol == self.context_symbol:
+            if event.timeframe == self.timeframe:
+                self._btc_6h_timestamp, self._btc_6h_close = event.timestamp, event.close
+            elif event.timeframe == '1d':
+                self._btc_1d_close = event.close
+            return False
+        if event.symbol != self.symbol or event.timeframe != self.timeframe:
+            return False
+        if event.timestamp != self._btc_6h_timestamp:
+            return False # Igual que el join 'inner' con BTC 6h
+
+        self.previous = self.latest
+        self.latest = self.indicators.update(event.high, event.low, event.close, self._btc_6h_close, self._btc_1d_close)
+        self.last_timestamp = event.timestamp
+        self.signal = None if self.previous is None else _evaluate_breakout(self.latest, self.previous, self.params, warn=False)
+        return True
+
+    def check_signal(self):
+        """
+        Evalúa la regla de breakout con el estado actual de los indicadores.
+        """
+        if self.latest is None or self.previous is None:
+            if self.verbose:
+                log.warning("El motor de señales aún no tiene suficientes velas procesadas.")
+            return None
+        return _evaluate_breakout(self.latest, self.previous, self.params, warn=self.verbose)
+
+class BreakoutSignalEngine:
+    """
+    Alimenta una Strategy con las velas que el bot en vivo descarga en cada ciclo.
+
+    En la primera llamada a update() se siembra el estado de los indicadores con todo el
+    histórico recibido; en las siguientes solo se procesan las velas cerradas posteriores a la
+    última procesada de cada serie (O(1) por vela), sin reconstruir los DataFrames ni recalcular pandas_ta.
+    """
+    def __init__(self, config_obj, timeframe='6h', strategy=None):
+        self.strategy = strategy if strategy is not None else Strategy(config_obj.STRATEGY_CONFIG, timeframe=timeframe)
+        self.params = self.strategy.params
+        self.timeframe_ms = timeframe_to_ms(self.strategy.timeframe)
+        self.reset()
+
+    def reset(self):
+        self.strategy.reset()
+        self._last_timestamps = {}
+
+    @property
+    def latest(self):
+        return self.strategy.latest
+
+    @property
+    def previous(self):
+        return self.strategy.previous
+
+    @property
+    def last_timestamp(self):
+        return self.strategy.last_timestamp
+
+    @property
+    def last_close_ms(self):
+        """
+        Cierre (ms) de la última vela de SOL procesada, o None si aún no hay ninguna.
+        """
+        return None if self.last_timestamp is None else self.last_timestamp + self.timeframe_ms
+
+    @metrics.timed('strategy_engine_update')
+    def update(self, sol_df, btc_6h_df, btc_1d_df, now_ms=None):
+        """
+        Entrega a la estrategia, en orden de cierre, las velas cerradas nuevas de SOL y de BTC (6h y 1d).
+
+        :return: Número de velas nuevas de SOL procesadas.
+        """
+        now_ms = now_ms if now_ms is not None else int(time.time() * 1000)
+        if self.last_timestamp is not None and len(sol_df) and sol_df['timestamp'].iloc[0] > self.last_timestamp + self.timeframe_ms:
+            log.warning("Hueco en el histórico desde la última vela procesada. Re-sembrando los indicadores.")
+            self.reset()
+
+        symbol, context, timeframe = self.strategy.symbol, self.strategy.context_symbol, self.strategy.timeframe
+        data = {(context, timeframe): btc_6h_df, (context, '1d'): btc_1d_df, (symbol, timeframe): sol_df}
+        frames = {key: data[key] for key in self.strategy.subscriptions}
+        processed = 0
+        for event in candle_events(frames, now_ms=now_ms, after=self._last_timestamps):
+            self._last_timestamps[(event.symbol, event.timeframe)] = event.timestamp
+            processed += self.strategy.on_candle(event)
+        return processed
+
+    def check_signal(self):
+        return self.strategy.check_signal()
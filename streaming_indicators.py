@@ -0,0 +1,238 @@
+# trading_bot/streaming_indicators.py
+import math
+import sys
+from collections import deque
+
+NAN = float('nan')
+_EPSILON = sys.float_info.epsilon
+
+def _divide(numerator, denominator):
+    """
+    División con la semántica de NumPy/pandas (x/0 = ±inf, 0/0 = NaN) en lugar de lanzar excepción.
+    """
+    if denominator == 0:
+        if numerator == 0 or math.isnan(numerator):
+            return NAN
+        return math.copysign(math.inf, numerator)
+    return numerator / denominator
+
+class EWM:
+    """
+    Media móvil exponencial incremental que replica paso a paso el cálculo de
+    pandas.Series.ewm(alpha=..., adjust=..., min_periods=...).mean().
+    """
+    def __init__(self, alpha, adjust, min_periods=0):
+        self.old_wt_factor = 1.0 - alpha
+        self.new_wt = 1.0 if adjust else alpha
+        self.adjust = adjust
+        self.min_periods = max(min_periods, 1)
+        self.weighted = NAN
+        self.old_wt = 1.0
+        self.nobs = 0
+        self.value = NAN
+
+    def update(self, x):
+        is_observation = x == x
+        self.nobs += is_observation
+        if self.weighted == self.weighted:
+            self.old_wt *= self.old_wt_factor
+            if is_observation:
+                if self.weighted != x:
+                    self.weighted = (self.old_wt * self.weighted + self.new_wt * x) / (self.old_wt + self.new_wt)
+                self.old_wt = self.old_wt + self.new_wt if self.adjust else 1.0
+        elif is_observation:
+            self.weighted = x
+        self.value = self.weighted if self.nobs >= self.min_periods else NAN
+        return self.value
+
+class EMA:
+    """
+    EMA de pandas_ta (semilla con la media simple de las primeras `length` velas).
+    """
+    def __init__(self, length):
+        self.length = length
+        self.count = 0
+        self.seed_sum = 0.0
+        self.ewm = EWM(alpha=2.0 / (length + 1), adjust=False)
+        self.value = NAN
+
+    def update(self, x):
+        self.count += 1
+        if self.count < self.length:
+            # pandas_ta suma ignorando NaN pero divide siempre entre `length`
+            if x == x:
+                self.seed_sum += x
+            self.value = self.ewm.update(NAN)
+        elif self.count == self.length:
+            if x == x:
+                self.seed_sum += x
+            self.value = self.ewm.update(self.seed_sum / self.length)
+        else:
+            self.value = self.ewm.update(x)
+        return self.value
+
+class RMA:
+    """
+    Media móvil de Wilder de pandas_ta: ewm(alpha=1/length, min_periods=length).
+    """
+    def __init__(self, length):
+        self.ewm = EWM(alpha=1.0 / length, adjust=True, min_periods=length)
+        self.value = NAN
+
+    def update(self, x):
+        self.value = self.ewm.update(x)
+        return self.value
+
+class TrueRange:
+    def __init__(self):
+        self.prev_close = None
+        self.value = NAN
+
+    def update(self, high, low, close):
+        if self.prev_close is None:
+            self.value = NAN
+        else:
+            self.value = max(abs(high - low), abs(high - self.prev_close), abs(self.prev_close - low))
+        self.prev_close = close
+        return self.value
+
+class ATR:
+    """
+    ATR de pandas_ta (mamode 'rma', columna ATRr_<length>).
+    """
+    def __init__(self, length=14):
+        self.true_range = TrueRange()
+        self.rma = RMA(length)
+        self.value = NAN
+
+    def update(self, high, low, close):
+        self.value = self.rma.update(self.true_range.update(high, low, close))
+        return self.value
+
+class ADX:
+    """
+    ADX/DMI de Wilder tal como lo calcula pandas_ta.adx (ADX_<n>, DMP_<n>, DMN_<n>).
+    """
+    def __init__(self, length=14):
+        self.atr = ATR(length)
+        self.pos_rma = RMA(length)
+        self.neg_rma = RMA(length)
+        self.dx_rma = RMA(length)
+        self.prev_high = None
+        self.prev_low = None
+        self.adx = self.dmp = self.dmn = NAN
+
+    def update(self, high, low, close):
+        atr = self.atr.update(high, low, close)
+        if self.prev_high is None:
+            pos = neg = NAN
+        else:
+            up = high - self.prev_high
+            dn = self.prev_low - low
+            pos = up if (up > dn and up > 0) else 0.0
+            neg = dn if (dn > up and dn > 0) else 0.0
+            pos = 0.0 if abs(pos) < _EPSILON else pos
+            neg = 0.0 if abs(neg) < _EPSILON else neg
+        self.prev_high, self.prev_low = high, low
+
+        k = _divide(100.0, atr)
+        self.dmp = k * self.pos_rma.update(pos)
+        self.dmn = k * self.neg_rma.update(neg)
+        dx = _divide(100.0 * abs(self.dmp - self.dmn), self.dmp + self.dmn)
+        self.adx = self.dx_rma.update(dx)
+        return self.adx, self.dmp, self.dmn
+
+class KeltnerChannel:
+    """
+    Canal de Keltner de pandas_ta.kc (EMA del cierre ± scalar * EMA del true range).
+    """
+    def __init__(self, length=20, scalar=2.0):
+        self.scalar = scalar
+        self.true_range = TrueRange()
+        self.basis = EMA(length)
+        self.band = EMA(length)
+        self.upper = self.lower = NAN
+
+    def update(self, high, low, close):
+        basis = self.basis.update(close)
+        band = self.band.update(self.true_range.update(high, low, close))
+        self.upper = basis + self.scalar * band
+        self.lower = basis - self.scalar * band
+        return self.upper, self.lower
+
+class RollingExtreme:
+    """
+    Máximo o mínimo de una ventana deslizante en O(1) amortizado (deque monótona).
+    """
+    def __init__(self, length, mode='max'):
+        self.length = length
+        self.is_max = mode == 'max'
+        self.window = deque()
+        self.count = 0
+        self.value = NAN
+
+    def update(self, x):
+        index = self.count
+        self.count += 1
+        while self.window and (self.window[-1][1] <= x if self.is_max else self.window[-1][1] >= x):
+            self.window.pop()
+        self.window.append((index, x))
+        if self.window[0][0] <= index - self.length:
+            self.window.popleft()
+        self.value = self.window[0][1] if self.count >= self.length else NAN
+        return self.value
+
+class DonchianChannel:
+    def __init__(self, length=20):
+        self.highest = RollingExtreme(length, 'max')
+        self.lowest = RollingExtreme(length, 'min')
+        self.upper = self.lower = NAN
+
+    def update(self, high, low):
+        self.upper = self.highest.update(high)
+        self.lower = self.lowest.update(low)
+        return self.upper, self.lower
+
+class BreakoutIndicators:
+    """
+    Estado incremental de todos los indicadores de la estrategia Breakout 6H.
+
+    Cada llamada a update() procesa una vela cerrada de SOL junto con el cierre de BTC 6h de la
+    misma vela y el último cierre diario de BTC disponible, y devuelve un diccionario con las mismas
+    columnas que calcula strategy.check_strategy_6h_breakout. Los valores coinciden con el cálculo
+    por lotes de pandas_ta sobre la misma serie, empezando en la primera vela procesada.
+    """
+    def __init__(self, params):
+        self.kc_mult = params['kc_mult']
+        self.ema_fast = EMA(params['ema_fast_len'])
+        self.ema_slow = EMA(params['ema_slow_len'])
+        self.adx = ADX(params['adx_len'])
+        self.atr = ATR(14)
+        self.donchian = DonchianChannel(params['don_len'])
+        self.keltner = KeltnerChannel(params['kc_len'], params['kc_mult'])
+        self.btc_ema_slow_6h = EMA(params['ema_slow_len'])
+        self.btc_ema_slow_1d = EMA(200)
+
+    def update(self, high, low, close, close_btc_6h, close_btc_1d):
+        adx, dmp, dmn = self.adx.update(high, low, close)
+        don_upper, don_lower = self.donchian.update(high, low)
+        kc_upper, kc_lower = self.keltner.update(high, low, close)
+        return {
+            'high': high,
+            'low': low,
+            'close': close,
+            'EMA_fast': self.ema_fast.update(close),
+            'EMA_slow': self.ema_slow.update(close),
+            'ADX': adx,
+            'DMP': dmp,
+            'DMN': dmn,
+            'ATR': self.atr.update(high, low, close),
+            'DON_upper': don_upper,
+            'DON_lower': don_lower,
+            'KC_upper': kc_upper,
+            'KC_lower': kc_lower,
+            'close_btc_6h': close_btc_6h,
+            'btc_EMA_slow_6h': self.btc_ema_slow_6h.update(close_btc_6h),
+            'close_btc_1d': close_btc_1d,
+            'btc_EMA_slow_1d': self.btc_ema_slow_1d.update(close_btc_1d),
+        }
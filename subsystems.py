@@ -0,0 +1,144 @@
+# trading_bot/subsystems.py
+import contextlib
+import threading
+import time
+from config import config
+from logger import log
+
+class SubsystemRegistry:
+    """
+    Registro de los subsistemas del bot (cliente del exchange, notificador, ejecución, análisis...)
+    con inicialización perezosa.
+
+    Cada subsistema se declara con una función fábrica que importa su módulo y construye la
+    instancia; nada se importa ni se construye hasta que alguien lo usa por primera vez, así que
+    el arranque solo paga por lo que realmente necesita. Se mide cuánto tarda cada subsistema en
+    estar listo (importación + construcción) para poder revisarlo con report().
+    """
+    def __init__(self):
+        self._factories = {}
+        self._instances = {}
+        self._lock = threading.RLock()
+        self.startup_times = {}
+
+    def register(self, name, factory):
+        self._factories[name] = factory
+
+    def get(self, name):
+        """
+        Devuelve la instancia del subsistema, creándola la primera vez.
+        """
+        instance = self._instances.get(name)
+        if instance is not None:
+            return instance
+        with self._lock:
+            if name not in self._instances:
+                start_time = time.perf_counter()
+                self._instances[name] = self._factories[name]()
+                self.startup_times[name] = time.perf_counter() - start_time
+                log.info(f"Subsistema '{name}' listo en {self.startup_times[name]:.2f}s.")
+            return self._instances[name]
+
+    def lazy(self, name):
+        """
+        Referencia al subsistema que solo lo crea cuando se accede a uno de sus atributos.
+        """
+        return LazySubsystem(self, name)
+
+    @contextlib.contextmanager
+    def isolated(self, **factories):
+        """
+        Bloque con el registro aislado (p. ej. una repetición dentro del mismo proceso): las
+        fábricas indicadas sustituyen a las registradas y todos los subsistemas se vuelven a crear
+        dentro del bloque. Al salir se restauran las fábricas y las instancias anteriores y se
+        descartan las creadas dentro.
+        """
+        with self._lock:
+            saved = dict(self._factories), dict(self._instances), dict(self.startup_times)
+            self._instances.clear()
+            self.startup_times.clear()
+            self._factories.update(factories)
+        try:
+            yield self
+        finally:
+            with self._lock:
+                self._factories, self._instances, self.startup_times = saved
+
+    def is_loaded(self, name):
+        return name in self._instances
+
+    def report(self):
+        """
+        Registra en el log el tiempo de arranque de cada subsistema ya inicializado.
+        (Los tiempos incluyen los subsistemas de los que depende, si se crearon en ese momento).
+        """
+        if not self.startup_times:
+            return
+        details = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.startup_times.items())
+        log.info(f"Tiempos de arranque por subsistema: {details}")
+
+class LazySubsystem:
+    """
+    Sustituto de una instancia global: delega todos los atributos en el subsistema real.
+    """
+    __slots__ = ('_registry', '_name')
+
+    def __init__(self, registry, name):
+        object.__setattr__(self, '_registry', registry)
+        object.__setattr__(self, '_name', name)
+
+    def __getattr__(self, attribute):
+        return getattr(self._registry.get(self._name), attribute)
+
+    def __setattr__(self, attribute, value):
+        setattr(self._registry.get(self._name), attribute, value)
+
+    def __repr__(self):
+        state = 'cargado' if self._registry.is_loaded(self._name) else 'pendiente'
+        return f"<LazySubsystem '{self._name}' ({state})>"
+
+# --- Fábricas: las importaciones se hacen dentro para diferirlas hasta el primer uso ---
+def _create_clock():
+    from clock import SystemClock
+    return SystemClock()
+
+def _create_candle_cache():
+    # Una sola caché para APIClient y AsyncCycleRuntime: no se descargan ni persisten dos veces las mismas velas
+    from candle_cache import CandleCache
+    return CandleCache(persist_dir=config.CANDLE_CACHE_DIR, base_timeframe=config.RESAMPLE_BASE_TIMEFRAME,
+                       clock=subsystems.get('clock').time)
+
+def _create_api_client():
+    from api_client import APIClient
+    return APIClient()
+
+def _create_notifier():
+    from notifier import Notifier
+    return Notifier()
+
+def _create_execution_handler():
+    from execution_handler import ExecutionHandler
+    return ExecutionHandler(config.BOT_MODE)
+
+def _create_intelligence_analyzer():
+    from intelligence_analyzer import IntelligenceAnalyzer
+    return IntelligenceAnalyzer()
+
+def _create_portfolio_analyzer():
+    from portfolio_analyzer import PortfolioAnalyzer
+    return PortfolioAnalyzer()
+
+def _create_cycle_runtime():
+    from async_runtime import AsyncCycleRuntime
+    return AsyncCycleRuntime(sentiment_analyzer=subsystems.lazy('intelligence_analyzer'))
+
+# Crear una instancia global con todos los subsistemas del bot
+subsystems = SubsystemRegistry()
+subsystems.register('clock', _create_clock)
+subsystems.register('candle_cache', _create_candle_cache)
+subsystems.register('api_client', _create_api_client)
+subsystems.register('notifier', _create_notifier)
+subsystems.register('execution_handler', _create_execution_handler)
+subsystems.register('intelligence_analyzer', _create_intelligence_analyzer)
+subsystems.register('portfolio_analyzer', _create_portfolio_analyzer)
+subsystems.register('cycle_runtime', _create_cycle_runtime)
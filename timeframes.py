@@ -0,0 +1,21 @@
+# trading_bot/timeframes.py
+
+_UNIT_MS = {
+    'm': 60 * 1000,
+    'h': 60 * 60 * 1000,
+    'd': 24 * 60 * 60 * 1000,
+    'w': 7 * 24 * 60 * 60 * 1000,
+}
+
+def timeframe_to_ms(timeframe):
+    """
+    Convierte una temporalidad de ccxt ('15m', '1h', '6h', '1d', '1w') a milisegundos.
+    """
+    try:
+        amount, unit = int(timeframe[:-1]), timeframe[-1]
+        return amount * _UNIT_MS[unit]
+    except (ValueError, KeyError, IndexError):
+        raise ValueError(f"Temporalidad no soportada: '{timeframe}'")
+
+def timeframe_to_seconds(timeframe):
+    return timeframe_to_ms(timeframe) / 1000
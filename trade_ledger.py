@@ -0,0 +1,198 @@
+# trading_bot/trade_ledger.py
+import atexit
+import sqlite3
+import threading
+import time
+from logger import log
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS positions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    size REAL NOT NULL,
+    entry_price REAL NOT NULL,
+    stop_loss_price REAL,
+    status TEXT NOT NULL,
+    opened_at INTEGER NOT NULL,
+    closed_at INTEGER,
+    exit_price REAL,
+    pnl REAL
+);
+CREATE INDEX IF NOT EXISTS idx_positions_symbol_status ON positions (symbol, status);
+CREATE INDEX IF NOT EXISTS idx_positions_closed_at ON positions (closed_at);
+
+CREATE TABLE IF NOT EXISTS orders (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    position_id INTEGER REFERENCES positions (id),
+    symbol TEXT NOT NULL,
+    side TEXT NOT NULL,
+    order_type TEXT NOT NULL,
+    amount REAL,
+    price REAL,
+    exchange_order_id TEXT,
+    created_at INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_orders_symbol_created_at ON orders (symbol, created_at);
+CREATE INDEX IF NOT EXISTS idx_orders_position_id ON orders (position_id);
+
+CREATE TABLE IF NOT EXISTS equity_snapshots (
+    ts INTEGER PRIMARY KEY,
+    equity REAL NOT NULL
+);
+"""
+
+class TradeLedger:
+    """
+    Registro histórico de operaciones en SQLite embebido (modo WAL).
+
+    Guarda posiciones (abiertas y cerradas, con su PnL), órdenes (entradas, salidas y cambios
+    de stop) e instantáneas de equity en tablas indexadas. Las órdenes y las instantáneas se
+    insertan por lotes (batch_size) y las aperturas y cierres de posición se confirman al momento;
+    lo pendiente se escribe al cerrar el registro, también al terminar el proceso.
+    """
+    def __init__(self, db_path='trade_ledger.db', batch_size=50, clock=time.time):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.clock = clock
+        self._lock = threading.RLock()
+        self._pending_orders = []
+        self._pending_equity = []
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(_SCHEMA)
+        self.conn.commit()
+        atexit.register(self.close)
+        log.info(f"Registro de operaciones (SQLite) inicializado en '{db_path}'.")
+
+    def _now_ms(self):
+        return int(self.clock() * 1000)
+
+    def open_position(self, symbol, side, size, entry_price, stop_loss_price, opened_at=None):
+        with self._lock:
+            cursor = self.conn.execute(
+                "INSERT INTO positions (symbol, side, size, entry_price, stop_loss_price, status, opened_at) "
+                "VALUES (?, ?, ?, ?, ?, 'open', ?)",
+                (symbol, side, size, entry_price, stop_loss_price, opened_at or self._now_ms())
+            )
+            position_id = cursor.lastrowid
+            self._pending_orders.append((position_id, symbol, side, 'entry', size, entry_price, None, opened_at or self._now_ms()))
+            self.flush()
+            return position_id
+
+    def close_position(self, symbol, exit_price=None, closed_at=None):
+        """
+        Cierra la última posición abierta del símbolo y calcula su PnL si se conoce el precio de salida.
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id, side, size, entry_price FROM positions WHERE symbol = ? AND status = 'open' "
+                "ORDER BY id DESC LIMIT 1", (symbol,)
+            ).fetchone()
+            if row is None:
+                return None
+            position_id, side, size, entry_price = row
+            pnl = None
+            if exit_price is not None:
+                pnl = (exit_price - entry_price) * size if side in ('long', 'buy') else (entry_price - exit_price) * size
+            closed_at = closed_at or self._now_ms()
+            self.conn.execute(
+                "UPDATE positions SET status = 'closed', closed_at = ?, exit_price = ?, pnl = ? WHERE id = ?",
+                (closed_at, exit_price, pnl, position_id)
+            )
+            exit_side = 'sell' if side in ('long', 'buy') else 'buy'
+            self._pending_orders.append((position_id, symbol, exit_side, 'exit', size, exit_price, None, closed_at))
+            self.flush()
+            return pnl
+
+    def record_stop_change(self, symbol, new_stop_loss):
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT id, side FROM positions WHERE symbol = ? AND status = 'open' ORDER BY id DESC LIMIT 1", (symbol,)
+            ).fetchone()
+            if row is None:
+                return
+            self.conn.execute("UPDATE positions SET stop_loss_price = ? WHERE id = ?", (new_stop_loss, row[0]))
+            self._pending_orders.append((row[0], symbol, row[1], 'stop', None, new_stop_loss, None, self._now_ms()))
+            self._maybe_flush()
+
+    def record_order(self, symbol, side, order_type, amount, price, exchange_order_id=None, position_id=None, created_at=None):
+        with self._lock:
+            self._pending_orders.append((position_id, symbol, side, order_type, amount, price, exchange_order_id, created_at or self._now_ms()))
+            self._maybe_flush()
+
+    def record_equity(self, equity, ts=None):
+        with self._lock:
+            self._pending_equity.append((ts or self._now_ms(), equity))
+            self._maybe_flush()
+
+    def _maybe_flush(self):
+        if len(self._pending_orders) + len(self._pending_equity) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """
+        Inserta en una sola transacción las órdenes e instantáneas pendientes.
+        """
+        with self._lock:
+            try:
+                if self._pending_orders:
+                    self.conn.executemany(
+                        "INSERT INTO orders (position_id, symbol, side, order_type, amount, price, exchange_order_id, created_at) "
+                        "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", self._pending_orders
+                    )
+                if self._pending_equity:
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO equity_snapshots (ts, equity) VALUES (?, ?)", self._pending_equity
+                    )
+                self.conn.commit()
+                self._pending_orders.clear()
+                self._pending_equity.clear()
+            except sqlite3.Error as e:
+                self.conn.rollback()
+                log.error(f"Error al escribir en el registro de operaciones: {e}")
+
+    def close(self):
+        atexit.unregister(self.close)
+        self.flush()
+        self.conn.close()
+
+    # --- Consultas analíticas ---
+    def pnl_by_month(self):
+        """
+        Lista de (mes 'YYYY-MM', PnL total, nº de posiciones cerradas).
+        """
+        self.flush()
+        return self.conn.execute(
+            "SELECT strftime('%Y-%m', closed_at / 1000, 'unixepoch') AS month, SUM(pnl), COUNT(*) "
+            "FROM positions WHERE status = 'closed' GROUP BY month ORDER BY month"
+        ).fetchall()
+
+    def open_exposure_by_symbol(self):
+        """
+        Lista de (símbolo, tamaño neto, exposición nocional al precio de entrada) de las posiciones abiertas.
+        """
+        self.flush()
+        return self.conn.execute(
+            "SELECT symbol, SUM(CASE WHEN side IN ('long', 'buy') THEN size ELSE -size END), SUM(size * entry_price) "
+            "FROM positions WHERE status = 'open' GROUP BY symbol ORDER BY symbol"
+        ).fetchall()
+
+    def closed_positions(self, symbol=None, since=None):
+        self.flush()
+        query = "SELECT * FROM positions WHERE status = 'closed'"
+        params = []
+        if symbol:
+            query += " AND symbol = ?"
+            params.append(symbol)
+        if since:
+            query += " AND closed_at >= ?"
+            params.append(since)
+        return self.conn.execute(query + " ORDER BY closed_at", params).fetchall()
+
+    def equity_curve(self, since=None):
+        self.flush()
+        return self.conn.execute(
+            "SELECT ts, equity FROM equity_snapshots WHERE ts >= ? ORDER BY ts", (since or 0,)
+        ).fetchall()